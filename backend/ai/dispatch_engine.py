@@ -0,0 +1,106 @@
+"""Batch dispatch engine.
+Assigns many patients to many available ambulances at once by solving a
+minimum-total-ETA assignment (Hungarian / shortest augmenting path) over
+the patient x ambulance cost matrix.
+"""
+import numpy as np
+
+from ..routing.haversine import haversine_matrix
+
+AVERAGE_SPEED_KMH = 50  # same assumption as services.calculate_eta
+
+
+def eta_matrix(patient_coords, ambulance_coords, speed_kmh=AVERAGE_SPEED_KMH):
+    """ETA in seconds from every ambulance (columns) to every patient (rows)"""
+    p = np.asarray(patient_coords, dtype=np.float64).reshape(-1, 2)
+    a = np.asarray(ambulance_coords, dtype=np.float64).reshape(-1, 2)
+    return haversine_matrix(p[:, 0], p[:, 1], a[:, 0], a[:, 1]) / speed_kmh * 3600
+
+
+def _solve_rows_le_cols(cost):
+    """
+    Shortest augmenting path Hungarian algorithm for n rows <= m columns,
+    O(n^2 m) with the inner scan over columns vectorized.
+    Returns col_for_row (length n).
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j]: row (1-based) matched to column j, 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)  # previous column on the augmenting path
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    col_for_row = np.empty(n, dtype=np.int64)
+    cols = np.flatnonzero(p[1:])
+    col_for_row[p[1:][cols] - 1] = cols
+    return col_for_row
+
+
+def min_cost_assignment(cost):
+    """
+    Minimum total cost one-to-one assignment for a rectangular cost matrix.
+    Returns (rows, cols) index arrays of the matched pairs; min(n, m) pairs.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    if n == 0 or m == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if n > m:
+        cols, rows = min_cost_assignment(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+
+    # Some optimal assignment only uses each row's n cheapest columns
+    # (a row matched elsewhere could swap into a free one of them), so the
+    # problem can be restricted to the union of those columns.
+    candidates = np.arange(m)
+    if m > n:
+        nearest = np.argpartition(cost, n - 1, axis=1)[:, :n]
+        candidates = np.unique(nearest)
+
+    col_for_row = _solve_rows_le_cols(cost[:, candidates])
+    return np.arange(n), candidates[col_for_row]
+
+
+def assign_ambulances(patient_coords, ambulance_coords, costs=None):
+    """
+    Minimum-total-ETA matching of patients to ambulances.
+    `costs` may supply the patient x ambulance ETA matrix (e.g. OSRM road
+    times); by default straight-line ETAs are used.
+    Returns a list of (patient_index, ambulance_index, eta_seconds).
+    """
+    if costs is None:
+        costs = eta_matrix(patient_coords, ambulance_coords)
+    costs = np.asarray(costs, dtype=np.float64)
+    # Unreachable pairs (inf) get a cost above any all-finite assignment,
+    # and are left unmatched if the solver still has to use them
+    finite = np.isfinite(costs)
+    big = (costs[finite].max(initial=0.0) + 1) * (min(costs.shape) + 1)
+    rows, cols = min_cost_assignment(np.where(finite, costs, big))
+    return [(int(r), int(c), float(costs[r, c])) for r, c in zip(rows, cols) if finite[r, c]]
@@ -3,8 +3,20 @@ Assigns a severity score and chooses the hospital minimizing a score that factor
 - symptom severity
 - ICU availability
 - distance (approx Haversine)
+
+select_best_hospitals() scores a whole batch of emergencies against an
+array snapshot of the hospitals in one NumPy pass, with the same scores.
+Given a travel time matrix (e.g. from the OSRM table service) it ranks by
+road time instead, expressed as km at ROAD_SPEED_KMH.
 """
-from math import radians, sin, cos, sqrt, atan2
+import numpy as np
+
+try:
+    from ..routing.haversine import haversine, haversine_np
+except ImportError:  # SQLAlchemy routes/ import this as ai.priority_engine, with backend/ on the path
+    from routing.haversine import haversine, haversine_np
+
+ROAD_SPEED_KMH = 50  # converts travel times back to the km scale of the scores
 
 SYMPTOM_SEVERITY = {
     'cardiac': 10,
@@ -18,15 +30,6 @@ SYMPTOM_SEVERITY = {
 }
 
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    return R * c
-
-
 def symptom_severity(symptoms: str) -> int:
     # simple heuristic: check keywords
     s = symptoms.lower()
@@ -55,3 +58,71 @@ def select_best_hospital(emergency, hospitals):
             best_score = score
             best = h
     return best
+
+
+def hospital_arrays(hospitals):
+    """Column snapshot of hospitals (anything with lat/lon/beds_available/icu_available)"""
+    hospitals = list(hospitals)
+    return {
+        'lat': np.array([h.lat for h in hospitals], dtype=np.float64),
+        'lon': np.array([h.lon for h in hospitals], dtype=np.float64),
+        'beds_available': np.array([h.beds_available for h in hospitals], dtype=np.int64),
+        'icu_available': np.array([h.icu_available for h in hospitals], dtype=np.int64),
+    }
+
+
+def score_matrix(lat, lon, severity, snapshot, eta_seconds=None):
+    """
+    Scores of every emergency (rows) against every hospital (columns),
+    computed exactly as in select_best_hospital. With `eta_seconds`
+    (emergencies x hospitals travel times) the distance term is road time.
+    """
+    lat = np.asarray(lat, dtype=np.float64)[:, None]
+    lon = np.asarray(lon, dtype=np.float64)[:, None]
+    sev = np.asarray(severity, dtype=np.float64)[:, None]
+    icu = snapshot['icu_available'][None, :]
+
+    if eta_seconds is None:
+        dist_km = haversine_np(lat, lon, snapshot['lat'][None, :], snapshot['lon'][None, :])
+    else:
+        dist_km = np.asarray(eta_seconds, dtype=np.float64) / 3600 * ROAD_SPEED_KMH
+    icu_factor = np.where(icu > 0, 0.5, 1.0)
+    bed_factor = np.where(snapshot['beds_available'][None, :] > 0, 0.7, 1.2)
+    score = dist_km * (1 + (10 - sev)/10) * icu_factor * bed_factor
+    # the penalty tests == 0 like the loop, so a negative count gets neither
+    return np.where((sev >= 8) & (icu == 0), score * 2.0, score)
+
+
+def best_hospital_indices(lat, lon, severity, snapshot, eta_seconds=None):
+    """
+    Index of the best hospital per emergency (-1 if none scores below the
+    1e9 cut-off used by select_best_hospital), plus the best scores.
+    """
+    if len(snapshot['lat']) == 0:
+        n = len(np.atleast_1d(lat))
+        return np.full(n, -1, dtype=np.int64), np.full(n, np.inf)
+    scores = score_matrix(lat, lon, severity, snapshot, eta_seconds)
+    best = np.argmin(scores, axis=1)  # first minimum, like the strict < in the loop
+    best_scores = scores[np.arange(len(best)), best]
+    return np.where(best_scores < 1e9, best, -1), best_scores
+
+
+def select_best_hospitals(emergencies, hospitals, snapshot=None, eta_seconds=None):
+    """
+    Batch version of select_best_hospital: the best hospital (or None) for
+    each emergency. Pass a prebuilt hospital_arrays() snapshot to reuse it
+    across batches, and an emergencies x hospitals `eta_seconds` matrix to
+    rank by road time.
+    """
+    emergencies = list(emergencies)
+    hospitals = list(hospitals)
+    if snapshot is None:
+        snapshot = hospital_arrays(hospitals)
+    idx, _ = best_hospital_indices(
+        [e.lat for e in emergencies],
+        [e.lon for e in emergencies],
+        [symptom_severity(e.symptoms) for e in emergencies],
+        snapshot,
+        eta_seconds,
+    )
+    return [hospitals[i] if i >= 0 else None for i in idx.tolist()]
@@ -0,0 +1,64 @@
+"""
+Request body handling shared by both POST /emergency/bulk endpoints
+(main.py and routes/emergencies.py): body parsing, the size limit and
+per-item validation with readable error messages.
+
+Imports nothing from the backend package, so the SQLAlchemy routes (run
+with backend/ on the path) and the main app (package-relative) share it.
+"""
+import json
+import os
+from typing import List, Type, TypeVar
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))  # emergencies per /emergency/bulk call
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def parse_bulk_items(body: bytes, content_type: str) -> List[object]:
+    """
+    Items of a JSON array, or of NDJSON (one JSON object per line) when the
+    content type says so or the body is not an array. An NDJSON line that
+    is not valid JSON becomes a ValueError item, so it fails on its own.
+    Raises 400 for a malformed array and 413 above BULK_MAX_ITEMS items.
+    """
+    text = body.decode("utf-8-sig").strip()
+    if "ndjson" not in content_type and text.startswith("["):
+        try:
+            items = json.loads(text)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body is not valid JSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array")
+    else:
+        items = []
+        for line in text.splitlines():
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError as exc:
+                    items.append(ValueError(f"invalid JSON: {exc}"))
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_MAX_ITEMS} emergencies per request"
+        )
+    return items
+
+
+def format_validation_error(exc: ValidationError) -> str:
+    """'field: message; ...' for one rejected item"""
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'item'}: {e['msg']}" for e in exc.errors())
+
+
+def validate_bulk_item(item: object, model: Type[ModelT]) -> ModelT:
+    """One parsed item as `model`; raises ValueError with the reason it was rejected"""
+    if isinstance(item, ValueError):
+        raise item
+    try:
+        return model.model_validate(item)
+    except ValidationError as exc:
+        raise ValueError(format_validation_error(exc)) from None
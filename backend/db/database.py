@@ -1,25 +1,190 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import DateTime, create_engine, event
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.expression import FunctionElement
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"  # async engine (aiosqlite / asyncpg) for async routes
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # connections kept open
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # extra connections under burst load
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # reopen connections older than this (s)
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms a writer waits for the lock
+
+# Async driver for each sync URL scheme
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
 
 # Create Base here to avoid circular imports
 Base = declarative_base()
 
+
+class utcnow(FunctionElement):
+    """
+    Current UTC time as a naive timestamp, for server defaults of columns
+    the ORM fills with datetime.utcnow. On SQLite it is rendered in the
+    text format SQLAlchemy stores DateTime values in, so rows written by
+    raw SQL compare and round-trip like ORM rows.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return _is_sqlite(url) and (url.split("://", 1)[-1] in ("", "/", "/:memory:") or "mode=memory" in url)
+
+
+def _pool_args(url: str) -> dict:
+    """
+    Pool settings: a bounded QueuePool for file and server databases, so
+    each request gets its own connection; an in-memory SQLite database only
+    exists on one connection, so it keeps a StaticPool
+    """
+    if _is_memory_sqlite(url):
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    args = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if _is_sqlite(url):
+        args["connect_args"] = {"check_same_thread": False}
+    else:
+        args["pool_pre_ping"] = True
+    return args
+
+
+def _tune_sqlite(sync_engine):
+    """WAL lets readers run while one connection writes; writers wait instead of failing"""
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        if not _is_memory_sqlite(str(sync_engine.url)):
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
+
+
+def async_url(url: str) -> str:
+    """The same database with its async driver (sqlite -> aiosqlite, postgresql -> asyncpg)"""
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
 # Create engine
-if "sqlite" in DATABASE_URL:
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
-else:
-    engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_pool_args(DATABASE_URL))
+if _is_sqlite(DATABASE_URL):
+    _tune_sqlite(engine)
 
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-__all__ = ["engine", "SessionLocal", "Base"]
+# ===== ASYNC ENGINE (optional) =====
+
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_engine():
+    """The async engine, created on first use; needs aiosqlite or asyncpg installed"""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        try:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+            from sqlalchemy.pool import AsyncAdaptedQueuePool
+        except ImportError as exc:
+            raise RuntimeError("DB_ASYNC=1 needs SQLAlchemy's asyncio extra (pip install greenlet)") from exc
+        url = async_url(DATABASE_URL)
+        args = _pool_args(url)
+        if _is_sqlite(url) and "poolclass" not in args:
+            args["poolclass"] = AsyncAdaptedQueuePool
+        try:
+            _async_engine = create_async_engine(url, **args)
+        except ImportError as exc:
+            driver = url.split("://", 1)[0].split("+")[-1]
+            raise RuntimeError(f"DB_ASYNC=1 with {url.split('://', 1)[0]} needs: pip install {driver}") from exc
+        if _is_sqlite(url):
+            _tune_sqlite(_async_engine.sync_engine)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return _async_engine
+
+
+# ===== REQUEST-SCOPED SESSIONS =====
+
+def get_db():
+    """
+    FastAPI dependency: one Session per request, rolled back if the handler
+    raises and always closed (its connection goes back to the pool).
+    Use it from plain `def` handlers, which FastAPI runs in its threadpool.
+    """
+    session = SessionLocal()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+async def get_async_db():
+    """
+    FastAPI dependency for `async def` handlers: an AsyncSession when
+    DB_ASYNC=1, otherwise a sync Session. Either way, query through
+    run_db() so the event loop is never blocked on the database.
+    """
+    if DB_ASYNC:
+        get_async_engine()
+        async with _AsyncSessionLocal() as session:
+            try:
+                yield session
+            except Exception:
+                await session.rollback()
+                raise
+        return
+    session = SessionLocal()
+    try:
+        yield session
+    except Exception:
+        await asyncio.to_thread(session.rollback)
+        raise
+    finally:
+        await asyncio.to_thread(session.close)
+
+
+async def run_db(session, fn, *args):
+    """
+    Run fn(sync_session, *args) without blocking the event loop: inside the
+    AsyncSession's driver greenlet, or on a worker thread for a sync Session
+    """
+    if hasattr(session, "run_sync"):
+        return await session.run_sync(fn, *args)
+    return await asyncio.to_thread(fn, session, *args)
+
+
+__all__ = [
+    "engine", "SessionLocal", "Base", "get_db", "get_async_db", "get_async_engine", "run_db", "async_url",
+]
@@ -1,7 +1,8 @@
 import os
 from dotenv import load_dotenv
-from db.database import engine, SessionLocal, Base
-from models.models import Hospital, Ambulance, User
+from sqlalchemy import update
+from db.database import engine, SessionLocal, Base, utcnow
+from models.models import Emergency, Hospital, Ambulance, User
 
 load_dotenv()
 
@@ -19,13 +20,18 @@ SAMPLE_AMBULANCES = [
 
 def create_tables_and_seed():
     Base.metadata.create_all(bind=engine)
-    session = SessionLocal()
-    # seed hospitals if empty
-    if session.query(Hospital).count() == 0:
-        for h in SAMPLE_HOSPITALS:
-            session.add(Hospital(**h))
-    if session.query(Ambulance).count() == 0:
-        for a in SAMPLE_AMBULANCES:
-            session.add(Ambulance(**a))
-    session.commit()
-    session.close()
+    # create_all skips tables that already exist; add indexes declared since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with SessionLocal() as session:
+        # rows from before created_at was NOT NULL would fall out of keyset pages
+        session.execute(update(Emergency).where(Emergency.created_at.is_(None)).values(created_at=utcnow()))
+        # seed hospitals if empty
+        if session.query(Hospital).count() == 0:
+            for h in SAMPLE_HOSPITALS:
+                session.add(Hospital(**h))
+        if session.query(Ambulance).count() == 0:
+            for a in SAMPLE_AMBULANCES:
+                session.add(Ambulance(**a))
+        session.commit()
@@ -0,0 +1,61 @@
+"""
+Priority queue of WAITING patients for dispatch when ambulances free up
+"""
+import heapq
+import itertools
+import threading
+from typing import List, Optional, Set, Tuple
+
+from .models import Patient
+from .ai.priority_engine import symptom_severity
+
+# One point of symptom severity counts as this many seconds of waiting, so
+# a cardiac case (10) jumps ahead of a fracture (3) that arrived up to 7
+# minutes earlier, and anyone waiting long enough eventually gets served.
+SEVERITY_WAIT_SECONDS = 60
+
+
+def priority_key(patient: Patient) -> float:
+    """Smaller is served first. Fixed at enqueue time, so heap order never goes stale."""
+    return patient.createdAt.timestamp() - symptom_severity(patient.condition) * SEVERITY_WAIT_SECONDS
+
+
+class WaitingQueue:
+    """
+    Min-heap of patient ids ordered by priority_key. Push and pop are
+    O(log n); entries for patients that stopped WAITING by other means are
+    skipped when they reach the top (lazy deletion).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._queued: Set[str] = set()
+        self._counter = itertools.count()  # FIFO among equal keys
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, patient_id: str) -> bool:
+        return patient_id in self._queued
+
+    def push(self, patient: Patient):
+        with self._lock:
+            if patient.patientId in self._queued:
+                return
+            self._queued.add(patient.patientId)
+            heapq.heappush(self._heap, (priority_key(patient), next(self._counter), patient.patientId))
+
+    def pop(self) -> Optional[str]:
+        """Id of the highest-priority queued patient, or None if empty"""
+        with self._lock:
+            if not self._heap:
+                return None
+            _, _, patient_id = heapq.heappop(self._heap)
+            self._queued.discard(patient_id)
+            return patient_id
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+            self._queued.clear()
@@ -0,0 +1,324 @@
+"""
+Array-backed (struct-of-arrays) ambulance fleet state for the movement simulation
+"""
+import heapq
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .models import Ambulance, AmbulanceStatus, Location
+from .routing.haversine import haversine, haversine_np
+
+# Status codes stored in the status array, in enum declaration order
+STATUS_CODES: Dict[AmbulanceStatus, int] = {s: i for i, s in enumerate(AmbulanceStatus)}
+AVAILABLE_CODE = STATUS_CODES[AmbulanceStatus.AVAILABLE]
+
+DEFAULT_SPEED_KMH = 50.0
+
+
+class RoutePath:
+    """
+    Route polyline with its cumulative distance array, so the point at
+    any distance along it is a binary search plus one interpolation.
+    """
+
+    __slots__ = ("lat", "lng", "cum_km")
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.lat = pts[:, 0].copy()
+        self.lng = pts[:, 1].copy()
+        segments = haversine_np(self.lat[:-1], self.lng[:-1], self.lat[1:], self.lng[1:])
+        self.cum_km = np.concatenate(([0.0], np.cumsum(segments)))
+
+    @property
+    def length_km(self) -> float:
+        return float(self.cum_km[-1])
+
+    def at_fraction(self, frac: float) -> Tuple[float, float]:
+        """Point `frac` (0..1) of the way along the route"""
+        cum = self.cum_km
+        km = frac * cum[-1]
+        i = min(max(int(np.searchsorted(cum, km, "right")), 1), len(cum) - 1)
+        seg = cum[i] - cum[i - 1]
+        f = 1.0 if seg <= 0 else min(1.0, max(0.0, (km - cum[i - 1]) / seg))
+        return (float(self.lat[i - 1] + (self.lat[i] - self.lat[i - 1]) * f),
+                float(self.lng[i - 1] + (self.lng[i] - self.lng[i - 1]) * f))
+
+
+class FleetState:
+    """
+    Movement legs of every ambulance held in flat NumPy arrays indexed by
+    slot. A unit with a target travels from (lat0, lng0) at t0 to
+    (lat1, lng1) at t1 at constant speed, in a straight line or along a
+    RoutePath set with follow(), so its position at any time is an
+    interpolation and nothing needs to be stepped while it is in transit.
+
+    Arrival times are known when a leg starts and are kept in a priority
+    queue; pop_due() hands back exactly the units whose leg just ended.
+
+    The arrays are the source of truth for position. Ambulance models keep
+    their identity/assignment fields and only get a fresh Location built
+    when they are read (see refresh()).
+
+    Writers (upsert/follow/clear, from request threads, the route worker
+    and the movement task) hold one reentrant lock, which covers slot
+    allocation, array growth and the arrival queue. Reads are lock-free:
+    arrays are only ever replaced by larger copies, and a slot is appended
+    to ids after its arrays exist.
+    """
+
+    def __init__(self, capacity: int = 1024, speed_kmh: float = DEFAULT_SPEED_KMH,
+                 clock: Callable[[], float] = time.monotonic):
+        self.speed_kmh = speed_kmh
+        self.clock = clock
+        self.ids: List[str] = []
+        self.slots: Dict[str, int] = {}
+        self.on_schedule: Optional[Callable[[], None]] = None  # called when a new arrival is queued
+        self.last_arrival = 0.0  # latest projected arrival of any leg started so far
+        self._arrivals: List[Tuple[float, int, int]] = []  # (due, slot, leg version)
+        self._lock = threading.RLock()
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        old = getattr(self, "lat0", None)
+        size = 0 if old is None else len(self.ids)
+
+        def grow(name, dtype, fill):
+            arr = np.full(capacity, fill, dtype=dtype)
+            if old is not None:
+                arr[:size] = getattr(self, name)[:size]
+            setattr(self, name, arr)
+
+        grow("lat0", np.float64, 0.0)
+        grow("lng0", np.float64, 0.0)
+        grow("lat1", np.float64, 0.0)
+        grow("lng1", np.float64, 0.0)
+        grow("t0", np.float64, 0.0)
+        grow("t1", np.float64, 0.0)
+        grow("has_target", np.bool_, False)
+        grow("has_path", np.bool_, False)
+        grow("status", np.int8, AVAILABLE_CODE)
+        grow("version", np.int64, 0)
+
+        refs = getattr(self, "_location_refs", [])
+        self._location_refs: List[Optional[Location]] = refs + [None] * (capacity - len(refs))
+        paths = getattr(self, "_paths", [])
+        self._paths: List[Optional[RoutePath]] = paths + [None] * (capacity - len(paths))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ===== POSITIONS =====
+
+    def _positions(self, slots, now: float):
+        """Vectorized leg interpolation for the given slots (route legs: one binary search each)"""
+        t0 = self.t0[slots]
+        span = self.t1[slots] - t0
+        frac = np.where(span > 0, np.clip((now - t0) / np.where(span > 0, span, 1.0), 0.0, 1.0), 1.0)
+        lat = self.lat0[slots] + (self.lat1[slots] - self.lat0[slots]) * frac
+        lng = self.lng0[slots] + (self.lng1[slots] - self.lng0[slots]) * frac
+        for i in np.flatnonzero(self.has_path[slots]).tolist():
+            lat[i], lng[i] = self._paths[int(slots[i])].at_fraction(float(frac[i]))
+        return lat, lng
+
+    def _position(self, slot: int, now: float) -> Tuple[float, float]:
+        t0, t1 = self.t0[slot], self.t1[slot]
+        frac = 1.0 if t1 <= t0 else min(1.0, max(0.0, (now - t0) / (t1 - t0)))
+        if self.has_path[slot]:
+            return self._paths[slot].at_fraction(frac)
+        lat0, lng0 = self.lat0[slot], self.lng0[slot]
+        return (float(lat0 + (self.lat1[slot] - lat0) * frac),
+                float(lng0 + (self.lng1[slot] - lng0) * frac))
+
+    def position(self, ambulance_id: str) -> Optional[Tuple[float, float]]:
+        slot = self.slots.get(ambulance_id)
+        if slot is None:
+            return None
+        return self._position(slot, self.clock())
+
+    def positions(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Current (ids, lat, lng) of the whole fleet in one vector pass"""
+        n = len(self.ids)
+        lat, lng = self._positions(np.arange(n), self.clock())
+        return self.ids[:n], lat, lng
+
+    def following_route(self, ambulance_id: str) -> bool:
+        """True while the unit's current leg runs along a RoutePath"""
+        slot = self.slots.get(ambulance_id)
+        return slot is not None and bool(self.has_path[slot])
+
+    def remaining_seconds(self, ambulance_id: str) -> Optional[float]:
+        """Time left on the unit's current leg, None if it has no target"""
+        slot = self.slots.get(ambulance_id)
+        if slot is None or not self.has_target[slot]:
+            return None
+        return max(0.0, float(self.t1[slot]) - self.clock())
+
+    def any_in_transit(self) -> bool:
+        """O(1) check; may stay True briefly after a replaced leg's old arrival time"""
+        return self.clock() < self.last_arrival
+
+    def moved_since(self, since: float) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Current (ids, lat, lng) of units that were in transit at any point after `since`"""
+        n = len(self.ids)
+        slots = np.flatnonzero(self.has_target[:n] & (self.t1[:n] > since))
+        lat, lng = self._positions(slots, self.clock())
+        return [self.ids[s] for s in slots.tolist()], lat, lng
+
+    # ===== MODEL SYNC =====
+
+    def upsert(self, ambulance: Ambulance):
+        """Copy an ambulance's position, target and status into the arrays"""
+        with self._lock:
+            now = self.clock()
+            slot = self.slots.get(ambulance.ambulanceId)
+            if slot is None:
+                if len(self.ids) == len(self.lat0):
+                    self._alloc(2 * len(self.lat0))
+                slot = len(self.ids)
+                self._location_refs[slot] = None
+                self.ids.append(ambulance.ambulanceId)
+                self.slots[ambulance.ambulanceId] = slot
+
+            # A model still holding the Location we last handed out carries a
+            # stale position; only take the position when the caller set a new one.
+            relocated = ambulance.location is not self._location_refs[slot]
+            if relocated:
+                here = (ambulance.location.lat, ambulance.location.lng)
+                self._location_refs[slot] = ambulance.location
+            else:
+                here = self._position(slot, now)
+
+            target = ambulance.targetLocation
+            if ambulance.status == AmbulanceStatus.AVAILABLE:
+                target = None
+            target_changed = (
+                (target is not None) != bool(self.has_target[slot])
+                or (target is not None and (target.lat != self.lat1[slot] or target.lng != self.lng1[slot]))
+            )
+            self.status[slot] = STATUS_CODES[ambulance.status]
+            if relocated or target_changed:
+                self._start_leg(slot, here, target, now)
+
+    def follow(self, ambulance_id: str, points: Sequence[Tuple[float, float]],
+               seconds: Optional[float] = None) -> bool:
+        """
+        Restart a unit's leg from where it is now along a route polyline
+        [(lat, lng), ...] to its current target, arriving in `seconds`
+        (e.g. a road-network ETA; default: route length at speed_kmh).
+        The polyline is joined to the current position and the target if
+        it does not start/end exactly there. False if the unit has no target.
+        """
+        points = [tuple(p) for p in points]
+        with self._lock:
+            slot = self.slots.get(ambulance_id)
+            if slot is None or not self.has_target[slot]:
+                return False
+            now = self.clock()
+            here = self._position(slot, now)
+            target = (float(self.lat1[slot]), float(self.lng1[slot]))
+            if not points or points[0] != here:
+                points.insert(0, here)
+            if points[-1] != target:
+                points.append(target)
+            self._start_leg(slot, here, Location.model_construct(lat=target[0], lng=target[1]), now,
+                            seconds, RoutePath(points))
+        return True
+
+    def _start_leg(self, slot: int, here: Tuple[float, float], target: Optional[Location], now: float,
+                   seconds: Optional[float] = None, path: Optional[RoutePath] = None):
+        self.lat0[slot], self.lng0[slot] = here
+        self.t0[slot] = now
+        self.version[slot] += 1
+        self._paths[slot] = path
+        self.has_path[slot] = path is not None
+        if target is None:
+            self.has_target[slot] = False
+            self.lat1[slot], self.lng1[slot] = here
+            self.t1[slot] = now
+            return
+
+        self.has_target[slot] = True
+        self.lat1[slot], self.lng1[slot] = target.lat, target.lng
+        if seconds is None:
+            km = path.length_km if path is not None else haversine(here[0], here[1], target.lat, target.lng)
+            seconds = km / self.speed_kmh * 3600
+        self.t1[slot] = now + seconds
+        self.last_arrival = max(self.last_arrival, float(self.t1[slot]))
+        with self._lock:
+            heapq.heappush(self._arrivals, (float(self.t1[slot]), slot, int(self.version[slot])))
+        if self.on_schedule is not None:
+            self.on_schedule()
+
+    def refresh(self, ambulance: Ambulance) -> Ambulance:
+        """Build a Location for the model only if its position changed since last read"""
+        slot = self.slots.get(ambulance.ambulanceId)
+        if slot is not None:
+            self._refresh_slot(ambulance, slot, *self._position(slot, self.clock()))
+        return ambulance
+
+    def refresh_many(self, ambulances: Iterable[Ambulance]) -> List[Ambulance]:
+        """refresh() for many models, interpolating all positions in one pass"""
+        ambulances = list(ambulances)
+        slots = np.array([self.slots[a.ambulanceId] for a in ambulances], dtype=np.int64)
+        if slots.size:
+            lat, lng = self._positions(slots, self.clock())
+            for amb, slot, la, ln in zip(ambulances, slots.tolist(), lat.tolist(), lng.tolist()):
+                self._refresh_slot(amb, slot, la, ln)
+        return ambulances
+
+    def _refresh_slot(self, ambulance: Ambulance, slot: int, lat: float, lng: float):
+        ref = self._location_refs[slot]
+        if ref is None or ref.lat != lat or ref.lng != lng:
+            ref = Location.model_construct(lat=lat, lng=lng)
+            self._location_refs[slot] = ref
+        ambulance.location = ref
+
+    # ===== ARRIVAL EVENTS =====
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """Ids of units whose current leg has ended by `now`, each returned once"""
+        now = self.clock() if now is None else now
+        due = []
+        with self._lock:
+            while self._arrivals and self._arrivals[0][0] <= now:
+                _, slot, version = heapq.heappop(self._arrivals)
+                if version == self.version[slot]:  # skip legs that were replaced
+                    due.append(self.ids[slot])
+        return due
+
+    def retry_arrival(self, ambulance_id: str, delay: float) -> bool:
+        """
+        Hand the unit's ended leg back from pop_due() again in `delay`
+        seconds (its position stays at the target). False if it has no leg.
+        """
+        with self._lock:
+            slot = self.slots.get(ambulance_id)
+            if slot is None or not self.has_target[slot]:
+                return False
+            heapq.heappush(self._arrivals, (self.clock() + delay, slot, int(self.version[slot])))
+        if self.on_schedule is not None:
+            self.on_schedule()
+        return True
+
+    def time_until_next_arrival(self) -> Optional[float]:
+        """Seconds until the next queued arrival, or None if nothing is in transit"""
+        with self._lock:
+            while self._arrivals and self._arrivals[0][2] != self.version[self._arrivals[0][1]]:
+                heapq.heappop(self._arrivals)
+            if not self._arrivals:
+                return None
+            return max(0.0, self._arrivals[0][0] - self.clock())
+
+    def clear(self):
+        with self._lock:
+            self.ids = []
+            self.slots = {}
+            self._location_refs = []
+            self._paths = []
+            self._arrivals = []
+            self.last_arrival = 0.0
+            self._alloc(len(self.lat0))
@@ -0,0 +1,174 @@
+"""
+Device telemetry endpoints for ESP32 vitals monitors (frame formats in
+vitals_receiver.py). Devices post frames over HTTP or keep a WebSocket
+open; decoding is vectorized and the rings are written in coalesced
+batches, so ingestion stays cheap next to the dispatch API.
+
+Samples are only taken for patients of an open emergency; a patient's
+vitals are dropped when the emergency completes (hospital handover).
+"""
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+
+from ..models import PatientStatus
+from ..store import change_listeners, get_patient
+from .vitals_receiver import VITALS, Backlogged, Batch, decode_frames, decode_json, receiver
+from .vitals_store import DEFAULT_POINTS, vitals_store
+
+router = APIRouter(prefix="/iot", tags=["iot"])
+
+# every coalesced batch the receiver stores also goes into the history,
+# and a patient dropped from the receiver is dropped from the history too
+receiver.sample_listeners.append(vitals_store.ingest)
+receiver.drop_listeners.append(vitals_store.drop)
+
+
+def _is_open(patient_id: str) -> bool:
+    patient = get_patient(patient_id)
+    return patient is not None and patient.status != PatientStatus.COMPLETED
+
+
+def drop_completed(kind: str, entity_id: str):
+    """store change listener: forget a patient's vitals at hospital handover"""
+    if kind != "patient" or _is_open(entity_id):
+        return
+    if entity_id in receiver.rings or entity_id in vitals_store.patients:
+        receiver.drop(entity_id)
+
+
+change_listeners.append(drop_completed)
+
+
+def split_known(batches: List[Batch]) -> Tuple[List[Batch], List[str]]:
+    """Batches of open patients, and the ids that are unknown or completed"""
+    known, unknown = [], []
+    for batch in batches:
+        if _is_open(batch[0]):
+            known.append(batch)
+        elif batch[0] not in unknown:
+            unknown.append(batch[0])
+    return known, unknown
+
+
+def submit(batches: List[Batch]) -> Tuple[int, List[str]]:
+    """Queue the batches of open patients; 503 while the receiver is backlogged"""
+    known, unknown = split_known(batches)
+    try:
+        return receiver.submit(known), unknown
+    except Backlogged as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Vitals ingestion backlogged ({exc}), retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+def decode_body(data: bytes, binary: bool):
+    try:
+        return decode_frames(data) if binary else decode_json(data)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Bad vitals frame: {exc}")
+
+
+@router.post("/vitals", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_vitals(request: Request):
+    """
+    Vitals samples from a device or gateway.
+    Content-Type application/octet-stream: one or more binary frames;
+    anything else: JSON batch(es) or NDJSON.
+    Frames for unknown or completed patients are not stored; they are
+    listed in `unknownPatients` (404 if nothing else was sent).
+    """
+    binary = "octet-stream" in request.headers.get("content-type", "")
+    accepted, unknown = submit(decode_body(await request.body(), binary))
+    if unknown and not accepted:
+        raise HTTPException(status_code=404, detail=f"No open emergency for patient(s): {', '.join(unknown)}")
+    return {"accepted": accepted, "unknownPatients": unknown}
+
+
+@router.websocket("/ws/vitals")
+async def vitals_stream(websocket: WebSocket):
+    """
+    Persistent device connection: binary messages are frames, text
+    messages JSON batches. Nothing is sent back unless a message is
+    malformed, names a patient without an open emergency, or came while
+    ingestion is backlogged ({"error": ...}); the connection stays open.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                if message.get("bytes") is not None:
+                    _, unknown = submit(decode_frames(message["bytes"]))
+                elif message.get("text") is not None:
+                    _, unknown = submit(decode_json(message["text"].encode()))
+                else:
+                    continue
+                if unknown:
+                    await websocket.send_json({"error": f"No open emergency for patient(s): {', '.join(unknown)}"})
+            except (ValueError, UnicodeDecodeError) as exc:
+                await websocket.send_json({"error": f"Bad vitals frame: {exc}"})
+            except HTTPException as exc:
+                await websocket.send_json({"error": exc.detail})
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/vitals/{patient_id}/latest")
+def latest_vitals(patient_id: str):
+    """Newest stored sample of a patient"""
+    sample = receiver.latest(patient_id)
+    if sample is None:
+        raise HTTPException(status_code=404, detail="No vitals for this patient")
+    return {"patientId": patient_id, **sample}
+
+
+@router.get("/vitals/{patient_id}")
+def recent_vitals(patient_id: str, last: Optional[int] = Query(None, ge=1)):
+    """Newest `last` samples (everything in the ring if omitted), column-wise"""
+    samples = receiver.recent(patient_id, last)
+    if samples is None:
+        raise HTTPException(status_code=404, detail="No vitals for this patient")
+    return {"patientId": patient_id, "vitals": list(VITALS), **samples}
+
+
+@router.get("/vitals/{patient_id}/history")
+def vitals_history(
+    patient_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: int = Query(DEFAULT_POINTS, ge=1, le=10000),
+):
+    """
+    Vitals between `start` and `end` (epoch seconds; whole history by
+    default) as at most `points` points. `resolution` tells which was
+    used: raw samples, or 1s/10s/1min buckets (merged further if needed)
+    with mean/min/max per vital.
+    """
+    history = vitals_store.query(patient_id, start, end, points)
+    if history is None:
+        raise HTTPException(status_code=404, detail="No vitals for this patient")
+    return {"patientId": patient_id, **history}
+
+
+@router.get("/vitals/{patient_id}/trend")
+def vitals_trend(patient_id: str, window: float = Query(60.0, gt=1, le=7200)):
+    """Change per minute of each vital over the last `window` seconds (least squares on 1 s means)"""
+    trend = vitals_store.trend(patient_id, window)
+    if trend is None:
+        raise HTTPException(status_code=404, detail="No vitals for this patient")
+    return {"patientId": patient_id, "window": window, "perMinute": trend}
+
+
+@router.get("/stats")
+def ingest_stats():
+    """Ingestion counters (frames, samples, stored, dropped_late, flushes, refused, evicted) and history size"""
+    return {
+        **receiver.stats,
+        "patients": len(receiver.rings),
+        "historyBytes": vitals_store.memory_bytes(),
+    }
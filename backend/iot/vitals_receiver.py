@@ -0,0 +1,322 @@
+"""
+Device vitals ingestion: compact frame decoding, per-patient coalescing
+and bounded per-patient ring buffers.
+
+Binary frame (little-endian); a body may hold several frames back to back:
+    header   <2sBBdH  magic b"VT", version 1, id length n,
+                      base time (epoch seconds, float64), sample count m
+    id       n bytes  UTF-8 patient id
+    samples  m x <H6h milliseconds after the base time (uint16), then the
+                      six VITALS x VITAL_SCALE as int16 (37.2 C -> 372)
+That is 14 bytes per sample, decoded for a whole frame by one NumPy view.
+
+JSON batch: {"patientId": "...", "samples": [[t, hr, sys, dia, spo2, temp, rr], ...]}
+(t in epoch seconds), a list of those, or one per line (NDJSON).
+"""
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Same names and order as the frontend VitalsMonitor (frontend/src/vitals.js)
+VITALS = ("heartRate", "systolicBP", "diastolicBP", "oxygenSaturation", "temperature", "respiratoryRate")
+VITAL_SCALE = 10  # binary frames carry value x 10 as int16
+OUTPUT_DECIMALS = 2  # rounding of values returned by the API (stored as float32)
+
+FRAME_MAGIC = b"VT"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<2sBBdH")
+SAMPLE_DTYPE = np.dtype([("dt_ms", "<u2"), ("values", "<i2", (len(VITALS),))])
+
+VITALS_RING_SIZE = int(os.getenv("VITALS_RING_SIZE", "3600"))  # samples kept per patient
+VITALS_FLUSH_INTERVAL = float(os.getenv("VITALS_FLUSH_INTERVAL", "0.05"))  # seconds between coalesced writes
+VITALS_MAX_PENDING = int(os.getenv("VITALS_MAX_PENDING", "200000"))  # queued samples before submits are refused
+VITALS_MAX_PATIENTS = int(os.getenv("VITALS_MAX_PATIENTS", "2000"))  # rings kept; the longest idle is evicted
+VITALS_IDLE_TIMEOUT = float(os.getenv("VITALS_IDLE_TIMEOUT", "600"))  # seconds without samples before eviction
+
+# (patient_id, times, values) in time order
+Batch = Tuple[str, np.ndarray, np.ndarray]
+
+
+class Backlogged(Exception):
+    """Raised by submit() while more than VITALS_MAX_PENDING samples wait for a flush"""
+
+
+# ===== FRAME FORMAT =====
+
+def encode_frame(patient_id: str, times: Sequence[float], values) -> bytes:
+    """
+    One binary frame (what a device sends). `times` must span under 65.5 s;
+    `values` is samples x len(VITALS).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(times), len(VITALS))
+    pid = patient_id.encode()
+    base = float(times[0]) if len(times) else 0.0
+    samples = np.empty(len(times), dtype=SAMPLE_DTYPE)
+    samples["dt_ms"] = np.rint((times - base) * 1000)
+    samples["values"] = np.rint(values * VITAL_SCALE)
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(pid), base, len(times)) + pid + samples.tobytes()
+
+
+def decode_frames(data: bytes) -> List[Batch]:
+    """Every frame in `data`; raises ValueError on a malformed frame"""
+    batches = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < FRAME_HEADER.size:
+            raise ValueError("truncated frame header")
+        magic, version, id_len, base, count = FRAME_HEADER.unpack_from(data, offset)
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            raise ValueError(f"not a version {FRAME_VERSION} vitals frame at byte {offset}")
+        offset += FRAME_HEADER.size
+        end = offset + id_len + count * SAMPLE_DTYPE.itemsize
+        if end > len(data):
+            raise ValueError("truncated frame")
+        patient_id = data[offset:offset + id_len].decode()
+        samples = np.frombuffer(data, dtype=SAMPLE_DTYPE, count=count, offset=offset + id_len)
+        times = base + samples["dt_ms"] / 1000.0
+        values = samples["values"].astype(np.float32) / VITAL_SCALE
+        batches.append((patient_id, times, values))
+        offset = end
+    return batches
+
+
+def decode_json(data: bytes) -> List[Batch]:
+    """JSON batch object(s) or NDJSON; raises ValueError if malformed"""
+    text = data.decode("utf-8-sig").strip()
+    try:
+        parsed = json.loads(text)
+        objects = parsed if isinstance(parsed, list) else [parsed]
+    except ValueError:
+        objects = [json.loads(line) for line in text.splitlines() if line.strip()]
+    batches = []
+    for obj in objects:
+        if not isinstance(obj, dict) or not isinstance(obj.get("patientId"), str):
+            raise ValueError("each batch needs a patientId and samples")
+        samples = np.asarray(obj.get("samples", []), dtype=np.float64)
+        if samples.size == 0:
+            continue
+        if samples.ndim != 2 or samples.shape[1] != len(VITALS) + 1:
+            raise ValueError(f"samples must be [t, {', '.join(VITALS)}] rows")
+        batches.append((obj["patientId"], samples[:, 0].copy(), samples[:, 1:].astype(np.float32)))
+    return batches
+
+
+# ===== PER-PATIENT RING BUFFER =====
+
+class VitalsRing:
+    """
+    The newest `capacity` samples of one patient in preallocated arrays.
+    Writes are vectorized slice copies; samples older than or equal to the
+    last stored one (late or duplicate) are dropped, so times never go back.
+    """
+
+    __slots__ = ("capacity", "_times", "_values", "_next")
+
+    def __init__(self, capacity: int = VITALS_RING_SIZE):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros((capacity, len(VITALS)), dtype=np.float32)
+        self._next = 0  # samples written so far
+
+    def __len__(self) -> int:
+        return min(self._next, self.capacity)
+
+    @property
+    def last_time(self) -> float:
+        return float(self._times[(self._next - 1) % self.capacity]) if self._next else float("-inf")
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> int:
+        """Append time-ordered samples; returns how many were kept"""
+        if self._next:
+            start = int(np.searchsorted(times, self.last_time, "right"))
+            times, values = times[start:], values[start:]
+        n = len(times)
+        if n > self.capacity:
+            times, values = times[-self.capacity:], values[-self.capacity:]
+        m = len(times)
+        slot = (self._next + n - m) % self.capacity  # skips samples overwritten within this batch
+        first = min(m, self.capacity - slot)
+        self._times[slot:slot + first] = times[:first]
+        self._values[slot:slot + first] = values[:first]
+        self._times[:m - first] = times[first:]
+        self._values[:m - first] = values[first:]
+        self._next += n
+        return n
+
+    def last(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Copies of the newest n samples (all retained if None), oldest first"""
+        count = len(self) if n is None else max(0, min(n, len(self)))
+        idx = np.arange(self._next - count, self._next) % self.capacity
+        return self._times[idx], self._values[idx]
+
+
+# ===== RECEIVER =====
+
+class VitalsReceiver:
+    """
+    Takes decoded batches from the device endpoints and queues them per
+    patient; every VITALS_FLUSH_INTERVAL the run() task merges each
+    patient's queue into one time-sorted array write into its ring (on a
+    worker thread) and hands it to sample_listeners. Per-request cost is a
+    dict lookup and a list append, independent of how many samples a frame
+    carries; when flushing falls behind, submit() refuses new samples.
+
+    At most max_patients rings are kept (the longest idle is evicted for a
+    new one) and rings idle for VITALS_IDLE_TIMEOUT are dropped; callers
+    should also drop() a patient once care ends. drop_listeners hear about
+    every dropped patient.
+    """
+
+    def __init__(self, ring_size: int = VITALS_RING_SIZE, max_patients: int = VITALS_MAX_PATIENTS,
+                 max_pending: int = VITALS_MAX_PENDING):
+        self.ring_size = ring_size
+        self.max_patients = max_patients
+        self.max_pending = max_pending
+        self.rings: Dict[str, VitalsRing] = {}
+        self.sample_listeners: List[Callable[[str, np.ndarray, np.ndarray], None]] = []
+        self.drop_listeners: List[Callable[[str], None]] = []
+        self.stats = {"frames": 0, "samples": 0, "stored": 0, "dropped_late": 0, "flushes": 0,
+                      "refused": 0, "evicted": 0}
+        self._pending: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        self._pending_samples = 0
+        self._last_seen: Dict[str, float] = {}  # monotonic time of each ring's last write, oldest first
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def submit(self, batches: List[Batch]) -> int:
+        """
+        Queue decoded batches; returns the number of samples accepted.
+        Raises Backlogged (nothing queued) while the backlog is over max_pending.
+        """
+        with self._lock:
+            if self._pending_samples > self.max_pending:
+                self.stats["refused"] += sum(len(times) for _, times, _ in batches)
+                raise Backlogged(f"{self._pending_samples} samples waiting to be stored")
+            accepted = 0
+            for patient_id, times, values in batches:
+                if len(times):
+                    self._pending.setdefault(patient_id, []).append((times, values))
+                    accepted += len(times)
+            self._pending_samples += accepted
+            self.stats["frames"] += len(batches)
+            self.stats["samples"] += accepted
+        return accepted
+
+    def flush(self) -> int:
+        """Write all queued samples into the rings; returns samples stored"""
+        stored = 0
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._pending_samples = 0
+            if not pending:
+                return 0
+            now = time.monotonic()
+            for patient_id, chunks in pending.items():
+                if len(chunks) == 1:
+                    times, values = chunks[0]
+                else:
+                    times = np.concatenate([c[0] for c in chunks])
+                    values = np.concatenate([c[1] for c in chunks])
+                if len(times) > 1 and np.any(times[1:] < times[:-1]):
+                    order = np.argsort(times, kind="stable")
+                    times, values = times[order], values[order]
+                ring = self.rings.get(patient_id)
+                if ring is None:
+                    if len(self.rings) >= self.max_patients:
+                        self._evict(next(iter(self._last_seen)))
+                    ring = self.rings[patient_id] = VitalsRing(self.ring_size)
+                self._last_seen.pop(patient_id, None)
+                self._last_seen[patient_id] = now  # move to the end: most recently seen
+                before = ring.last_time
+                kept = ring.extend(times, values)
+                self.stats["dropped_late"] += len(times) - kept
+                stored += kept
+                if kept:
+                    if kept < len(times):
+                        start = int(np.searchsorted(times, before, "right"))
+                        times, values = times[start:], values[start:]
+                    for listener in self.sample_listeners:
+                        listener(patient_id, times, values)
+            self.stats["stored"] += stored
+            self.stats["flushes"] += 1
+        return stored
+
+    def latest(self, patient_id: str) -> Optional[dict]:
+        """Newest stored sample as {"timestamp": t, <vital>: value, ...}"""
+        ring = self.rings.get(patient_id)
+        if ring is None or not len(ring):
+            return None
+        times, values = ring.last(1)
+        values = values.astype(np.float64).round(OUTPUT_DECIMALS)
+        return {"timestamp": float(times[0]), **dict(zip(VITALS, values[0].tolist()))}
+
+    def recent(self, patient_id: str, n: Optional[int] = None) -> Optional[dict]:
+        """Newest n stored samples, column-wise: {"times": [...], <vital>: [...]}"""
+        ring = self.rings.get(patient_id)
+        if ring is None:
+            return None
+        times, values = ring.last(n)
+        values = values.astype(np.float64).round(OUTPUT_DECIMALS)
+        return {"times": times.tolist(), **{name: values[:, i].tolist() for i, name in enumerate(VITALS)}}
+
+    def drop(self, patient_id: str):
+        """Forget a patient (e.g. after handover at the hospital)"""
+        with self._flush_lock:
+            with self._lock:
+                chunks = self._pending.pop(patient_id, None)
+                if chunks:
+                    self._pending_samples -= sum(len(times) for times, _ in chunks)
+            known = self.rings.pop(patient_id, None) is not None
+            self._last_seen.pop(patient_id, None)
+        if known or chunks:
+            for listener in self.drop_listeners:
+                listener(patient_id)
+
+    def _evict(self, patient_id: str):
+        """Drop a ring for space or idleness (caller holds _flush_lock)"""
+        self.rings.pop(patient_id, None)
+        self._last_seen.pop(patient_id, None)
+        self.stats["evicted"] += 1
+        for listener in self.drop_listeners:
+            listener(patient_id)
+
+    def evict_idle(self, timeout: float = VITALS_IDLE_TIMEOUT) -> int:
+        """Drop patients without samples for `timeout` seconds; returns how many"""
+        cutoff = time.monotonic() - timeout
+        evicted = 0
+        with self._flush_lock:
+            while self._last_seen:
+                patient_id, seen = next(iter(self._last_seen.items()))
+                if seen > cutoff:
+                    break
+                self._evict(patient_id)
+                evicted += 1
+        return evicted
+
+    async def run(self):
+        """
+        Background task: coalesced flush every VITALS_FLUSH_INTERVAL on a
+        worker thread (the event loop keeps serving requests meanwhile),
+        idle eviction about once a minute
+        """
+        next_eviction = time.monotonic() + 60
+        try:
+            while True:
+                await asyncio.sleep(VITALS_FLUSH_INTERVAL)
+                await asyncio.to_thread(self.flush)
+                if time.monotonic() >= next_eviction:
+                    await asyncio.to_thread(self.evict_idle)
+                    next_eviction = time.monotonic() + 60
+        finally:
+            self.flush()
+
+
+receiver = VitalsReceiver()
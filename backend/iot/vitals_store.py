@@ -0,0 +1,290 @@
+"""
+Vitals history: raw samples and 1s/10s/1min min/max/mean rollups per
+patient, in columnar chunked arrays with per-resolution retention.
+
+Rollups are updated on ingest (one vectorized pass per batch), so range
+queries never scan raw samples: they take the finest resolution whose
+point count over the range fits the requested number of points, and
+merge adjacent buckets of the coarsest one if even that is too many.
+Fed by the vitals receiver (iot/vitals_receiver.py) with time-ordered
+batches.
+"""
+import bisect
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .vitals_receiver import VITALS, OUTPUT_DECIMALS
+
+RAW_CHUNK_SIZE = 4096  # samples per raw chunk
+ROLLUP_CHUNK_SIZE = 1024  # buckets per rollup chunk
+VITALS_RAW_RETENTION = float(os.getenv("VITALS_RAW_RETENTION", "900"))  # seconds of raw samples kept
+# (bucket seconds, name, seconds of buckets kept)
+ROLLUPS = ((1, "1s", 2 * 3600), (10, "10s", 24 * 3600), (60, "1min", 7 * 24 * 3600))
+DEFAULT_POINTS = 500  # points per query when the caller does not say
+
+_N = len(VITALS)
+# rollup row layout: count, then min, max and sum of each vital
+_COUNT, _MIN, _MAX, _SUM = 0, slice(1, 1 + _N), slice(1 + _N, 1 + 2 * _N), slice(1 + 2 * _N, 1 + 3 * _N)
+_ROLLUP_WIDTH = 1 + 3 * _N
+
+
+class ChunkedSeries:
+    """
+    Time-ordered rows in fixed-size chunks: a float64 time column plus
+    `width` columns of `dtype` stored column-major per chunk. Appends fill
+    the last chunk in place, retention drops whole chunks, and a range
+    lookup is a bisect over chunk start times plus one searchsorted per
+    chunk it touches.
+    """
+
+    __slots__ = ("width", "chunk_size", "dtype", "_times", "_cols", "_starts", "_fill", "_dropped")
+
+    def __init__(self, width: int, chunk_size: int, dtype=np.float32):
+        self.width = width
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        self._times: List[np.ndarray] = []
+        self._cols: List[np.ndarray] = []  # (width, chunk_size) per chunk
+        self._starts: List[float] = []  # first time of each chunk
+        self._fill = 0  # rows used in the last chunk
+        self._dropped = False  # rows were removed by retention
+
+    def __len__(self) -> int:
+        return (len(self._times) - 1) * self.chunk_size + self._fill if self._times else 0
+
+    @property
+    def first_time(self) -> float:
+        return self._starts[0] if self._starts else float("inf")
+
+    @property
+    def last_time(self) -> float:
+        return float(self._times[-1][self._fill - 1]) if self._times else float("-inf")
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.nbytes + c.nbytes for t, c in zip(self._times, self._cols))
+
+    def append(self, times: np.ndarray, rows: np.ndarray):
+        """Add rows (n x width) with non-decreasing times after last_time"""
+        done = 0
+        while done < len(times):
+            if not self._times or self._fill == self.chunk_size:
+                self._times.append(np.empty(self.chunk_size, dtype=np.float64))
+                self._cols.append(np.empty((self.width, self.chunk_size), dtype=self.dtype))
+                self._starts.append(float(times[done]))
+                self._fill = 0
+            take = min(len(times) - done, self.chunk_size - self._fill)
+            self._times[-1][self._fill:self._fill + take] = times[done:done + take]
+            self._cols[-1][:, self._fill:self._fill + take] = rows[done:done + take].T
+            self._fill += take
+            done += take
+
+    def last_row(self) -> np.ndarray:
+        """View of the newest row's columns (writable: rollups merge into it)"""
+        return self._cols[-1][:, self._fill - 1]
+
+    def drop_before(self, t: float):
+        """Drop chunks whose rows are all older than t (never the last chunk)"""
+        while len(self._times) > 1 and self._starts[1] <= t:
+            del self._times[0], self._cols[0], self._starts[0]
+            self._dropped = True
+
+    def covers(self, t: float) -> bool:
+        """Whether rows from time t on are all still here"""
+        return not self._dropped or self.first_time <= t
+
+    def _bounds(self, t0: float, t1: float) -> Tuple[int, int]:
+        """Global row positions [lo, hi) with t0 <= time <= t1"""
+        def position(t, side):
+            # chunk i holds the position: later chunks start at or after t ("left") / after t ("right")
+            i = max((bisect.bisect_left if side == "left" else bisect.bisect_right)(self._starts, t) - 1, 0)
+            used = self._fill if i == len(self._times) - 1 else self.chunk_size
+            j = int(np.searchsorted(self._times[i][:used], t, side))
+            if j == used and i + 1 < len(self._times):
+                return (i + 1) * self.chunk_size
+            return i * self.chunk_size + j
+        if not self._times or t1 < t0:
+            return 0, 0
+        return position(t0, "left"), position(t1, "right")
+
+    def count(self, t0: float, t1: float) -> int:
+        lo, hi = self._bounds(t0, t1)
+        return hi - lo
+
+    def range(self, t0: float, t1: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Copies of the rows in [t0, t1]: times and an (n x width) array"""
+        lo, hi = self._bounds(t0, t1)
+        times, cols = [], []
+        for i in range(lo // self.chunk_size, (hi - 1) // self.chunk_size + 1 if hi > lo else 0):
+            a = max(lo - i * self.chunk_size, 0)
+            b = min(hi - i * self.chunk_size, self.chunk_size)
+            times.append(self._times[i][a:b])
+            cols.append(self._cols[i][:, a:b])
+        if not times:
+            return np.empty(0), np.empty((0, self.width), dtype=self.dtype)
+        return np.concatenate(times), np.concatenate(cols, axis=1).T
+
+
+class Rollup:
+    """
+    Buckets of `resolution` seconds holding count and per-vital min/max/sum.
+    Rows are float64: the open bucket's count and sum keep accumulating in
+    place, and float32 would round sums and lose counts past 2**24.
+    """
+
+    __slots__ = ("resolution", "name", "retention", "series")
+
+    def __init__(self, resolution: int, name: str, retention: float):
+        self.resolution = resolution
+        self.name = name
+        self.retention = retention
+        self.series = ChunkedSeries(_ROLLUP_WIDTH, ROLLUP_CHUNK_SIZE, np.float64)
+
+    def add(self, times: np.ndarray, values: np.ndarray):
+        """Fold a time-ordered batch in: one reduceat per statistic"""
+        buckets = np.floor(times / self.resolution)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        rows = np.empty((len(starts), _ROLLUP_WIDTH), dtype=np.float64)
+        rows[:, _COUNT] = np.diff(np.r_[starts, len(times)])
+        rows[:, _MIN] = np.minimum.reduceat(values, starts, axis=0)
+        rows[:, _MAX] = np.maximum.reduceat(values, starts, axis=0)
+        rows[:, _SUM] = np.add.reduceat(values.astype(np.float64), starts, axis=0)
+        bucket_times = buckets[starts] * self.resolution
+        if len(self.series) and self.series.last_time == bucket_times[0]:
+            # the batch continues the newest (still open) bucket
+            last = self.series.last_row()
+            first = rows[0]
+            last[_COUNT] += first[_COUNT]
+            last[_MIN] = np.minimum(last[_MIN], first[_MIN])
+            last[_MAX] = np.maximum(last[_MAX], first[_MAX])
+            last[_SUM] += first[_SUM]
+            bucket_times, rows = bucket_times[1:], rows[1:]
+        self.series.append(bucket_times, rows)
+        self.series.drop_before(times[-1] - self.retention)
+
+
+class PatientVitals:
+    """One patient's raw samples plus every rollup resolution"""
+
+    def __init__(self):
+        self.raw = ChunkedSeries(_N, RAW_CHUNK_SIZE)
+        self.rollups = [Rollup(*spec) for spec in ROLLUPS]
+        self.first_time = float("inf")
+        self.lock = threading.Lock()
+
+    def add(self, times: np.ndarray, values: np.ndarray):
+        with self.lock:
+            if len(self.raw):
+                start = int(np.searchsorted(times, self.raw.last_time, "right"))
+                times, values = times[start:], values[start:]
+            if not len(times):
+                return
+            self.first_time = min(self.first_time, float(times[0]))
+            self.raw.append(times, values)
+            self.raw.drop_before(times[-1] - VITALS_RAW_RETENTION)
+            for rollup in self.rollups:
+                rollup.add(times, values)
+
+    def query(self, start: Optional[float], end: Optional[float], points: int) -> dict:
+        with self.lock:
+            if not len(self.raw):
+                return {"resolution": "raw", "bucketSeconds": 0, "times": [], **{name: [] for name in VITALS}}
+            start = max(self.first_time if start is None else start, self.first_time)
+            end = self.raw.last_time if end is None else end
+            if self.raw.covers(start) and self.raw.count(start, end) <= points:
+                times, values = self.raw.range(start, end)
+                values = values.astype(np.float64).round(OUTPUT_DECIMALS)
+                return {"resolution": "raw", "bucketSeconds": 0, "times": times.tolist(),
+                        **{name: values[:, i].tolist() for i, name in enumerate(VITALS)}}
+            usable = [r for r in self.rollups if r.series.covers(start)] or self.rollups[-1:]
+            rollup = next((r for r in usable if r.series.count(start, end) <= points), usable[-1])
+            # a bucket starting before `start` still holds samples from the range
+            times, rows = rollup.series.range(np.floor(start / rollup.resolution) * rollup.resolution, end)
+        return _rollup_result(rollup, times, rows, points)
+
+    def trend(self, window: float) -> Dict[str, Optional[float]]:
+        """Least-squares slope of each vital's 1 s means over the last `window` seconds, per minute"""
+        with self.lock:
+            rollup = self.rollups[0]
+            end = rollup.series.last_time
+            times, rows = rollup.series.range(end - window, end)
+        if len(times) < 2:
+            return {name: None for name in VITALS}
+        means = rows[:, _SUM] / rows[:, _COUNT, None]
+        x = times - times.mean()
+        slopes = (x[:, None] * (means - means.mean(axis=0))).sum(axis=0) / (x ** 2).sum() * 60
+        return dict(zip(VITALS, np.round(slopes, 3).tolist()))
+
+    @property
+    def nbytes(self) -> int:
+        return self.raw.nbytes + sum(r.series.nbytes for r in self.rollups)
+
+
+def _rollup_result(rollup: Rollup, times: np.ndarray, rows: np.ndarray, points: int) -> dict:
+    """{mean, min, max} lists per vital; adjacent buckets merged to fit `points`"""
+    name, seconds = rollup.name, rollup.resolution
+    factor = -(-len(times) // points) if points > 0 else 1
+    if factor > 1:
+        starts = np.arange(0, len(times), factor)
+        merged = np.empty((len(starts), _ROLLUP_WIDTH), dtype=np.float64)
+        merged[:, _COUNT] = np.add.reduceat(rows[:, _COUNT], starts)
+        merged[:, _MIN] = np.minimum.reduceat(rows[:, _MIN], starts, axis=0)
+        merged[:, _MAX] = np.maximum.reduceat(rows[:, _MAX], starts, axis=0)
+        merged[:, _SUM] = np.add.reduceat(rows[:, _SUM], starts, axis=0)
+        times, rows = times[starts], merged
+        seconds *= factor
+        name = f"{seconds}s"
+    rows = rows.astype(np.float64)
+    mean = (rows[:, _SUM] / rows[:, _COUNT, None]).round(OUTPUT_DECIMALS)
+    low = rows[:, _MIN].round(OUTPUT_DECIMALS)
+    high = rows[:, _MAX].round(OUTPUT_DECIMALS)
+    return {
+        "resolution": name,
+        "bucketSeconds": seconds,
+        "times": times.tolist(),
+        **{vital: {"mean": mean[:, i].tolist(), "min": low[:, i].tolist(), "max": high[:, i].tolist()}
+           for i, vital in enumerate(VITALS)},
+    }
+
+
+class VitalsStore:
+    """Vitals history of every patient (a VitalsReceiver sample listener)"""
+
+    def __init__(self):
+        self.patients: Dict[str, PatientVitals] = {}
+        self._lock = threading.Lock()
+
+    def ingest(self, patient_id: str, times: np.ndarray, values: np.ndarray):
+        """Add a time-ordered batch; samples not after the last stored one are ignored"""
+        series = self.patients.get(patient_id)
+        if series is None:
+            with self._lock:
+                series = self.patients.setdefault(patient_id, PatientVitals())
+        series.add(np.asarray(times, dtype=np.float64), np.asarray(values, dtype=np.float32))
+
+    def query(self, patient_id: str, start: Optional[float] = None, end: Optional[float] = None,
+              points: int = DEFAULT_POINTS) -> Optional[dict]:
+        """
+        Samples in [start, end] (epoch seconds; whole history by default)
+        as at most `points` points: raw values if they fit, otherwise
+        buckets with mean/min/max per vital. `resolution` names the one used.
+        """
+        series = self.patients.get(patient_id)
+        return None if series is None else series.query(start, end, points)
+
+    def trend(self, patient_id: str, window: float = 60.0) -> Optional[Dict[str, Optional[float]]]:
+        series = self.patients.get(patient_id)
+        return None if series is None else series.trend(window)
+
+    def drop(self, patient_id: str):
+        with self._lock:
+            self.patients.pop(patient_id, None)
+
+    def memory_bytes(self) -> int:
+        return sum(series.nbytes for series in list(self.patients.values()))
+
+
+vitals_store = VitalsStore()
@@ -0,0 +1,178 @@
+"""
+Bounded system log: O(1) ring buffer with level/time queries, and a
+background sink that writes log lines off the request path.
+"""
+import bisect
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .models import SystemLogEntry
+
+LOG_CAPACITY = int(os.getenv("LOG_CAPACITY", "1000"))  # entries kept in memory
+LOG_SINK = os.getenv("LOG_SINK", "stdout")  # "stdout", a file path, or "" for no output
+
+
+class LogBuffer:
+    """
+    The last `capacity` log entries in a preallocated ring. Every entry
+    gets a sequence number (total appended so far); append is O(1).
+
+    Queries cost O(limit) plus binary searches and never copy the buffer:
+    entry times (clamped to be non-decreasing) locate `since`/`until`, and
+    a per-level list of sequence numbers serves level filters.
+    """
+
+    def __init__(self, capacity: int = LOG_CAPACITY):
+        self.capacity = capacity
+        self._entries: List[Optional[SystemLogEntry]] = [None] * capacity
+        self._times: List[float] = [0.0] * capacity
+        self._by_level: Dict[str, List[int]] = {}  # ascending seqs; stale prefix trimmed lazily
+        self._next = 0  # sequence number of the next entry
+        self._last_time = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._next, self.capacity)
+
+    @property
+    def total(self) -> int:
+        """Entries appended since start (retained or not)"""
+        return self._next
+
+    @property
+    def _first(self) -> int:
+        return max(0, self._next - self.capacity)
+
+    def append(self, entry: SystemLogEntry) -> int:
+        """Add an entry, dropping the oldest one when full; returns its sequence number"""
+        with self._lock:
+            seq = self._next
+            slot = seq % self.capacity
+            t = entry.timestamp.timestamp()
+            if t < self._last_time:
+                t = self._last_time
+            self._last_time = t
+            self._entries[slot] = entry
+            self._times[slot] = t
+            levels = self._by_level.get(entry.level)
+            if levels is None:
+                levels = self._by_level[entry.level] = []
+            levels.append(seq)
+            if len(levels) > 2 * self.capacity:
+                del levels[:bisect.bisect_left(levels, seq + 1 - self.capacity)]
+            self._next = seq + 1
+            return seq
+
+    def extend(self, entries: Iterable[SystemLogEntry]):
+        for entry in entries:
+            self.append(entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries = [None] * self.capacity
+            self._by_level.clear()
+            self._next = 0
+            self._last_time = 0.0
+
+    def __iter__(self) -> Iterator[SystemLogEntry]:
+        """Retained entries, oldest first"""
+        return iter(self.tail(self.capacity))
+
+    def tail(self, n: int) -> List[SystemLogEntry]:
+        """The newest n entries, oldest first"""
+        with self._lock:
+            first = max(self._first, self._next - max(n, 0))
+            return [self._entries[seq % self.capacity] for seq in range(first, self._next)]
+
+    def _seq_at_time(self, t: float) -> int:
+        """First retained sequence number whose time is >= t"""
+        first, last = self._first, self._next
+        lo, hi = first, last
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._times[mid % self.capacity] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, levels: Optional[Sequence[str]] = None, since: Optional[datetime] = None,
+              until: Optional[datetime] = None, limit: int = 100) -> List[SystemLogEntry]:
+        """
+        The newest `limit` entries with one of `levels` (any level if None)
+        logged in [since, until], oldest first
+        """
+        with self._lock:
+            lo = self._seq_at_time(since.timestamp()) if since else self._first
+            hi = self._seq_at_time(until.timestamp() + 1e-6) if until else self._next
+            if levels is None:
+                seqs = range(max(lo, hi - max(limit, 0)), hi)
+            else:
+                seqs = []
+                for level in levels:
+                    level_seqs = self._by_level.get(level, [])
+                    start = bisect.bisect_left(level_seqs, lo)
+                    end = bisect.bisect_left(level_seqs, hi)
+                    seqs.extend(level_seqs[max(start, end - max(limit, 0)):end])
+                seqs = sorted(seqs)[-limit:] if limit > 0 else []
+            return [self._entries[seq % self.capacity] for seq in seqs]
+
+
+class LogSink:
+    """
+    Writes "[LEVEL] message" lines from a background thread, so add_log
+    only enqueues. Output goes to stdout or appends to a file; with an
+    empty target lines are dropped. Started on first write.
+    """
+
+    def __init__(self, target: str = LOG_SINK):
+        self.target = target
+        self._queue: "queue.SimpleQueue[Optional[SystemLogEntry]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def write(self, entry: SystemLogEntry):
+        if not self.target:
+            return
+        if self._thread is None:
+            self._start()
+        self._queue.put(entry)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+
+    def close(self):
+        """Write out everything queued and stop the thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        file = None if self.target == "stdout" else open(self.target, "a", encoding="utf-8")
+        try:
+            while True:
+                entry = self._queue.get()
+                batch = []
+                while entry is not None:
+                    batch.append(f"[{entry.level}] {entry.message}\n")
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    out = file or sys.stdout
+                    out.write("".join(batch))
+                    out.flush()
+                if entry is None:
+                    return
+        finally:
+            if file is not None:
+                file.close()
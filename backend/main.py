@@ -2,61 +2,109 @@
 Smart Ambulance Routing System - FastAPI Backend
 Real-time emergency response and ambulance dispatch
 """
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 import asyncio
+import os
 import uuid
 from datetime import datetime, timedelta
+from typing import List, Optional
 
 from .models import (
-    LoginRequest, LoginResponse, EmergencyRequest, EmergencyResponse,
+    LoginRequest, LoginResponse, EmergencyRequest, EmergencyResponse, BulkEmergencyResult, BulkEmergencyResponse,
     PatientStatusResponse, MapStateResponse, Patient, Ambulance, Hospital,
     Location, PatientStatus, AmbulanceStatus, AdminDashboardResponse,
-    SystemLogEntry
+    SystemLogEntry, TrafficUpdate
 )
 from .auth import create_access_token, get_current_admin, ADMIN_USERNAME, ADMIN_PASSWORD
 from .services import (
-    dispatch_ambulance, update_ambulance_positions, create_demo_ambulances,
-    create_demo_hospitals, release_all_ambulances, calculate_eta
+    request_dispatch, request_dispatch_batch, dispatch_waiting, rebuild_waiting_queue, update_ambulance_positions, create_demo_ambulances,
+    create_demo_hospitals, release_all_ambulances, calculate_eta,
+    get_active_patient, build_patient_status, simulation_state_key,
+    reroute_engine, apply_traffic_updates, sync_shared_state, simulation_leader
 )
+from .snapshot_cache import SnapshotCache, etag_response
+from .sockets import gps_socket
+from .sockets.dispatch_updates import hub as map_update_hub
+from .iot import esp32_api
+from .iot.vitals_receiver import receiver as vitals_receiver
+from .routing.osrm import osrm_client
+from .persistence import StatePersistence, open_persistence, restore_state
+from .bulk_ingest import parse_bulk_items, validate_bulk_item
+from .state_backend import state_backend
 from .store import (
-    get_patient, get_ambulance, save_patient, save_ambulance,
-    get_hospital, get_all_ambulances, get_all_hospitals, get_all_patients,
-    add_log, system_logs
+    get_patient, get_ambulance, save_patient, save_ambulance, save_hospital,
+    get_hospital, get_all_ambulances, get_all_hospitals,
+    get_log_version, add_log, system_logs, log_sink
 )
 
 
 # ===== STARTUP & BACKGROUND TASKS =====
 
-async def startup_event():
-    """Initialize demo data on startup"""
-    from .store import ambulances, hospitals
-    
-    # Load demo ambulances
+# Write-behind journal of the store, opened by startup_event (None if
+# STATE_DB_PATH is empty). A shared state backend already holds the state
+# outside this process.
+persistence: Optional[StatePersistence] = None
+
+
+def load_demo_data():
+    # Load demo ambulances (through save_ambulance so the spatial index sees them)
     demo_ambs = create_demo_ambulances()
-    for amb_id, amb in demo_ambs.items():
-        ambulances[amb_id] = amb
+    for amb in demo_ambs.values():
+        save_ambulance(amb)
     
-    # Load demo hospitals
+    # Load demo hospitals (through save_hospital so the bed indexes see them)
     demo_hosps = create_demo_hospitals()
-    for hosp_id, hosp in demo_hosps.items():
-        hospitals[hosp_id] = hosp
-    
+    for hosp in demo_hosps.values():
+        save_hospital(hosp)
     add_log("System initialized with demo data")
 
 
+async def startup_event():
+    """Restore persisted or shared state, or initialize demo data on first start"""
+    global persistence
+    if state_backend.shared:
+        # Workers start concurrently: only the first one seeds the shared state
+        with state_backend.lock("startup"):
+            sync_shared_state(force=True)
+            if not get_all_hospitals():
+                load_demo_data()
+    else:
+        persistence = open_persistence()
+        restored = persistence is not None and restore_state(persistence)
+        if persistence is not None:
+            persistence.start()
+        if not restored:
+            load_demo_data()
+    
+    rebuild_waiting_queue()
+
+
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown"""
+    global persistence
     await startup_event()
     
-    # Start background ambulance movement task
-    task = asyncio.create_task(update_ambulance_positions())
+    # Start background ambulance movement and map broadcast tasks
+    tasks = [
+        asyncio.create_task(simulation_leader.run()),
+        asyncio.create_task(update_ambulance_positions()),
+        asyncio.create_task(map_update_hub.run()),
+        asyncio.create_task(vitals_receiver.run()),
+    ]
     
     yield
     
     # Cleanup
-    task.cancel()
+    for task in tasks:
+        task.cancel()
+    await osrm_client.aclose()
+    if persistence is not None:
+        persistence.stop()  # writes out everything still pending
+        persistence = None
+    log_sink.close()
 
 
 # ===== FASTAPI APP =====
@@ -77,6 +125,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Live map WebSocket (snapshot + per-tick deltas)
+app.include_router(gps_socket.router)
+# ESP32 vitals telemetry (HTTP frames + /iot/ws/vitals)
+app.include_router(esp32_api.router)
+
 
 # ===== HEALTH CHECK =====
 
@@ -118,7 +171,7 @@ def admin_login(request: LoginRequest):
 # ===== EMERGENCY ENDPOINTS =====
 
 @app.post("/emergency/request", response_model=EmergencyResponse)
-def request_ambulance(request: EmergencyRequest):
+def request_ambulance(request: EmergencyRequest, response: Response):
     """
     Request an ambulance for an emergency.
     
@@ -134,6 +187,10 @@ def request_ambulance(request: EmergencyRequest):
     - assignedAmbulanceId: ID of assigned ambulance
     - hospitalId: ID of destination hospital
     - eta: Estimated time to arrival in seconds
+    
+    If no ambulance is free, responds 202 with only patientId: the patient
+    stays WAITING in the priority queue and is dispatched automatically as
+    soon as an ambulance becomes available (poll /emergency/status).
     """
     # Create patient
     patient_id = f"PAT-{str(uuid.uuid4())[:8].upper()}"
@@ -150,13 +207,14 @@ def request_ambulance(request: EmergencyRequest):
     save_patient(patient)
     add_log(f"New emergency request: {request.name}, condition: {request.condition}")
     
-    # Dispatch ambulance
-    ambulance_id, hospital_id = dispatch_ambulance(patient)
+    # Dispatch ambulance (batched with concurrent requests if BATCH_DISPATCH_WINDOW is set)
+    ambulance_id, hospital_id = request_dispatch(patient)
     
     if not ambulance_id or not hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="No available ambulances or hospitals"
+        response.status_code = status.HTTP_202_ACCEPTED
+        return EmergencyResponse(
+            patientId=patient_id,
+            message="No ambulance available yet: queued for dispatch"
         )
     
     # Get ETA
@@ -172,6 +230,70 @@ def request_ambulance(request: EmergencyRequest):
     )
 
 
+def ingest_emergencies(items: List[object]) -> BulkEmergencyResponse:
+    """Create a patient per valid item, then dispatch them all in one pass"""
+    results: List[BulkEmergencyResult] = []
+    patients: List[Patient] = []
+    now = datetime.now()
+    for index, item in enumerate(items):
+        try:
+            request = validate_bulk_item(item, EmergencyRequest)
+        except ValueError as exc:
+            results.append(BulkEmergencyResult(index=index, message=f"Rejected: {exc}"))
+            continue
+        patient = Patient(
+            patientId=f"PAT-{str(uuid.uuid4())[:8].upper()}",
+            name=request.name,
+            age=request.age,
+            condition=request.condition,
+            status=PatientStatus.WAITING,
+            location=Location(lat=request.latitude, lng=request.longitude),
+            createdAt=now,
+        )
+        save_patient(patient)
+        patients.append(patient)
+        results.append(BulkEmergencyResult(index=index, patientId=patient.patientId, message=""))
+    add_log(f"Bulk emergency upload: {len(patients)} accepted, {len(items) - len(patients)} rejected")
+    
+    dispatched = request_dispatch_batch(patients)
+    for result in results:
+        if result.patientId is None:
+            continue
+        ambulance_id, hospital_id = dispatched[result.patientId]
+        if ambulance_id and hospital_id:
+            result.assignedAmbulanceId = ambulance_id
+            result.hospitalId = hospital_id
+            result.eta = get_patient(result.patientId).eta or 0
+            result.message = "Ambulance dispatched"
+        else:
+            result.message = "No ambulance available yet: queued for dispatch"
+    served = sum(1 for r in results if r.assignedAmbulanceId)
+    return BulkEmergencyResponse(
+        received=len(items),
+        dispatched=served,
+        queued=len(patients) - served,
+        rejected=len(items) - len(patients),
+        results=results,
+    )
+
+
+@app.post("/emergency/bulk", response_model=BulkEmergencyResponse)
+async def bulk_request_ambulances(request: Request):
+    """
+    Request ambulances for many emergencies at once, e.g. a call-center
+    export: a JSON array of /emergency/request bodies, or NDJSON (one per
+    line, Content-Type application/x-ndjson).
+    
+    Every valid item becomes a patient; the batch is matched to ambulances
+    and hospitals in one dispatch_batch() pass (minimum total ETA). Each
+    item gets its own result, in request order: dispatched, queued (stays
+    WAITING, as with a 202 from /emergency/request) or rejected (invalid).
+    """
+    items = parse_bulk_items(await request.body(), request.headers.get("content-type", ""))
+    # dispatch blocks on locks and OSRM: keep it off the event loop
+    return await run_in_threadpool(ingest_emergencies, items)
+
+
 @app.get("/emergency/status/{patient_id}", response_model=PatientStatusResponse)
 def get_emergency_status(patient_id: str):
     """
@@ -189,97 +311,38 @@ def get_emergency_status(patient_id: str):
             detail="Patient not found"
         )
     
-    ambulance_location = None
-    ambulance_eta = None
-    if patient.ambulanceId:
-        ambulance = get_ambulance(patient.ambulanceId)
-        if ambulance:
-            ambulance_location = ambulance.location
-            ambulance_eta = calculate_eta(ambulance.location, 
-                                         patient.location if patient.status == PatientStatus.PICKUP 
-                                         else get_hospital(patient.hospitalId).location)
-    
-    hospital_location = None
-    hospital_name = None
-    if patient.hospitalId:
-        hospital = get_hospital(patient.hospitalId)
-        if hospital:
-            hospital_location = hospital.location
-            hospital_name = hospital.name
-    
-    return PatientStatusResponse(
-        patientId=patient.patientId,
-        name=patient.name,
-        age=patient.age,
-        condition=patient.condition,
-        status=patient.status,
-        location=patient.location,
-        ambulanceLocation=ambulance_location,
-        ambulanceETA=ambulance_eta,
-        hospitalLocation=hospital_location,
-        hospitalName=hospital_name
-    )
+    return build_patient_status(patient)
 
 
 # ===== MAP DATA ENDPOINT =====
 
+map_state_cache = SnapshotCache("map")
+dashboard_cache = SnapshotCache("dashboard")
+
+
 @app.get("/map/state", response_model=MapStateResponse)
-def get_map_state():
+def get_map_state(request: Request):
     """
     Get current map state: patient, all ambulances, all hospitals.
     
     Frontend polls this every 1-2 seconds to update the live map.
+    The response is built once per simulation tick/state change and shared
+    by all pollers; send If-None-Match with the last ETag to get a 304
+    when nothing changed.
     
     Returns:
     - patient: Current active patient (if any)
     - ambulances: List of all ambulances with current positions
     - hospitals: List of all hospitals
     """
-    # Get active patient (first waiting or in progress)
-    active_patient = None
-    for patient in get_all_patients():
-        if patient.status != PatientStatus.COMPLETED:
-            active_patient = patient
-            break
-    
-    # Convert to response
-    patient_response = None
-    if active_patient:
-        ambulance_location = None
-        ambulance_eta = None
-        if active_patient.ambulanceId:
-            ambulance = get_ambulance(active_patient.ambulanceId)
-            if ambulance:
-                ambulance_location = ambulance.location
-                ambulance_eta = calculate_eta(
-                    ambulance.location,
-                    active_patient.location if active_patient.status == PatientStatus.PICKUP
-                    else get_hospital(active_patient.hospitalId).location
-                )
-        
-        hospital_location = None
-        hospital_name = None
-        if active_patient.hospitalId:
-            hospital = get_hospital(active_patient.hospitalId)
-            if hospital:
-                hospital_location = hospital.location
-                hospital_name = hospital.name
-        
-        patient_response = PatientStatusResponse(
-            patientId=active_patient.patientId,
-            name=active_patient.name,
-            age=active_patient.age,
-            condition=active_patient.condition,
-            status=active_patient.status,
-            location=active_patient.location,
-            ambulanceLocation=ambulance_location,
-            ambulanceETA=ambulance_eta,
-            hospitalLocation=hospital_location,
-            hospitalName=hospital_name
-        )
-    
+    etag, body = map_state_cache.get(simulation_state_key(), build_map_state)
+    return etag_response(request, etag, body)
+
+
+def build_map_state() -> MapStateResponse:
+    active_patient = get_active_patient()
     return MapStateResponse(
-        patient=patient_response,
+        patient=build_patient_status(active_patient) if active_patient else None,
         ambulances=get_all_ambulances(),
         hospitals=get_all_hospitals()
     )
@@ -330,15 +393,31 @@ def admin_mark_reached(patient_id: str, current_admin: str = Depends(get_current
             ambulance.currentPatientId = None
             ambulance.targetLocation = None
             save_ambulance(ambulance)
+            dispatch_waiting()
     
     add_log(f"Admin marked patient {patient_id} as reached hospital", level="INFO")
     return {"message": "Patient marked as reached", "status": "ok"}
 
 
+@app.post("/admin/traffic")
+def admin_traffic(updates: List[TrafficUpdate], current_admin: str = Depends(get_current_admin)):
+    """
+    Admin command to report road segment slowdowns/closures. Only
+    ambulances whose route crosses a changed segment are rerouted.
+    """
+    if reroute_engine is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Road graph not loaded (set ROAD_GRAPH_PATH)"
+        )
+    rerouted = apply_traffic_updates(updates)
+    return {"rerouted": rerouted, "status": "ok"}
+
+
 @app.get("/admin/dashboard", response_model=AdminDashboardResponse)
-def admin_dashboard(current_admin: str = Depends(get_current_admin)):
+def admin_dashboard(request: Request, current_admin: str = Depends(get_current_admin)):
     """
-    Admin dashboard: complete system state.
+    Admin dashboard: complete system state (cached and ETag'd like /map/state).
     
     Returns:
     - Active patient
@@ -346,53 +425,18 @@ def admin_dashboard(current_admin: str = Depends(get_current_admin)):
     - All hospitals
     - Recent system logs
     """
-    # Get active patient
-    active_patient = None
-    for patient in get_all_patients():
-        if patient.status != PatientStatus.COMPLETED:
-            active_patient = patient
-            break
-    
-    patient_response = None
-    if active_patient:
-        ambulance_location = None
-        ambulance_eta = None
-        if active_patient.ambulanceId:
-            ambulance = get_ambulance(active_patient.ambulanceId)
-            if ambulance:
-                ambulance_location = ambulance.location
-                ambulance_eta = calculate_eta(
-                    ambulance.location,
-                    active_patient.location if active_patient.status == PatientStatus.PICKUP
-                    else get_hospital(active_patient.hospitalId).location
-                )
-        
-        hospital_location = None
-        hospital_name = None
-        if active_patient.hospitalId:
-            hospital = get_hospital(active_patient.hospitalId)
-            if hospital:
-                hospital_location = hospital.location
-                hospital_name = hospital.name
-        
-        patient_response = PatientStatusResponse(
-            patientId=active_patient.patientId,
-            name=active_patient.name,
-            age=active_patient.age,
-            condition=active_patient.condition,
-            status=active_patient.status,
-            location=active_patient.location,
-            ambulanceLocation=ambulance_location,
-            ambulanceETA=ambulance_eta,
-            hospitalLocation=hospital_location,
-            hospitalName=hospital_name
-        )
-    
+    key = simulation_state_key() + (get_log_version(),)
+    etag, body = dashboard_cache.get(key, build_admin_dashboard)
+    return etag_response(request, etag, body)
+
+
+def build_admin_dashboard() -> AdminDashboardResponse:
+    active_patient = get_active_patient()
     return AdminDashboardResponse(
-        patient=patient_response,
+        patient=build_patient_status(active_patient) if active_patient else None,
         ambulances=get_all_ambulances(),
         hospitals=get_all_hospitals(),
-        logs=system_logs[-50:]  # Last 50 logs
+        logs=system_logs.tail(50)  # Last 50 logs
     )
 
 
@@ -401,9 +445,10 @@ def admin_dashboard(current_admin: str = Depends(get_current_admin)):
 @app.get("/ambulances/list")
 def get_ambulances_list():
     """Get list of all ambulances with current status and position"""
+    ambulances = get_all_ambulances()
     return {
-        "ambulances": get_all_ambulances(),
-        "count": len(get_all_ambulances())
+        "ambulances": ambulances,
+        "count": len(ambulances)
     }
 
 
@@ -424,9 +469,10 @@ def get_ambulance_details(ambulance_id: str):
 @app.get("/hospitals/list")
 def get_hospitals_list():
     """Get list of all hospitals with bed availability"""
+    hospitals = get_all_hospitals()
     return {
-        "hospitals": get_all_hospitals(),
-        "count": len(get_all_hospitals())
+        "hospitals": hospitals,
+        "count": len(hospitals)
     }
 
 
@@ -445,10 +491,22 @@ def get_hospital_details(hospital_id: str):
 # ===== SYSTEM LOGS =====
 
 @app.get("/logs")
-def get_system_logs(limit: int = 100):
-    """Get recent system logs"""
+def get_system_logs(
+    limit: int = 100,
+    level: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Get recent system logs, newest `limit` entries (oldest first).
+    
+    Filters:
+    - level: one level or a comma-separated list (e.g. WARNING,ERROR)
+    - since / until: ISO timestamps bounding the entry time (inclusive)
+    """
+    levels = [l.strip().upper() for l in level.split(",") if l.strip()] if level else None
     return {
-        "logs": system_logs[-limit:],
+        "logs": system_logs.query(levels, since, until, limit),
         "total": len(system_logs)
     }
 
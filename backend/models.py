@@ -15,6 +15,11 @@ class PatientStatus(str, Enum):
     COMPLETED = "COMPLETED"
 
 
+class BedType(str, Enum):
+    GENERAL = "GENERAL"
+    ICU = "ICU"
+
+
 class AmbulanceStatus(str, Enum):
     AVAILABLE = "AVAILABLE"
     ASSIGNED = "ASSIGNED"
@@ -75,10 +80,21 @@ class Hospital(BaseModel):
     icuBeds: int
     generalBeds: int
     occupiedBeds: int = 0
+    occupiedIcuBeds: int = 0
 
 
 # ===== RESPONSE MODELS =====
 
+class TrafficUpdate(BaseModel):
+    """Slowdown on the road segment between two points (factor 1 clears it)"""
+    fromLat: float
+    fromLng: float
+    toLat: float
+    toLng: float
+    factor: float = 1.0  # travel time multiplier
+    closed: bool = False
+
+
 class LoginResponse(BaseModel):
     access_token: str
     token_type: str
@@ -87,12 +103,29 @@ class LoginResponse(BaseModel):
 
 class EmergencyResponse(BaseModel):
     patientId: str
-    assignedAmbulanceId: str
-    hospitalId: str
-    eta: int
+    assignedAmbulanceId: Optional[str] = None  # None while queued
+    hospitalId: Optional[str] = None
+    eta: Optional[int] = None
     message: str
 
 
+class BulkEmergencyResult(BaseModel):
+    index: int  # position of the item in the request body
+    patientId: Optional[str] = None  # None if the item was rejected
+    assignedAmbulanceId: Optional[str] = None
+    hospitalId: Optional[str] = None
+    eta: Optional[int] = None
+    message: str
+
+
+class BulkEmergencyResponse(BaseModel):
+    received: int
+    dispatched: int
+    queued: int
+    rejected: int
+    results: List[BulkEmergencyResult]
+
+
 class PatientStatusResponse(BaseModel):
     patientId: str
     name: str
@@ -104,6 +137,7 @@ class PatientStatusResponse(BaseModel):
     ambulanceETA: Optional[int]
     hospitalLocation: Optional[Location]
     hospitalName: Optional[str]
+    ambulanceId: Optional[str] = None  # None while WAITING (queued for dispatch)
 
 
 class MapStateResponse(BaseModel):
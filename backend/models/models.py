@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
-from db.database import Base
+from db.database import Base, utcnow
 import datetime
 
 class User(Base):
@@ -46,6 +46,9 @@ class Emergency(Base):
     symptoms = Column(String)
     lat = Column(Float, nullable=False)
     lon = Column(Float, nullable=False)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # NOT NULL: keyset pagination orders and compares on it (NULLs would drop out of pages)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow, server_default=utcnow())
     assigned_hospital_id = Column(Integer, ForeignKey('hospitals.id'), nullable=True)
     assigned_hospital = relationship('Hospital')
+    # keyset pagination of /emergency/all walks this index newest-first
+    __table_args__ = (Index('ix_emergencies_created_at_id', 'created_at', 'id'),)
@@ -0,0 +1,217 @@
+"""
+Write-behind persistence of the in-memory store to a local SQLite file.
+
+Saves only mark an entity dirty (O(1), no I/O on the request path). A
+background thread wakes every PERSIST_INTERVAL seconds, serializes the
+latest version of each dirty entity and appends the batch to a journal
+table in one transaction (SQLite in WAL mode). Every SNAPSHOT_EVERY
+journal rows the journal is folded into a snapshot table holding one row
+per entity. On startup the snapshot is loaded and the journal replayed on
+top of it.
+
+A crash loses at most the last PERSIST_INTERVAL seconds of changes.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .models import Patient, Ambulance, Hospital, SystemLogEntry
+from . import store
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "ambulance_state.db")  # "" disables persistence
+PERSIST_INTERVAL = float(os.getenv("PERSIST_INTERVAL", "0.5"))  # seconds between journal flushes
+SNAPSHOT_EVERY = int(os.getenv("SNAPSHOT_EVERY", "5000"))  # journal rows between snapshots
+LOG_RETENTION = 1000  # like the in-memory log
+
+MODELS = {"patient": Patient, "ambulance": Ambulance, "hospital": Hospital}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot (
+    kind TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, entity_id)
+);
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+"""
+
+
+class StatePersistence:
+    """Dirty-set tracking plus the journal/snapshot file; see the module docstring"""
+
+    def __init__(self, path: str, interval: float = PERSIST_INTERVAL,
+                 snapshot_every: int = SNAPSHOT_EVERY):
+        self.path = path
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; fsync at checkpoints
+        self._db.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._dirty: Dict[Tuple[str, str], None] = {}  # insertion-ordered set
+        self._logs: List[SystemLogEntry] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._journal_rows = self._count("journal")
+        self.stats = {"flushes": 0, "rows": 0, "snapshots": 0}
+
+    def _count(self, table: str) -> int:
+        return self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    # ===== CHANGE TRACKING (request path) =====
+
+    def on_change(self, kind: str, entity_id: str):
+        """store.change_listeners hook: remember what to write, nothing else"""
+        if kind in MODELS:
+            with self._lock:
+                self._dirty[(kind, entity_id)] = None
+
+    def on_log(self, entry: SystemLogEntry):
+        """store.log_listeners hook"""
+        with self._lock:
+            self._logs.append(entry)
+
+    # ===== BACKGROUND WRITER =====
+
+    def start(self):
+        store.change_listeners.append(self.on_change)
+        store.log_listeners.append(self.on_log)
+        self._thread = threading.Thread(target=self._run, name="state-persistence", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detach from the store, write everything pending and close the file"""
+        if self.on_change in store.change_listeners:
+            store.change_listeners.remove(self.on_change)
+        if self.on_log in store.log_listeners:
+            store.log_listeners.remove(self.on_log)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self._db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                store.add_log(f"State persistence flush failed: {exc}", "ERROR")
+
+    def _serialize(self, kind: str, entity_id: str) -> Optional[str]:
+        if kind == "patient":
+            entity = store.get_patient(entity_id)
+        elif kind == "ambulance":
+            entity = store.get_ambulance(entity_id)  # refreshed from the fleet: current position
+        else:
+            entity = store.get_hospital(entity_id)
+        return entity.model_dump_json() if entity is not None else None
+
+    def flush(self):
+        """Append every dirty entity (latest version only) and new logs to the journal"""
+        with self._lock:
+            dirty, self._dirty = list(self._dirty), {}
+            logs, self._logs = self._logs, []
+        if not dirty and not logs:
+            return
+
+        rows = []
+        for kind, entity_id in dirty:
+            data = self._serialize(kind, entity_id)
+            if data is not None:
+                rows.append((kind, entity_id, data))
+        with self._db_lock, self._db:
+            self._db.executemany("INSERT INTO journal (kind, entity_id, data) VALUES (?, ?, ?)", rows)
+            self._db.executemany("INSERT INTO logs (data) VALUES (?)", [(log.model_dump_json(),) for log in logs])
+        self._journal_rows += len(rows)
+        self.stats["flushes"] += 1
+        self.stats["rows"] += len(rows) + len(logs)
+        if self._journal_rows >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        """Fold the journal into the one-row-per-entity snapshot (atomic) and trim old logs"""
+        with self._db_lock, self._db:
+            last = self._db.execute("SELECT MAX(seq) FROM journal").fetchone()[0]
+            if last is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO snapshot (kind, entity_id, data) "
+                    "SELECT kind, entity_id, data FROM journal WHERE seq <= ? ORDER BY seq",
+                    (last,),
+                )
+                self._db.execute("DELETE FROM journal WHERE seq <= ?", (last,))
+            self._db.execute(
+                "DELETE FROM logs WHERE seq <= (SELECT MAX(seq) FROM logs) - ?", (LOG_RETENTION,)
+            )
+        self._journal_rows = 0
+        self.stats["snapshots"] += 1
+
+    # ===== RECOVERY =====
+
+    def load(self) -> Tuple[Dict[str, list], List[SystemLogEntry]]:
+        """
+        Latest persisted version of every entity (snapshot, then journal
+        replayed in order) as {"patient": [...], "ambulance": [...],
+        "hospital": [...]}, plus the retained logs
+        """
+        latest: Dict[Tuple[str, str], str] = {}
+        with self._db_lock:
+            for kind, entity_id, data in self._db.execute("SELECT kind, entity_id, data FROM snapshot"):
+                latest[(kind, entity_id)] = data
+            for kind, entity_id, data in self._db.execute(
+                "SELECT kind, entity_id, data FROM journal ORDER BY seq"
+            ):
+                latest[(kind, entity_id)] = data
+            log_rows = self._db.execute(
+                "SELECT data FROM logs ORDER BY seq DESC LIMIT ?", (LOG_RETENTION,)
+            ).fetchall()
+
+        entities: Dict[str, list] = {kind: [] for kind in MODELS}
+        for (kind, _), data in latest.items():
+            if kind in MODELS:
+                entities[kind].append(MODELS[kind].model_validate_json(data))
+        logs = [SystemLogEntry.model_validate_json(data) for (data,) in reversed(log_rows)]
+        return entities, logs
+
+
+def restore_state(persistence: StatePersistence) -> bool:
+    """
+    Load persisted state into the (empty) store through the save_*
+    functions so indexes and the fleet are rebuilt. Call before
+    persistence.start(). Returns False if nothing was persisted.
+    """
+    entities, logs = persistence.load()
+    if not any(entities.values()):
+        return False
+    with store.replaying():
+        for hospital in entities["hospital"]:
+            store.save_hospital(hospital)
+        for ambulance in entities["ambulance"]:
+            store.save_ambulance(ambulance)
+        for patient in entities["patient"]:
+            store.save_patient(patient)
+    store.system_logs.extend(logs)
+    counts = ", ".join(f"{len(items)} {kind}s" for kind, items in entities.items())
+    store.add_log(f"State restored from {persistence.path} ({counts})")
+    return True
+
+
+def open_persistence(path: str = STATE_DB_PATH) -> Optional[StatePersistence]:
+    """StatePersistence on `path` (STATE_DB_PATH by default), None if disabled"""
+    return StatePersistence(path) if path else None
@@ -1,12 +1,12 @@
-from fastapi import APIRouter
-from db.init_db import SessionLocal
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from db.database import get_db
 from models.models import Ambulance
 
 router = APIRouter(prefix="/ambulances", tags=["ambulances"])
 
 @router.get("")
-def get_ambulances():
-    session = SessionLocal()
+def get_ambulances(session: Session = Depends(get_db)):
     rows = session.query(Ambulance).all()
     out = []
     for r in rows:
@@ -17,5 +17,4 @@ def get_ambulances():
             "lon": r.lon,
             "status": r.status,
         })
-    session.close()
     return out
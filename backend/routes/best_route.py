@@ -1,51 +1,53 @@
-from fastapi import APIRouter, HTTPException
-from db.init_db import SessionLocal
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException
+from db.database import get_async_db, run_db
 from models.models import Emergency, Hospital
-from ai.priority_engine import select_best_hospital
-import requests
-import os
+from ai.priority_engine import select_best_hospitals
+from routing.osrm import osrm_client
+from routing.road_graph import road_graph
 
 router = APIRouter(prefix="/best-route", tags=["routing"])
-OSRM_URL = os.getenv('OSRM_URL', 'http://localhost:5000')
 
-@router.get("/{emergency_id}")
-def get_best_route(emergency_id: int):
-    session = SessionLocal()
+def _load(session, emergency_id):
     em = session.query(Emergency).filter(Emergency.id == emergency_id).first()
+    hospitals = session.query(Hospital).all() if em else []
+    return em, hospitals
+
+def _assign(session, em, hospital):
+    em.assigned_hospital_id = hospital.id
+    session.add(em)
+    session.commit()
+
+@router.get("/{emergency_id}")
+async def get_best_route(emergency_id: int, session=Depends(get_async_db)):
+    # database work runs off the event loop (see db.database.run_db)
+    em, hospitals = await run_db(session, _load, emergency_id)
     if not em:
         raise HTTPException(status_code=404, detail="Emergency not found")
-    hospitals = session.query(Hospital).all()
-    # select hospital via AI engine
-    best = select_best_hospital(em, hospitals)
+    # road times to every hospital in one OSRM table call, then rank via AI engine
+    etas = await osrm_client.table([(em.lat, em.lon)], [(h.lat, h.lon) for h in hospitals])
+    best = select_best_hospitals([em], hospitals, eta_seconds=etas)[0] if hospitals else None
     if not best:
         raise HTTPException(status_code=404, detail="No hospital available")
-    # call OSRM to compute route
-    src = f"{em.lon},{em.lat}"
-    dst = f"{best.lon},{best.lat}"
-    url = f"{OSRM_URL}/route/v1/driving/{src};{dst}?overview=full&geometries=polyline&annotations=duration"
-    try:
-        res = requests.get(url, timeout=5)
-        data = res.json()
-        route = data['routes'][0]
-        duration = route.get('duration')  # seconds
-        geometry = route.get('geometry')
-    except Exception:
-        duration = None
-        geometry = None
+    hospital = {
+        "id": best.id,
+        "name": best.name,
+        "lat": best.lat,
+        "lon": best.lon,
+        "icu_available": best.icu_available,
+        "beds_available": best.beds_available,
+    }
+    # call OSRM to compute route (pooled, cached, de-duplicated),
+    # falling back to the offline road graph when OSRM is unreachable
+    route = await osrm_client.route(em.lat, em.lon, best.lat, best.lon)
+    if route is None and road_graph is not None:
+        route = await asyncio.to_thread(road_graph.route, em.lat, em.lon, best.lat, best.lon)
+    duration = route["duration"] if route else None  # seconds
+    geometry = route["geometry"] if route else None
     # assign hospital id to emergency
-    em.assigned_hospital_id = best.id
-    session.add(em)
-    session.commit()
-    session.close()
+    await run_db(session, _assign, em, best)
     return {
-        "hospital": {
-            "id": best.id,
-            "name": best.name,
-            "lat": best.lat,
-            "lon": best.lon,
-            "icu_available": best.icu_available,
-            "beds_available": best.beds_available,
-        },
+        "hospital": hospital,
         "eta_seconds": duration,
         "geometry_polyline": geometry,
     }
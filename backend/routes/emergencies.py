@@ -1,8 +1,20 @@
-from fastapi import APIRouter, HTTPException
+import base64
+import datetime
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import insert, select, tuple_
 from sqlalchemy.orm import Session
-from db.init_db import SessionLocal
-from models.models import Emergency
+from db.database import SessionLocal, get_async_db, get_db, run_db
+from models.models import Emergency, Hospital
+from ai.priority_engine import select_best_hospitals
+from routing.osrm import osrm_client
+from bulk_ingest import parse_bulk_items, validate_bulk_item
+
+LIST_FIELDS = ("id", "patient_name", "age", "symptoms", "lat", "lon", "assigned_hospital_id")
+STREAM_BATCH = 500  # rows fetched from the DB cursor at a time when streaming
 
 router = APIRouter(prefix="/emergency", tags=["emergency"])
 
@@ -14,8 +26,7 @@ class EmergencyCreate(BaseModel):
     lon: float
 
 @router.post("", status_code=201)
-def create_emergency(payload: EmergencyCreate):
-    session: Session = SessionLocal()
+def create_emergency(payload: EmergencyCreate, session: Session = Depends(get_db)):
     em = Emergency(
         patient_name=payload.patient_name,
         age=payload.age,
@@ -26,23 +37,101 @@ def create_emergency(payload: EmergencyCreate):
     session.add(em)
     session.commit()
     session.refresh(em)
-    session.close()
     return {"id": em.id, "message": "Emergency created"}
 
+def _insert_batch(session, rows):
+    # one executemany INSERT ... RETURNING (batched by SQLAlchemy), one commit
+    ids = session.execute(
+        insert(Emergency).returning(Emergency.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    session.commit()
+    return ids
+
+@router.post("/bulk")
+async def create_emergencies_bulk(request: Request, session=Depends(get_async_db)):
+    """
+    Create many emergencies from a JSON array or NDJSON body (e.g. a CAD
+    export), with the best hospital for each chosen in one batch pass.
+    Returns one result per item, in order: its id and assigned hospital,
+    or the reason it was rejected.
+    """
+    items = parse_bulk_items(await request.body(), request.headers.get("content-type", ""))
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(validate_bulk_item(item, EmergencyCreate))
+            results.append({"index": index, "id": None, "assigned_hospital_id": None})
+        except ValueError as exc:
+            results.append({"index": index, "error": str(exc)})
+    if valid:
+        hospitals = await run_db(session, lambda s: s.query(Hospital).all())
+        best = [None] * len(valid)
+        if hospitals:
+            # road times for the whole batch in chunked OSRM table calls, then one scoring pass
+            etas = await osrm_client.table([(e.lat, e.lon) for e in valid], [(h.lat, h.lon) for h in hospitals])
+            best = select_best_hospitals(valid, hospitals, eta_seconds=etas)
+        rows = [dict(e.model_dump(), assigned_hospital_id=h.id if h else None) for e, h in zip(valid, best)]
+        ids = await run_db(session, _insert_batch, rows)
+        accepted = iter(zip(ids, rows))
+        for result in results:
+            if "error" not in result:
+                result["id"], row = next(accepted)
+                result["assigned_hospital_id"] = row["assigned_hospital_id"]
+    return {
+        "received": len(items),
+        "created": len(valid),
+        "rejected": len(items) - len(valid),
+        "results": results,
+    }
+
+def _encode_cursor(created_at, em_id):
+    raw = f"{created_at.isoformat()}|{em_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, em_id = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(created_at), int(em_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _page_query(cursor, limit):
+    """Newest first on the (created_at, id) index, strictly after `cursor`"""
+    columns = [getattr(Emergency, f) for f in LIST_FIELDS]
+    query = select(*columns, Emergency.created_at).order_by(Emergency.created_at.desc(), Emergency.id.desc())
+    if cursor:
+        query = query.where(tuple_(Emergency.created_at, Emergency.id) < _decode_cursor(cursor))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def _stream_rows(query):
+    # own session: the request-scoped one may be closed before the body is sent
+    with SessionLocal() as session:
+        rows = session.execute(query.execution_options(yield_per=STREAM_BATCH))
+        for batch in rows.partitions():
+            yield "".join(json.dumps(dict(zip(LIST_FIELDS, row))) + "\n" for row in batch)
+
 @router.get("/all")
-def list_emergencies():
-    session: Session = SessionLocal()
-    items = session.query(Emergency).order_by(Emergency.created_at.desc()).all()
-    out = []
-    for e in items:
-        out.append({
-            "id": e.id,
-            "patient_name": e.patient_name,
-            "age": e.age,
-            "symptoms": e.symptoms,
-            "lat": e.lat,
-            "lon": e.lon,
-            "assigned_hospital_id": e.assigned_hospital_id,
-        })
-    session.close()
-    return out
+def list_emergencies(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    session: Session = Depends(get_db),
+):
+    """
+    One page of emergencies, newest first. When more remain, the
+    X-Next-Cursor header holds the `cursor` for the next page.
+    stream=true sends every row after `cursor` as NDJSON instead
+    (`limit` is ignored), read from the DB cursor in batches.
+    """
+    if stream:
+        return StreamingResponse(_stream_rows(_page_query(cursor, None)), media_type="application/x-ndjson")
+    rows = session.execute(_page_query(cursor, limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [dict(zip(LIST_FIELDS, row)) for row in rows]
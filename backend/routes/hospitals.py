@@ -1,12 +1,12 @@
-from fastapi import APIRouter
-from db.init_db import SessionLocal
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from db.database import get_db
 from models.models import Hospital
 
 router = APIRouter(prefix="/hospitals", tags=["hospitals"])
 
 @router.get("")
-def list_hospitals():
-    session = SessionLocal()
+def list_hospitals(session: Session = Depends(get_db)):
     rows = session.query(Hospital).all()
     out = []
     for r in rows:
@@ -20,5 +20,4 @@ def list_hospitals():
             "icu_beds": r.icu_beds,
             "icu_available": r.icu_available,
         })
-    session.close()
     return out
@@ -0,0 +1,137 @@
+"""
+Incremental rerouting of active ambulance routes on the offline road graph.
+
+Every planned route is indexed by the road-graph edges it uses, so a
+traffic update (slowdown factor or closure per edge) only recomputes the
+routes that cross a changed edge instead of the whole fleet.
+"""
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .road_graph import RoadGraph
+
+
+class Route(NamedTuple):
+    ambulance_id: str
+    target: Tuple[float, float]  # (lat, lng) the route ends at
+    edges: List[int]  # road-graph edge ids, in driving order
+    seconds: float  # travel time with current traffic
+
+
+class RerouteEngine:
+    """
+    Active routes plus a reverse index edge -> ambulances using it.
+
+    Traffic is a sparse overlay of per-edge slowdown factors on the graph's
+    base travel times (1.0 = free flow, inf = closed), passed to every
+    search. Factors below 1.0 are clamped to 1.0 so the graph's A* lower
+    bounds stay valid.
+
+    `position(ambulance_id)` gives a unit's current (lat, lng), where a
+    reroute starts from; `on_reroute(route)` receives every recomputed route.
+    """
+
+    def __init__(self, graph: RoadGraph,
+                 position: Callable[[str], Optional[Tuple[float, float]]],
+                 on_reroute: Optional[Callable[[Route], None]] = None):
+        self.graph = graph
+        self.position = position
+        self.on_reroute = on_reroute
+        self.routes: Dict[str, Route] = {}
+        self.factors: Dict[int, float] = {}
+        self._edge_users: Dict[int, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    # ===== ROUTES =====
+
+    def plan(self, ambulance_id: str, lat: float, lng: float,
+             target_lat: float, target_lng: float) -> Optional[Route]:
+        """(Re)plan a unit's route under current traffic; None if no path exists"""
+        source = self.graph.nearest_node(lat, lng)
+        target = self.graph.nearest_node(target_lat, target_lng)
+        with self._lock:
+            self._unindex(ambulance_id)
+            if source is None or target is None:
+                return None
+            found = self.graph.shortest_path(source, target, self.factors)
+            if found is None:
+                return None
+            seconds, edges = found
+            route = Route(ambulance_id, (target_lat, target_lng), edges, seconds)
+            self.routes[ambulance_id] = route
+            for e in edges:
+                self._edge_users.setdefault(e, set()).add(ambulance_id)
+            return route
+
+    def drop(self, ambulance_id: str):
+        """Forget a unit's route (arrived, released or off the road graph)"""
+        with self._lock:
+            self._unindex(ambulance_id)
+
+    def _unindex(self, ambulance_id: str):
+        old = self.routes.pop(ambulance_id, None)
+        if old is None:
+            return
+        for e in old.edges:
+            users = self._edge_users.get(e)
+            if users is not None:
+                users.discard(ambulance_id)
+                if not users:
+                    del self._edge_users[e]
+
+    # ===== TRAFFIC =====
+
+    def segment_edges(self, from_lat: float, from_lng: float,
+                      to_lat: float, to_lng: float) -> List[int]:
+        """Edge ids, both directions, of the road segment between the nodes nearest two points"""
+        a = self.graph.nearest_node(from_lat, from_lng)
+        b = self.graph.nearest_node(to_lat, to_lng)
+        if a is None or b is None or a == b:
+            return []
+        indptr, head = self.graph.indptr, self.graph.head
+        edges = []
+        for u, v in ((a, b), (b, a)):
+            for e in range(int(indptr[u]), int(indptr[u + 1])):
+                if head[e] == v:
+                    edges.append(e)
+        return edges
+
+    def apply_traffic(self, factors: Dict[int, float]) -> List[Tuple[str, Optional[Route]]]:
+        """
+        Set slowdown factors for edges and reroute only the units whose
+        route uses one of them. Returns (ambulance_id, new route or None
+        when no path is left) for every recomputed unit.
+        """
+        with self._lock:
+            affected: Set[str] = set()
+            for e, factor in factors.items():
+                factor = max(1.0, factor)
+                if factor == self.factors.get(e, 1.0):
+                    continue
+                if factor == 1.0:
+                    del self.factors[e]
+                else:
+                    self.factors[e] = factor
+                affected |= self._edge_users.get(e, set())
+            return self._reroute(sorted(affected))
+
+    def clear_traffic(self) -> List[Tuple[str, Optional[Route]]]:
+        """Back to free flow; reroutes the units affected by the removed factors"""
+        return self.apply_traffic({e: 1.0 for e in list(self.factors)})
+
+    def _reroute(self, ambulance_ids: Iterable[str]) -> List[Tuple[str, Optional[Route]]]:
+        results = []
+        for ambulance_id in ambulance_ids:
+            old = self.routes.get(ambulance_id)
+            here = self.position(ambulance_id)
+            if old is None or here is None:
+                self._unindex(ambulance_id)
+                continue
+            route = self.plan(ambulance_id, here[0], here[1], *old.target)
+            results.append((ambulance_id, route))
+            if route is not None and self.on_reroute is not None:
+                self.on_reroute(route)
+        return results
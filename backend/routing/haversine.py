@@ -0,0 +1,65 @@
+"""
+Geo distance kernels shared by ETA, movement, dispatch and ranking code.
+
+- haversine(): scalar great-circle distance in km
+- haversine_np(): the same on broadcastable NumPy arrays
+- haversine_matrix(): pairwise distances between two point sets
+- equirectangular() / equirectangular_np(): flat-earth approximation for
+  short urban distances, several times cheaper than haversine
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180  # ~111.195 km
+
+# Within this distance the equirectangular approximation stays within
+# EQUIRECTANGULAR_MAX_REL_ERROR of haversine at latitudes up to 70 deg
+# (measured worst case ~2.3e-5, see scripts/bench_geo_kernel.py)
+EQUIRECTANGULAR_MAX_KM = 50.0
+EQUIRECTANGULAR_MAX_REL_ERROR = 1e-4
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two coordinates in km"""
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_np(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Element-wise haversine() on broadcastable arrays, in km"""
+    p1 = np.radians(lat1)
+    p2 = np.radians(lat2)
+    a = (np.sin((p2 - p1) / 2) ** 2
+         + np.cos(p1) * np.cos(p2) * np.sin(np.radians(np.subtract(lng2, lng1)) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_matrix(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+    """Pairwise distances in km, shape (len(lats1), len(lats2))"""
+    return haversine_np(
+        np.asarray(lats1, dtype=np.float64)[:, None], np.asarray(lngs1, dtype=np.float64)[:, None],
+        np.asarray(lats2, dtype=np.float64)[None, :], np.asarray(lngs2, dtype=np.float64)[None, :],
+    )
+
+
+def equirectangular(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Flat-earth distance in km (longitude scaled by the cosine of the mean
+    latitude). Use only below EQUIRECTANGULAR_MAX_KM and away from the
+    antimeridian.
+    """
+    x = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = lat2 - lat1
+    return KM_PER_DEGREE * math.sqrt(x * x + y * y)
+
+
+def equirectangular_np(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Element-wise equirectangular() on broadcastable arrays, in km"""
+    x = np.subtract(lng2, lng1) * np.cos(np.radians(np.add(lat1, lat2) / 2))
+    y = np.subtract(lat2, lat1)
+    return KM_PER_DEGREE * np.sqrt(x * x + y * y)
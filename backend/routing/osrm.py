@@ -0,0 +1,344 @@
+"""
+Async OSRM client with connection pooling, an LRU+TTL route cache and
+de-duplication of identical in-flight requests.
+
+table() / table_sync() return many-to-many travel time matrices from the
+OSRM table service, split into chunks that fit the server's table size
+limit, with a straight-line estimate for any chunk OSRM cannot answer.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, Iterator, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+from .haversine import haversine_matrix
+
+OSRM_URL = os.getenv("OSRM_URL", "http://localhost:5000")
+OSRM_TIMEOUT = float(os.getenv("OSRM_TIMEOUT", "5"))
+OSRM_CONNECT_TIMEOUT = float(os.getenv("OSRM_CONNECT_TIMEOUT", "1"))
+OSRM_MAX_CONNECTIONS = int(os.getenv("OSRM_MAX_CONNECTIONS", "20"))
+# Coordinates per table request; osrm-routed rejects more than --max-table-size (default 100)
+OSRM_TABLE_MAX_COORDS = int(os.getenv("OSRM_TABLE_MAX_COORDS", "100"))
+# After a failed call, skip OSRM and use the fallback for this many seconds
+OSRM_RETRY_AFTER = float(os.getenv("OSRM_RETRY_AFTER", "30"))
+
+FALLBACK_SPEED_KMH = 50  # straight-line estimate, same as services.calculate_eta
+
+ROUTE_CACHE_SIZE = int(os.getenv("OSRM_ROUTE_CACHE_SIZE", "4096"))
+ROUTE_CACHE_TTL = float(os.getenv("OSRM_ROUTE_CACHE_TTL", "300"))  # seconds
+SNAP_DECIMALS = 4  # coordinates are rounded to ~11 m before keying the cache
+
+RouteKey = Tuple[float, float, float, float]
+Coords = Sequence[Tuple[float, float]]  # [(lat, lng), ...]
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()  # shared by the event loop and worker threads
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= self.clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def snap(lat: float, lng: float) -> Tuple[float, float]:
+    """Round a coordinate so nearby requests share a cache entry"""
+    return round(lat, SNAP_DECIMALS), round(lng, SNAP_DECIMALS)
+
+
+def fallback_durations(sources: Coords, destinations: Coords,
+                       speed_kmh: float = FALLBACK_SPEED_KMH) -> np.ndarray:
+    """Straight-line travel times in seconds, shape (len(sources), len(destinations))"""
+    src = np.asarray(sources, dtype=np.float64).reshape(-1, 2)
+    dst = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+    return haversine_matrix(src[:, 0], src[:, 1], dst[:, 0], dst[:, 1]) / speed_kmh * 3600
+
+
+def table_chunks(n_sources: int, n_destinations: int,
+                 max_coords: int = OSRM_TABLE_MAX_COORDS) -> Iterator[Tuple[slice, slice]]:
+    """
+    Split an n_sources x n_destinations matrix into blocks whose source
+    plus destination count stays within max_coords. When one side is
+    short it is sent whole and the other side gets the rest of the budget.
+    """
+    dst_step = min(n_destinations, max_coords - min(n_sources, max_coords // 2))
+    src_step = min(n_sources, max_coords - dst_step)
+    for s in range(0, n_sources, src_step):
+        for d in range(0, n_destinations, dst_step):
+            yield slice(s, min(s + src_step, n_sources)), slice(d, min(d + dst_step, n_destinations))
+
+
+def _route_request(key: RouteKey) -> Tuple[str, dict]:
+    """Path and query parameters of one OSRM route call"""
+    src_lat, src_lng, dst_lat, dst_lng = key
+    path = f"/route/v1/driving/{src_lng},{src_lat};{dst_lng},{dst_lat}"
+    return path, {"overview": "full", "geometries": "polyline", "annotations": "duration"}
+
+
+def _parse_route(data: dict) -> dict:
+    route = data["routes"][0]
+    return {
+        "duration": route.get("duration"),
+        "distance": route.get("distance"),
+        "geometry": route.get("geometry"),
+    }
+
+
+def _table_request(sources: Coords, destinations: Coords) -> Tuple[str, dict]:
+    """Path and query parameters of one OSRM table call"""
+    points = ";".join(f"{lng},{lat}" for lat, lng in list(sources) + list(destinations))
+    n = len(sources)
+    params = {
+        "sources": ";".join(str(i) for i in range(n)),
+        "destinations": ";".join(str(n + i) for i in range(len(destinations))),
+        "annotations": "duration",
+    }
+    return f"/table/v1/driving/{points}", params
+
+
+def _parse_table(data: dict, shape: Tuple[int, int]) -> np.ndarray:
+    """Durations of a table response; unreachable pairs (null) become inf"""
+    if data.get("code") != "Ok":
+        raise ValueError(f"OSRM table error: {data.get('code')}")
+    durations = np.array(
+        [[np.inf if d is None else d for d in row] for row in data["durations"]],
+        dtype=np.float64,
+    )
+    if durations.shape != shape:
+        raise ValueError(f"OSRM table shape {durations.shape}, expected {shape}")
+    return durations
+
+
+class OSRMClient:
+    """
+    Shared OSRM client. One pooled httpx.AsyncClient serves all requests;
+    routes are cached per snapped (source, destination) pair, and
+    concurrent requests for the same pair wait on a single HTTP call.
+    """
+
+    def __init__(self, base_url: str = OSRM_URL, timeout: float = OSRM_TIMEOUT,
+                 max_connections: int = OSRM_MAX_CONNECTIONS,
+                 cache_size: int = ROUTE_CACHE_SIZE, cache_ttl: float = ROUTE_CACHE_TTL):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, OSRM_CONNECT_TIMEOUT))
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.max_connections = max_connections
+        self.route_cache = TTLCache(cache_size, cache_ttl)
+        self._inflight: Dict[RouteKey, asyncio.Future] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+        self._sync_http: Optional[httpx.Client] = None
+        self._table_pool: Optional[ThreadPoolExecutor] = None
+        self._down_until = 0.0
+        self.stats = {"requests": 0, "cache_hits": 0, "deduplicated": 0, "errors": 0,
+                      "table_requests": 0, "table_fallbacks": 0}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._http
+
+    @property
+    def sync_http(self) -> httpx.Client:
+        """Blocking client for callers running in worker threads"""
+        if self._sync_http is None or self._sync_http.is_closed:
+            self._sync_http = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._sync_http
+
+    @property
+    def table_pool(self) -> ThreadPoolExecutor:
+        """Threads sending the chunks of one table_sync() call side by side"""
+        if self._table_pool is None:
+            self._table_pool = ThreadPoolExecutor(self.max_connections, thread_name_prefix="osrm-table")
+        return self._table_pool
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._sync_http is not None:
+            self._sync_http.close()
+            self._sync_http = None
+        if self._table_pool is not None:
+            self._table_pool.shutdown(wait=False)
+            self._table_pool = None
+
+    async def route(self, src_lat: float, src_lng: float,
+                    dst_lat: float, dst_lng: float) -> Optional[dict]:
+        """
+        Driving route between two points:
+        {"duration": seconds, "distance": meters, "geometry": encoded polyline},
+        or None if OSRM is unreachable or found no route. Like route_sync(),
+        returns None without a request while OSRM is marked down.
+        """
+        key = snap(src_lat, src_lng) + snap(dst_lat, dst_lng)
+        cached = self.route_cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        if time.monotonic() < self._down_until:
+            return None
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._fetch_route(key)
+            if result is not None:
+                self.route_cache.put(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _fetch_route(self, key: RouteKey) -> Optional[dict]:
+        path, params = _route_request(key)
+        self.stats["requests"] += 1
+        try:
+            res = await self.http.get(path, params=params)
+            return _parse_route(res.json())
+        except httpx.HTTPError:
+            self.stats["errors"] += 1
+            self._down_until = time.monotonic() + OSRM_RETRY_AFTER
+            return None
+        except (ValueError, KeyError, IndexError):
+            self.stats["errors"] += 1
+            return None
+
+    def route_sync(self, src_lat: float, src_lng: float,
+                   dst_lat: float, dst_lng: float) -> Optional[dict]:
+        """
+        Blocking route() for sync code, sharing its cache. Returns None
+        without a request while OSRM is marked down (see table()).
+        """
+        key = snap(src_lat, src_lng) + snap(dst_lat, dst_lng)
+        cached = self.route_cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        if time.monotonic() < self._down_until:
+            return None
+        path, params = _route_request(key)
+        self.stats["requests"] += 1
+        try:
+            res = self.sync_http.get(path, params=params)
+            result = _parse_route(res.json())
+        except httpx.HTTPError:
+            self.stats["errors"] += 1
+            self._down_until = time.monotonic() + OSRM_RETRY_AFTER
+            return None
+        except (ValueError, KeyError, IndexError):
+            self.stats["errors"] += 1
+            return None
+        self.route_cache.put(key, result)
+        return result
+
+    # ===== TRAVEL TIME MATRIX =====
+
+    def _table_plan(self, sources: Coords, destinations: Coords):
+        """Output matrix and the blocks to request (none while OSRM is marked down)"""
+        sources, destinations = list(sources), list(destinations)
+        out = fallback_durations(sources, destinations)
+        if not sources or not destinations or time.monotonic() < self._down_until:
+            if sources and destinations:
+                self.stats["table_fallbacks"] += 1
+            return out, []
+        blocks = [(s, d, sources[s], destinations[d]) for s, d in table_chunks(len(sources), len(destinations))]
+        return out, blocks
+
+    def _table_failed(self):
+        self.stats["errors"] += 1
+        self.stats["table_fallbacks"] += 1
+        self._down_until = time.monotonic() + OSRM_RETRY_AFTER
+
+    async def table(self, sources: Coords, destinations: Coords) -> np.ndarray:
+        """
+        Travel times in seconds from every source (rows) to every
+        destination (columns), [(lat, lng), ...] on both sides. Chunks are
+        requested concurrently over the pool; a chunk that fails keeps its
+        straight-line estimate.
+        """
+        out, blocks = self._table_plan(sources, destinations)
+
+        async def fetch(s, d, src, dst):
+            path, params = _table_request(src, dst)
+            self.stats["table_requests"] += 1
+            try:
+                res = await self.http.get(path, params=params)
+                out[s, d] = _parse_table(res.json(), (len(src), len(dst)))
+            except (httpx.HTTPError, ValueError, KeyError, TypeError):
+                self._table_failed()
+
+        await asyncio.gather(*(fetch(*block) for block in blocks))
+        return out
+
+    def table_sync(self, sources: Coords, destinations: Coords) -> np.ndarray:
+        """
+        Blocking table() for sync code (request handlers, dispatch thread).
+        Several chunks are requested concurrently from table_pool; once one
+        fails, chunks not sent yet keep their straight-line estimate.
+        """
+        out, blocks = self._table_plan(sources, destinations)
+
+        def fetch(s, d, src, dst):
+            if time.monotonic() < self._down_until:
+                return  # an earlier chunk failed: don't wait on a dead server per chunk
+            path, params = _table_request(src, dst)
+            self.stats["table_requests"] += 1
+            try:
+                res = self.sync_http.get(path, params=params)
+                out[s, d] = _parse_table(res.json(), (len(src), len(dst)))
+            except (httpx.HTTPError, ValueError, KeyError, TypeError):
+                self._table_failed()
+
+        if len(blocks) == 1:
+            fetch(*blocks[0])
+        else:
+            list(self.table_pool.map(lambda block: fetch(*block), blocks))
+        return out
+
+
+osrm_client = OSRMClient()
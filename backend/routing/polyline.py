@@ -0,0 +1,48 @@
+"""
+Encoded polyline format (as returned by OSRM with geometries=polyline)
+"""
+from typing import List, Sequence, Tuple
+
+PRECISION = 5  # OSRM "polyline" geometries use 1e5, "polyline6" uses 1e6
+
+
+def encode(points: Sequence[Tuple[float, float]], precision: int = PRECISION) -> str:
+    """Encode [(lat, lng), ...] as a polyline string"""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        ilat = int(round(lat * factor))
+        ilng = int(round(lng * factor))
+        for delta in (ilat - prev_lat, ilng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lng = ilat, ilng
+    return "".join(out)
+
+
+def decode(encoded: str, precision: int = PRECISION) -> List[Tuple[float, float]]:
+    """Decode a polyline string to [(lat, lng), ...]"""
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            result = shift = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
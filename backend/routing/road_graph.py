@@ -0,0 +1,376 @@
+"""
+Offline road-graph router: shortest paths on a preprocessed road network
+held in compact CSR arrays, so routing keeps working without OSRM.
+
+A graph is a directory of .npy arrays (written by save_graph(), e.g. via
+scripts/build_road_graph.py):
+    meta.json              node/edge counts, grid cell size, top speed
+    lat.npy, lng.npy       node coordinates (float64)
+    cell.npy               grid cell key per node (int64, nodes sorted by it)
+    indptr.npy             CSR offsets: edges of node u are indptr[u]:indptr[u + 1]
+    head.npy               edge target node (int32)
+    duration.npy           edge travel time in seconds (float32)
+    distance.npy           edge length in meters (float32)
+    landmarks.npy          optional ALT landmark nodes (int32, L)
+    landmark_from.npy      seconds from each landmark to every node (float32, L x n)
+    landmark_to.npy        seconds from every node to each landmark (float32, L x n)
+
+Arrays are opened with np.load(mmap_mode="r"), so loading only maps the
+files; pages are read on first use, and queries only turn the rows of the
+nodes they touch into Python values (see RoadGraph._row).
+
+Queries use A* with ALT lower bounds (triangle inequality over landmark
+distances, computed once at build time), which settles far fewer nodes
+than a straight-line bound on a network with mixed road speeds. The bounds
+stay valid when edges only get slower, so traffic overlays need no rebuild.
+"""
+import heapq
+import json
+import math
+import os
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .haversine import KM_PER_DEGREE, EQUIRECTANGULAR_MAX_REL_ERROR, haversine_np
+from .polyline import encode
+
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "")
+DEFAULT_CELL_SIZE = 0.01  # degrees, for snapping coordinates to nodes
+
+ARRAYS = ("lat", "lng", "cell", "indptr", "head", "duration", "distance")
+LANDMARK_ARRAYS = ("landmarks", "landmark_from", "landmark_to")
+DEFAULT_LANDMARKS = 8
+ACTIVE_LANDMARKS = 4  # per query, the landmarks giving the best bound at the source
+ROW_CACHE_NODES = 100_000  # node rows kept between queries (~0.9 KB each with 8 landmarks)
+
+
+def cell_keys(lat, lng, cell_size: float) -> np.ndarray:
+    """One int64 key per grid cell; cells in the same latitude row are contiguous"""
+    row = np.floor((np.asarray(lat) + 90) / cell_size).astype(np.int64)
+    col = np.floor((np.asarray(lng) + 180) / cell_size).astype(np.int64)
+    return row * (1 << 32) + col
+
+
+def dijkstra(indptr, head, weights, source: int) -> List[float]:
+    """Seconds from source to every node (inf if unreachable), on list-based CSR"""
+    dist = [math.inf] * (len(indptr) - 1)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for e in range(indptr[u], indptr[u + 1]):
+            nd = d + weights[e]
+            v = head[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def reverse_csr(indptr: np.ndarray, head: np.ndarray, weights: np.ndarray):
+    """CSR of the graph with every edge reversed"""
+    tail = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(head, kind="stable")
+    rev_indptr = np.zeros(len(indptr), dtype=np.int64)
+    np.cumsum(np.bincount(head, minlength=len(indptr) - 1), out=rev_indptr[1:])
+    return rev_indptr, tail[order], np.asarray(weights)[order]
+
+
+def compute_landmarks(indptr, head, weights, count: int = DEFAULT_LANDMARKS, seed: int = 0):
+    """
+    Farthest-point landmark selection: each new landmark is the node
+    farthest (by road, both directions) from all landmarks so far.
+    Returns (landmarks, seconds from each landmark, seconds to each landmark).
+    """
+    rev = reverse_csr(indptr, head, weights)
+    fwd_lists = (indptr.tolist(), head.tolist(), np.asarray(weights, dtype=np.float64).tolist())
+    rev_lists = (rev[0].tolist(), rev[1].tolist(), rev[2].astype(np.float64).tolist())
+    n = len(indptr) - 1
+    landmarks, dist_from, dist_to = [], [], []
+    closest = np.full(n, np.inf)
+    node = int(np.random.default_rng(seed).integers(n))
+    for i in range(min(count, n)):
+        if i > 0:
+            # farthest reachable node from the landmarks chosen so far
+            node = int(np.argmax(np.where(np.isfinite(closest), closest, -1)))
+        from_l = np.array(dijkstra(*fwd_lists, node))
+        to_l = np.array(dijkstra(*rev_lists, node))
+        landmarks.append(node)
+        dist_from.append(from_l)
+        dist_to.append(to_l)
+        closest = np.minimum(closest, from_l + to_l)
+    return (np.array(landmarks, dtype=np.int32),
+            np.array(dist_from, dtype=np.float32), np.array(dist_to, dtype=np.float32))
+
+
+def save_graph(path, lat, lng, tail, head, duration, distance,
+               cell_size: float = DEFAULT_CELL_SIZE, landmarks: int = DEFAULT_LANDMARKS):
+    """
+    Write a directed graph given as edge lists (tail -> head, seconds,
+    meters) in the CSR layout, plus `landmarks` ALT landmarks (0 for
+    none). Nodes are renumbered in grid cell order; returns the new id of
+    every input node.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    tail = np.asarray(tail, dtype=np.int64)
+    head = np.asarray(head, dtype=np.int64)
+    duration = np.asarray(duration, dtype=np.float32)
+    distance = np.asarray(distance, dtype=np.float32)
+
+    cells = cell_keys(lat, lng, cell_size)
+    order = np.argsort(cells, kind="stable")
+    new_id = np.empty(len(order), dtype=np.int64)
+    new_id[order] = np.arange(len(order))
+    tail, head = new_id[tail], new_id[head]
+
+    by_tail = np.argsort(tail, kind="stable")
+    indptr = np.zeros(len(lat) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tail, minlength=len(lat)), out=indptr[1:])
+
+    with np.errstate(divide="ignore"):
+        speeds = distance / 1000 / (duration / 3600)
+    max_speed = float(speeds[np.isfinite(speeds)].max(initial=1.0))
+
+    out = Path(path)
+    out.mkdir(parents=True, exist_ok=True)
+    arrays = {
+        "lat": lat[order], "lng": lng[order], "cell": cells[order], "indptr": indptr,
+        "head": head[by_tail].astype(np.int32),
+        "duration": duration[by_tail], "distance": distance[by_tail],
+    }
+    if landmarks:
+        arrays["landmarks"], arrays["landmark_from"], arrays["landmark_to"] = compute_landmarks(
+            indptr, arrays["head"], arrays["duration"], landmarks
+        )
+    for name, array in arrays.items():
+        np.save(out / f"{name}.npy", array)
+    meta = {"nodes": len(lat), "edges": len(head), "cell_size": cell_size, "max_speed_kmh": max_speed,
+            "landmarks": len(arrays.get("landmarks", ()))}
+    (out / "meta.json").write_text(json.dumps(meta, indent=2))
+    return new_id
+
+
+class RoadGraph:
+    """
+    Memory-mapped CSR road graph with A* (ALT when the graph has
+    landmarks) shortest paths.
+
+    The search loop reads each node it touches once from the mapped
+    arrays into a small tuple of Python values (its edges, coordinates
+    and landmark distances), which keeps per-element NumPy overhead out of
+    the loop without materializing the whole graph. Rows are kept for
+    later queries, up to ROW_CACHE_NODES nodes.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        self.cell_size = meta["cell_size"]
+        self.max_speed_kmh = meta["max_speed_kmh"]
+        for name in ARRAYS:
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode="r"))
+        for name in LANDMARK_ARRAYS:
+            file = self.path / f"{name}.npy"
+            setattr(self, name, np.load(file, mmap_mode="r") if meta.get("landmarks") else None)
+        self._rows: Dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.head)
+
+    def _row(self, u: int) -> tuple:
+        """
+        (first edge id, edge heads, edge seconds, lat, lng, seconds from
+        each landmark, seconds to each landmark) of node u, read from the
+        mapped arrays the first time a query touches it
+        """
+        row = self._rows.get(u)
+        if row is None:
+            if len(self._rows) >= ROW_CACHE_NODES:
+                self._rows = {}
+            lo, hi = self.indptr[u:u + 2].tolist()
+            has_landmarks = self.landmarks is not None
+            row = (
+                lo, self.head[lo:hi].tolist(), self.duration[lo:hi].tolist(),
+                float(self.lat[u]), float(self.lng[u]),
+                # float32 arrays: a quarter of the size of lists of floats
+                array("f", self.landmark_from[:, u].tobytes()) if has_landmarks else (),
+                array("f", self.landmark_to[:, u].tobytes()) if has_landmarks else (),
+            )
+            self._rows[u] = row
+        return row
+
+    def _landmark_bounds(self, source: int, target: int):
+        """
+        (landmark index, from-landmark seconds of target, to-landmark
+        seconds of target) for the ACTIVE_LANDMARKS landmarks with the
+        tightest bound at the source
+        """
+        *_, from_s, to_s = self._row(source)
+        *_, from_t, to_t = self._row(target)
+        bounds = []
+        for i in range(len(from_s)):
+            bound = max(from_t[i] - from_s[i], to_s[i] - to_t[i])
+            bounds.append((bound if bound == bound else -math.inf, i, from_t[i], to_t[i]))  # nan -> no bound
+        bounds.sort(key=lambda b: b[0], reverse=True)
+        return [b[1:] for b in bounds[:ACTIVE_LANDMARKS]]
+
+    # ===== SNAPPING =====
+
+    def nearest_node(self, lat: float, lng: float, max_rings: int = 10) -> Optional[int]:
+        """
+        Closest node to a coordinate: scans rings of grid cells outward until
+        one holds a node, plus one more ring for nodes just across a cell edge.
+        None if nothing lies within max_rings cells.
+        """
+        row0 = math.floor((lat + 90) / self.cell_size)
+        col0 = math.floor((lng + 180) / self.cell_size)
+        found_at = None
+        candidates: List[np.ndarray] = []
+        for r in range(max_rings + 1):
+            for row in range(row0 - r, row0 + r + 1):
+                # whole row span at the ring's top/bottom edge, just the two ends in between
+                if abs(row - row0) == r:
+                    spans = [(col0 - r, col0 + r)]
+                else:
+                    spans = [(col0 - r, col0 - r), (col0 + r, col0 + r)]
+                for lo, hi in spans:
+                    start = np.searchsorted(self.cell, row * (1 << 32) + lo, "left")
+                    end = np.searchsorted(self.cell, row * (1 << 32) + hi, "right")
+                    if end > start:
+                        candidates.append(np.arange(start, end))
+            if candidates and found_at is None:
+                found_at = r
+            if found_at is not None and r > found_at:
+                break
+        if not candidates:
+            return None
+        nodes = np.concatenate(candidates)
+        dist = haversine_np(lat, lng, self.lat[nodes], self.lng[nodes])
+        return int(nodes[np.argmin(dist)])
+
+    # ===== SHORTEST PATHS =====
+
+    def shortest_path(self, source: int, target: int,
+                      factors: Optional[Dict[int, float]] = None) -> Optional[Tuple[float, List[int]]]:
+        """
+        A* from source to target over edge travel times. `factors` maps
+        edge ids to slowdown factors on the stored seconds (e.g. traffic;
+        inf closes an edge); factors below 1 would break the lower bounds.
+        Returns (seconds, edge ids along the path) or None.
+        """
+        if source == target:
+            return 0.0, []
+        factors = factors or None
+        rows = self._rows
+        row = self._row
+
+        # Straight-line time at top speed and the landmark triangle bounds
+        # never overestimate the remaining time
+        tlat, tlng = row(target)[3:5]
+        scale = KM_PER_DEGREE * 3600 / self.max_speed_kmh * (1 - EQUIRECTANGULAR_MAX_REL_ERROR)
+        kx = math.cos(math.radians(tlat))
+        sqrt = math.sqrt
+        landmarks = self._landmark_bounds(source, target)
+
+        best = {source: 0.0}
+        via = {}  # node -> (previous node, edge id)
+        closed = set()
+        heap = [(0.0, 0.0, source)]
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if u == target:
+                return g, self._edges_to(target, source, via)
+            if u in closed:
+                continue
+            closed.add(u)
+            lo, heads, seconds = (rows.get(u) or row(u))[:3]
+            for k, v in enumerate(heads):
+                w = seconds[k]
+                if factors is not None:
+                    factor = factors.get(lo + k)
+                    if factor is not None:
+                        w = math.inf if factor == math.inf else w * factor
+                ng = g + w
+                if ng < best.get(v, math.inf):
+                    best[v] = ng
+                    via[v] = (u, lo + k)
+                    _, _, _, v_lat, v_lng, F, T = rows.get(v) or row(v)
+                    dx = (v_lng - tlng) * kx
+                    dy = v_lat - tlat
+                    h = sqrt(dx * dx + dy * dy) * scale
+                    for i, f_target, t_target in landmarks:
+                        if f_target - F[i] > h:
+                            h = f_target - F[i]
+                        if T[i] - t_target > h:
+                            h = T[i] - t_target
+                    if h == math.inf:
+                        continue  # v cannot reach the target
+                    heapq.heappush(heap, (ng + h, ng, v))
+        return None
+
+    @staticmethod
+    def _edges_to(target: int, source: int, via: dict) -> List[int]:
+        edges = []
+        node = target
+        while node != source:
+            node, e = via[node]
+            edges.append(e)
+        edges.reverse()
+        return edges
+
+    def _edge_tail(self, e: int) -> int:
+        """Source node of an edge (binary search over the CSR offsets)"""
+        return int(np.searchsorted(self.indptr, e, "right")) - 1
+
+    def path_nodes(self, source: int, edges: Sequence[int]) -> List[int]:
+        return [source] + [int(self.head[e]) for e in edges]
+
+    def edge_points(self, edges: Sequence[int]) -> List[Tuple[float, float]]:
+        """(lat, lng) of every node along a path given as edge ids"""
+        if not len(edges):
+            return []
+        nodes = self.path_nodes(self._edge_tail(edges[0]), edges)
+        return list(zip(self.lat[nodes].tolist(), self.lng[nodes].tolist()))
+
+    def route(self, src_lat: float, src_lng: float,
+              dst_lat: float, dst_lng: float) -> Optional[dict]:
+        """
+        Driving route between two coordinates in the same shape as
+        OSRMClient.route(): {"duration", "distance", "geometry"}, or None
+        if either end is off the graph or no path exists.
+        """
+        source = self.nearest_node(src_lat, src_lng)
+        target = self.nearest_node(dst_lat, dst_lng)
+        if source is None or target is None:
+            return None
+        found = self.shortest_path(source, target)
+        if found is None:
+            return None
+        seconds, edges = found
+        nodes = self.path_nodes(source, edges)
+        points = [(src_lat, src_lng)] + [(float(self.lat[n]), float(self.lng[n])) for n in nodes] + [(dst_lat, dst_lng)]
+        return {
+            "duration": seconds,
+            "distance": float(np.sum(self.distance[edges], dtype=np.float64)) if edges else 0.0,
+            "geometry": encode(points),
+        }
+
+
+def load_road_graph(path: str = ROAD_GRAPH_PATH) -> Optional[RoadGraph]:
+    """The graph at `path` (ROAD_GRAPH_PATH by default), or None if not configured/present"""
+    if not path or not (Path(path) / "meta.json").exists():
+        return None
+    return RoadGraph(path)
+
+
+road_graph = load_road_graph()
@@ -3,41 +3,69 @@ Services for ambulance movement, patient handling, and emergency dispatch
 """
 import asyncio
 import math
+import os
+import threading
+import time
 import uuid
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 from .models import (
-    Patient, Ambulance, Hospital, Location, PatientStatus, AmbulanceStatus
+    Patient, Ambulance, Hospital, Location, PatientStatus, AmbulanceStatus, BedType,
+    PatientStatusResponse, TrafficUpdate
 )
 from .store import (
-    get_patient, get_ambulance, save_patient, save_ambulance,
-    get_available_ambulance, get_nearest_hospital, get_all_ambulances,
-    get_all_hospitals, add_log
+    get_patient, get_ambulance, get_hospital, save_patient, save_ambulance,
+    get_available_ambulances, count_available_ambulances, get_nearest_available_ambulances,
+    get_nearest_hospitals, iter_patients, iter_active_patients, iter_busy_ambulances,
+    get_all_hospitals, get_state_version, add_log, fleet, change_listeners,
+    sync_from_backend, get_ambulance_version, claim_ambulance, claim_patient, release_patient,
+    is_replaying, follow_route
 )
+from .state_backend import state_backend, LeaderElection
+from .ai.priority_engine import symptom_severity
+from .routing.haversine import haversine as haversine_distance
+from .ai.dispatch_engine import assign_ambulances
+from .dispatch_queue import WaitingQueue
+from .routing.osrm import osrm_client
+from .routing.polyline import decode
+from .routing.road_graph import road_graph
+from .routing.dynamic_reroute import RerouteEngine, Route
 
 
 # Speed constants
-AMBULANCE_SPEED = 0.0005  # degrees per second (~50 km/h)
+AMBULANCE_SPEED = 0.0005  # degrees per second (~50 km/h), for move_toward()
+AMBULANCE_SPEED_KMH = 50  # simulated speed along legs without a routed ETA
 MOVEMENT_INTERVAL = 1.0  # seconds
+# Seconds before an arrival is handled again when the patient's state has not caught up yet
+ARRIVAL_RETRY_DELAY = MOVEMENT_INTERVAL
 
+fleet.speed_kmh = AMBULANCE_SPEED_KMH
 
-def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Calculate distance between two coordinates in km"""
-    R = 6371  # Earth radius in km
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
-    
-    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
+# Dispatch constants
+ICU_SEVERITY_THRESHOLD = 8  # symptom severity at which an ICU bed is preferred
+# Seconds to collect requests for one batch assignment (0 = dispatch each request immediately)
+BATCH_DISPATCH_WINDOW = float(os.getenv("BATCH_DISPATCH_WINDOW", "0"))
+# Straight-line nearest ambulances/hospitals whose road times are compared per patient
+ROAD_ETA_CANDIDATES = int(os.getenv("ROAD_ETA_CANDIDATES", "5"))
+# Rounds of candidate search when concurrent dispatches claim our picks first
+CLAIM_ATTEMPTS = 3
+
+# Seconds between pulls of other workers' changes (shared STATE_BACKEND only)
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "0.05"))
+
+# Only the leader worker runs the simulation (arrivals); always us when not shared
+simulation_leader = LeaderElection(state_backend, "simulation", log=add_log)
+
+# WAITING patients that could not be dispatched yet, most urgent first
+waiting_queue = WaitingQueue()
 
 
 def move_toward(current: Location, target: Location, speed: float) -> Location:
-    """Move a location toward a target by a given speed"""
+    """
+    Move a location toward a target by a given speed (straight line, in
+    degrees). The simulation itself moves units along routed legs in fleet.py.
+    """
     distance = haversine_distance(
         current.lat, current.lng, target.lat, target.lng
     )
@@ -70,93 +98,578 @@ def calculate_eta(current: Location, target: Location, speed_kmh: float = 50) ->
     return max(seconds, 1)
 
 
+def travel_times(sources: List[Location], destinations: List[Location]):
+    """
+    Road travel times in seconds, sources x destinations, from one batched
+    OSRM table call (straight-line estimate where OSRM is unavailable)
+    """
+    return osrm_client.table_sync(
+        [(loc.lat, loc.lng) for loc in sources],
+        [(loc.lat, loc.lng) for loc in destinations],
+    )
+
+
+def get_active_patient() -> Optional[Patient]:
+    """Earliest patient that is not COMPLETED (waiting or in progress); O(active patients)"""
+    return min(iter_active_patients(), key=lambda p: p.createdAt, default=None)
+
+
+def build_patient_status(patient: Patient) -> PatientStatusResponse:
+    """Patient details plus live ambulance position/ETA and hospital destination"""
+    hospital = get_hospital(patient.hospitalId) if patient.hospitalId else None
+    
+    ambulance_location = None
+    ambulance_eta = None
+    if patient.ambulanceId:
+        ambulance = get_ambulance(patient.ambulanceId)
+        if ambulance:
+            ambulance_location = ambulance.location
+            target = patient.location if patient.status == PatientStatus.PICKUP else (
+                hospital.location if hospital else None
+            )
+            remaining = fleet.remaining_seconds(ambulance.ambulanceId)
+            if target and remaining is not None and ambulance.targetLocation == target:
+                ambulance_eta = math.ceil(remaining)  # time left on the (routed) leg
+            elif target:
+                ambulance_eta = calculate_eta(ambulance.location, target)
+    
+    return PatientStatusResponse(
+        patientId=patient.patientId,
+        name=patient.name,
+        age=patient.age,
+        condition=patient.condition,
+        status=patient.status,
+        location=patient.location,
+        ambulanceLocation=ambulance_location,
+        ambulanceETA=ambulance_eta,
+        hospitalLocation=hospital.location if hospital else None,
+        hospitalName=hospital.name if hospital else None,
+        ambulanceId=patient.ambulanceId
+    )
+
+
+def simulation_state_key() -> tuple:
+    """
+    Version of the simulated world: changes on every store save and, while
+    any ambulance is moving, once per MOVEMENT_INTERVAL tick.
+    """
+    tick = int(fleet.clock() / MOVEMENT_INTERVAL) if fleet.any_in_transit() else -1
+    return get_state_version(), tick
+
+
 def dispatch_ambulance(patient: Patient) -> tuple[Optional[str], Optional[str]]:
     """
     Dispatch an available ambulance and assign a hospital.
     Returns (ambulanceId, hospitalId)
+
+    Lock-free between dispatches: the patient and the chosen ambulance are
+    taken with compare-and-set claims, and a lost ambulance claim falls
+    back to the next fastest candidate.
     """
-    # Find available ambulance
-    ambulance = get_available_ambulance()
-    if not ambulance:
-        add_log(f"No available ambulances for patient {patient.patientId}", "WARNING")
-        return None, None
-    
-    # Find nearest hospital
-    hospital = get_nearest_hospital(patient.location.lat, patient.location.lng)
-    if not hospital:
-        add_log(f"No available hospitals for patient {patient.patientId}", "WARNING")
-        return None, None
+    if not claim_patient(patient.patientId):
+        # Already dispatched, or a concurrent dispatch has it
+        patient = get_patient(patient.patientId) or patient
+        return patient.ambulanceId, patient.hospitalId
+    try:
+        return dispatch_claimed(get_patient(patient.patientId))
+    finally:
+        release_patient(patient.patientId)
+
+
+def dispatch_claimed(patient: Patient) -> Tuple[Optional[str], Optional[str]]:
+    """dispatch_ambulance() for a patient the caller holds the claim_patient() of"""
+    hospital = None
+    for attempt in range(CLAIM_ATTEMPTS):
+        if attempt:
+            sync_shared_state(force=True)  # our view was stale: catch up before looking again
+        
+        # Fastest by road among the nearest available ambulances
+        candidates = get_nearest_available_ambulances(
+            patient.location.lat, patient.location.lng, ROAD_ETA_CANDIDATES
+        )
+        if not candidates:
+            add_log(f"No available ambulances for patient {patient.patientId}", "WARNING")
+            return None, None
+        versions = [get_ambulance_version(a.ambulanceId) for a in candidates]
+        etas = travel_times([a.location for a in candidates], [patient.location])[:, 0]
+        
+        if hospital is None:
+            hospital = choose_hospitals([patient])[0]
+            if not hospital:
+                add_log(f"No available hospitals for patient {patient.patientId}", "WARNING")
+                return None, None
+        
+        for best in etas.argsort().tolist():
+            ambulance = candidates[best]
+            if claim_ambulance(ambulance.ambulanceId, versions[best], patient.patientId):
+                assign(ambulance, patient, hospital, etas[best])
+                return ambulance.ambulanceId, hospital.hospitalId
     
-    # Assign ambulance
-    ambulance.status = AmbulanceStatus.ASSIGNED
-    ambulance.currentPatientId = patient.patientId
-    ambulance.targetLocation = patient.location
-    save_ambulance(ambulance)
+    add_log(f"Ambulances for patient {patient.patientId} kept being claimed by concurrent dispatches", "WARNING")
+    return None, None
+
+
+def hospital_candidates(patient: Patient) -> List[Hospital]:
+    """Nearest hospitals with a free bed, ICU beds only for critical conditions when any is free"""
+    lat, lng = patient.location.lat, patient.location.lng
+    if symptom_severity(patient.condition) >= ICU_SEVERITY_THRESHOLD:
+        icu = get_nearest_hospitals(lat, lng, ROAD_ETA_CANDIDATES, BedType.ICU)
+        if icu:
+            return icu
+    return get_nearest_hospitals(lat, lng, ROAD_ETA_CANDIDATES)
+
+
+def choose_hospitals(patients: List[Patient]) -> List[Optional[Hospital]]:
+    """
+    Fastest hospital by road for each patient, preferring a free ICU bed
+    for critical conditions. One travel time matrix covers the whole batch.
+    """
+    candidates = [hospital_candidates(p) for p in patients]
+    unique: Dict[str, Hospital] = {}
+    for hospitals in candidates:
+        for hospital in hospitals:
+            unique.setdefault(hospital.hospitalId, hospital)
+    if not unique:
+        return [None] * len(patients)
     
+    column = {hospital_id: j for j, hospital_id in enumerate(unique)}
+    etas = travel_times([p.location for p in patients], [h.location for h in unique.values()])
+    chosen = []
+    for i, hospitals in enumerate(candidates):
+        if not hospitals:
+            chosen.append(None)
+            continue
+        chosen.append(min(hospitals, key=lambda h: etas[i, column[h.hospitalId]]))
+    return chosen
+
+
+def assign(ambulance: Ambulance, patient: Patient, hospital: Hospital, eta: Optional[float] = None):
+    """
+    Send an ambulance to a patient bound for a hospital. The patient is
+    saved first: saving the ambulance schedules its leg, which is due at
+    once when the unit is already at the patient, and process_arrivals()
+    must then find the patient in PICKUP.
+    """
     # Update patient
     patient.status = PatientStatus.PICKUP
     patient.ambulanceId = ambulance.ambulanceId
     patient.hospitalId = hospital.hospitalId
-    patient.eta = calculate_eta(ambulance.location, patient.location)
+    road_route = reroute_engine.routes.get(ambulance.ambulanceId) if reroute_engine else None
+    if road_route is not None:
+        eta = road_route.seconds  # the leg is timed by the road graph route
+    if eta is None or not math.isfinite(eta):
+        patient.eta = calculate_eta(ambulance.location, patient.location)
+    else:
+        patient.eta = max(int(eta), 1) if eta > 0 else 0
     save_patient(patient)
     
+    # Assign ambulance
+    ambulance.status = AmbulanceStatus.ASSIGNED
+    ambulance.currentPatientId = patient.patientId
+    ambulance.targetLocation = patient.location
+    save_ambulance(ambulance)
+    
     # Log
     add_log(f"Ambulance {ambulance.ambulanceId} dispatched to patient {patient.patientId}")
+
+
+def dispatch_batch(patients: List[Patient]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    Dispatch several patients at once, minimizing the total ETA over the
+    patient x available-ambulance matrix instead of serving them greedily
+    in arrival order. Every match is committed with claim_ambulance(); a
+    patient whose matched unit was claimed concurrently is dispatched
+    greedily instead.
+    Returns {patientId: (ambulanceId, hospitalId)}, (None, None) if unserved.
+    """
+    results: Dict[str, Tuple[Optional[str], Optional[str]]] = {
+        p.patientId: (None, None) for p in patients
+    }
+    claimed = []
+    for patient in patients:
+        if claim_patient(patient.patientId):
+            claimed.append(get_patient(patient.patientId))
+        else:
+            latest = get_patient(patient.patientId) or patient
+            results[patient.patientId] = (latest.ambulanceId, latest.hospitalId)
+    try:
+        routed = []
+        for patient, hospital in zip(claimed, choose_hospitals(claimed)):
+            if hospital:
+                routed.append((patient, hospital))
+            else:
+                add_log(f"No available hospitals for patient {patient.patientId}", "WARNING")
+        
+        available = get_available_ambulances()
+        versions = [get_ambulance_version(a.ambulanceId) for a in available]
+        costs = None
+        if routed and available:
+            costs = travel_times([a.location for a in available], [p.location for p, _ in routed]).T
+        matches = assign_ambulances(
+            [(p.location.lat, p.location.lng) for p, _ in routed],
+            [(a.location.lat, a.location.lng) for a in available],
+            costs,
+        )
+        for patient_idx, ambulance_idx, eta in matches:
+            patient, hospital = routed[patient_idx]
+            ambulance = available[ambulance_idx]
+            if claim_ambulance(ambulance.ambulanceId, versions[ambulance_idx], patient.patientId):
+                assign(ambulance, patient, hospital, eta)
+                results[patient.patientId] = (ambulance.ambulanceId, hospital.hospitalId)
+            else:
+                results[patient.patientId] = dispatch_claimed(patient)
+    finally:
+        for patient in claimed:
+            release_patient(patient.patientId)
     
-    return ambulance.ambulanceId, hospital.hospitalId
+    unserved = sum(1 for amb_id, _ in results.values() if amb_id is None)
+    if unserved:
+        add_log(f"Batch dispatch: no ambulance for {unserved} of {len(patients)} patients", "WARNING")
+    return results
+
+
+class BatchDispatcher:
+    """
+    Collects dispatch requests for `window` seconds, then assigns the whole
+    batch with dispatch_batch(). Safe to call from sync request handlers,
+    which block on the returned future.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._pending: List[Tuple[Patient, Future]] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def submit(self, patient: Patient) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((patient, future))
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._timer = None
+        if not batch:
+            return
+        try:
+            results = dispatch_batch([patient for patient, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for patient, future in batch:
+            future.set_result(results[patient.patientId])
+
+
+batch_dispatcher = BatchDispatcher(BATCH_DISPATCH_WINDOW)
+
+
+def request_dispatch(patient: Patient) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Dispatch one patient, through the batch window when it is enabled.
+    A patient that cannot be served yet stays WAITING in waiting_queue.
+    """
+    if BATCH_DISPATCH_WINDOW > 0:
+        ambulance_id, hospital_id = batch_dispatcher.submit(patient).result()
+    else:
+        ambulance_id, hospital_id = dispatch_ambulance(patient)
+    if not ambulance_id:
+        waiting_queue.push(patient)
+        add_log(f"Patient {patient.patientId} queued for dispatch ({len(waiting_queue)} waiting)", "WARNING")
+    return ambulance_id, hospital_id
+
+
+def request_dispatch_batch(patients: List[Patient]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    Dispatch a bulk upload in one dispatch_batch() pass; patients that
+    cannot be served yet stay WAITING in waiting_queue.
+    """
+    results = dispatch_batch(patients) if patients else {}
+    queued = 0
+    for patient in patients:
+        if not results[patient.patientId][0]:
+            waiting_queue.push(patient)
+            queued += 1
+    if queued:
+        add_log(f"{queued} bulk patients queued for dispatch ({len(waiting_queue)} waiting)", "WARNING")
+    return results
+
+
+def dispatch_waiting() -> int:
+    """
+    Dispatch queued WAITING patients, most urgent first, while ambulances
+    are free. Call whenever an ambulance becomes AVAILABLE.
+    Returns the number of patients dispatched.
+    """
+    dispatched = 0
+    while count_available_ambulances() > 0:
+        patient_id = waiting_queue.pop()
+        if patient_id is None:
+            break
+        patient = get_patient(patient_id)
+        if not patient or patient.status != PatientStatus.WAITING:
+            continue  # served or cancelled some other way
+        ambulance_id, _ = dispatch_ambulance(patient)
+        if not ambulance_id:
+            waiting_queue.push(patient)  # e.g. no free hospital bed: retry on next release
+            break
+        dispatched += 1
+    return dispatched
+
+
+# ===== ROAD ROUTES & TRAFFIC =====
+
+def apply_reroute(route: Route):
+    """Push a recomputed road route into the ambulance's leg and its patient's ETA"""
+    follow_route(route.ambulance_id, road_graph.edge_points(route.edges), route.seconds)
+    ambulance = get_ambulance(route.ambulance_id)
+    patient = get_patient(ambulance.currentPatientId) if ambulance and ambulance.currentPatientId else None
+    if patient and patient.status == PatientStatus.PICKUP:
+        patient.eta = max(int(route.seconds), 1)
+        save_patient(patient)
+
+
+# Active routes on the offline road graph (only when ROAD_GRAPH_PATH is set)
+reroute_engine = RerouteEngine(road_graph, fleet.position, apply_reroute) if road_graph else None
+
+
+def _leg_target(entity_id: str) -> Optional[Location]:
+    """Where the ambulance is heading, None if it is idle (or gone)"""
+    ambulance = get_ambulance(entity_id)
+    if ambulance is None or ambulance.status == AmbulanceStatus.AVAILABLE:
+        return None
+    return ambulance.targetLocation
+
+
+def route_leg(entity_id: str):
+    """
+    Move an ambulance along a road route to its current target (offline
+    road graph, else OSRM geometry) timed by the route's travel time.
+    Without either it keeps its straight-line leg. May block on OSRM.
+    """
+    target = _leg_target(entity_id)
+    if target is None or fleet.following_route(entity_id):
+        return
+    lat, lng = fleet.position(entity_id)
+    path = None
+    if reroute_engine is not None:
+        route = reroute_engine.plan(entity_id, lat, lng, target.lat, target.lng)
+        if route is not None:
+            path, seconds = road_graph.edge_points(route.edges), route.seconds
+    if path is None:
+        route = osrm_client.route_sync(lat, lng, target.lat, target.lng)
+        if route is None or not route["geometry"]:
+            return
+        path, seconds = decode(route["geometry"]), route["duration"]
+
+    current = _leg_target(entity_id)
+    if current != target:  # changed while routing; a new target is queued again
+        if current is None and reroute_engine is not None:
+            reroute_engine.drop(entity_id)
+        return
+    follow_route(entity_id, path, seconds)
+
+
+class RouteLegQueue:
+    """
+    Ambulances whose new leg still needs a road route. The store listener
+    only enqueues; a background thread runs route_leg() (graph search or
+    OSRM call), so saves on the request path never wait on routing. An
+    ambulance queued twice is routed once. Started on first push.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, None] = {}  # insertion-ordered set
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def push(self, ambulance_id: str):
+        with self._lock:
+            self._pending[ambulance_id] = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="route-legs", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _pop(self) -> Optional[str]:
+        with self._lock:
+            if not self._pending:
+                return None
+            ambulance_id = next(iter(self._pending))
+            del self._pending[ambulance_id]
+            return ambulance_id
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            ambulance_id = self._pop()
+            while ambulance_id is not None:
+                try:
+                    route_leg(ambulance_id)
+                except Exception as exc:
+                    add_log(f"Routing leg of ambulance {ambulance_id} failed: {exc}", "ERROR")
+                ambulance_id = self._pop()
+
+
+route_legs = RouteLegQueue()
+
+
+def sync_route_leg(kind: str, entity_id: str):
+    """
+    Store listener: when an ambulance gets a new target, queue it for a
+    road route (see route_leg). Changes replayed from persistence or
+    another worker are skipped: they are restored, not new dispatches, and
+    the worker that routed the leg publishes it (store.follow_route).
+    """
+    if kind != "ambulance" or is_replaying():
+        return
+    if _leg_target(entity_id) is None:
+        if reroute_engine is not None:
+            reroute_engine.drop(entity_id)
+        return
+    if not fleet.following_route(entity_id):  # fleet.upsert drops the path when the target changes
+        route_legs.push(entity_id)
+
+
+change_listeners.append(sync_route_leg)
+
+
+def apply_traffic_updates(updates: List[TrafficUpdate]) -> List[dict]:
+    """
+    Apply segment slowdowns/closures and reroute only the ambulances whose
+    current route crosses a changed segment
+    """
+    factors: Dict[int, float] = {}
+    for update in updates:
+        factor = math.inf if update.closed else update.factor
+        for edge in reroute_engine.segment_edges(update.fromLat, update.fromLng, update.toLat, update.toLng):
+            factors[edge] = factor
+    
+    rerouted = reroute_engine.apply_traffic(factors)
+    for ambulance_id, route in rerouted:
+        if route is None:
+            add_log(f"No road route left for ambulance {ambulance_id} after traffic update", "WARNING")
+    add_log(f"Traffic update on {len(factors)} road edges: {len(rerouted)} ambulances rerouted")
+    return [
+        {"ambulanceId": ambulance_id, "eta": int(route.seconds) if route else None}
+        for ambulance_id, route in rerouted
+    ]
+
+
+_last_sync = 0.0
+
+
+def sync_shared_state(force: bool = False):
+    """
+    Apply what other worker processes changed (no-op unless the state
+    backend is shared), at most every SYNC_INTERVAL seconds unless forced.
+    Remote WAITING patients join this worker's waiting queue.
+    """
+    global _last_sync
+    if not state_backend.shared:
+        return
+    now = time.monotonic()
+    if not force and now - _last_sync < SYNC_INTERVAL:
+        return
+    _last_sync = now
+    for kind, model in sync_from_backend():
+        if kind == "patient" and model.status == PatientStatus.WAITING:
+            waiting_queue.push(model)
+
+
+def rebuild_waiting_queue():
+    """Queue every WAITING patient in the store (e.g. after restoring state)"""
+    waiting_queue.clear()
+    for patient in iter_patients(PatientStatus.WAITING):
+        waiting_queue.push(patient)
 
 
 async def update_ambulance_positions():
     """
     Simulate ambulance movement. Call this in a background task.
-    Every second, move ambulances toward their targets.
+
+    Positions are interpolated from each unit's current leg, so nothing is
+    stepped while ambulances are in transit. The task sleeps until the next
+    projected arrival (or until a new leg is scheduled) and only handles the
+    units whose leg ended.
+
+    With a shared state backend only the elected leader handles arrivals;
+    every worker pulls the others' changes every SYNC_INTERVAL seconds.
     """
-    while True:
-        await asyncio.sleep(MOVEMENT_INTERVAL)
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    fleet.on_schedule = lambda: loop.call_soon_threadsafe(wake.set)
+    try:
+        while True:
+            wake.clear()
+            timeout = None
+            if simulation_leader.is_leader:
+                # In a worker thread: freeing an ambulance may dispatch, which queries OSRM
+                await asyncio.to_thread(process_arrivals)
+                timeout = fleet.time_until_next_arrival()
+            if state_backend.shared:
+                await asyncio.to_thread(sync_shared_state)
+                timeout = SYNC_INTERVAL if timeout is None else min(timeout, SYNC_INTERVAL)
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        fleet.on_schedule = None
+
+
+def process_arrivals():
+    """
+    Apply the state transition of every ambulance whose leg has ended:
+    pickup -> head to hospital, hospital -> hand over the patient and
+    become AVAILABLE for the next queued patient. A unit whose patient is
+    not in PICKUP yet (still being assigned, or not synced from the worker
+    that dispatched it) is handed back after ARRIVAL_RETRY_DELAY.
+    """
+    freed = False
+    for ambulance_id in fleet.pop_due():
+        ambulance = get_ambulance(ambulance_id)
+        patient = get_patient(ambulance.currentPatientId) if ambulance.currentPatientId else None
         
-        for ambulance in get_all_ambulances():
-            if ambulance.status == AmbulanceStatus.AVAILABLE:
-                continue
-            
-            if ambulance.targetLocation is None:
-                continue
-            
-            # Check if reached target
-            distance = haversine_distance(
-                ambulance.location.lat, ambulance.location.lng,
-                ambulance.targetLocation.lat, ambulance.targetLocation.lng
-            )
-            
-            if distance < 0.0001:  # Reached target
-                patient = get_patient(ambulance.currentPatientId)
-                
-                if patient and patient.status == PatientStatus.PICKUP:
-                    # Reached patient, now go to hospital
-                    hospital = get_hospital(patient.hospitalId)
-                    if hospital:
-                        ambulance.status = AmbulanceStatus.TO_HOSPITAL
-                        ambulance.targetLocation = hospital.location
-                        patient.status = PatientStatus.TO_HOSPITAL
-                        add_log(f"Ambulance {ambulance.ambulanceId} picked up patient {patient.patientId}")
-                        save_patient(patient)
-                
-                elif patient and patient.status == PatientStatus.TO_HOSPITAL:
-                    # Reached hospital
-                    ambulance.status = AmbulanceStatus.COMPLETED
-                    ambulance.targetLocation = None
-                    ambulance.currentPatientId = None
-                    patient.status = PatientStatus.COMPLETED
-                    add_log(f"Ambulance {ambulance.ambulanceId} reached hospital with patient {patient.patientId}")
-                    save_patient(patient)
-            else:
-                # Move toward target
-                ambulance.location = move_toward(
-                    ambulance.location,
-                    ambulance.targetLocation,
-                    AMBULANCE_SPEED
-                )
-            
+        if patient and patient.status == PatientStatus.PICKUP:
+            # Reached patient, now go to hospital
+            hospital = get_hospital(patient.hospitalId)
+            if hospital:
+                ambulance.status = AmbulanceStatus.TO_HOSPITAL
+                ambulance.targetLocation = hospital.location
+                patient.status = PatientStatus.TO_HOSPITAL
+                add_log(f"Ambulance {ambulance.ambulanceId} picked up patient {patient.patientId}")
+                save_patient(patient)
+                save_ambulance(ambulance)
+        
+        elif patient and patient.status == PatientStatus.TO_HOSPITAL:
+            # Reached hospital
+            ambulance.status = AmbulanceStatus.AVAILABLE
+            ambulance.targetLocation = None
+            ambulance.currentPatientId = None
+            patient.status = PatientStatus.COMPLETED
+            add_log(f"Ambulance {ambulance.ambulanceId} reached hospital with patient {patient.patientId}")
+            save_patient(patient)
             save_ambulance(ambulance)
+            freed = True
+        
+        elif (ambulance.currentPatientId and ambulance.status != AmbulanceStatus.AVAILABLE
+              and (patient is None or patient.status == PatientStatus.WAITING)):
+            fleet.retry_arrival(ambulance_id, ARRIVAL_RETRY_DELAY)
+    
+    if freed:
+        dispatch_waiting()
 
 
 def create_demo_ambulances() -> Dict[str, Ambulance]:
@@ -259,12 +772,13 @@ def create_demo_hospitals() -> Dict[str, Hospital]:
 
 def release_all_ambulances():
     """Release all ambulances back to AVAILABLE status"""
-    for ambulance in get_all_ambulances():
+    for ambulance in iter_busy_ambulances():
         ambulance.status = AmbulanceStatus.AVAILABLE
         ambulance.currentPatientId = None
         ambulance.targetLocation = None
         save_ambulance(ambulance)
     add_log("All ambulances released")
+    dispatch_waiting()
 
 
 
@@ -0,0 +1,49 @@
+"""
+Versioned response snapshots with ETag / If-None-Match support
+"""
+import threading
+import uuid
+from typing import Callable, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+# Distinguishes ETags across restarts (state versions start again at 0)
+_EPOCH = uuid.uuid4().hex[:8]
+
+
+class SnapshotCache:
+    """
+    Holds the serialized body of one response for the current state key.
+
+    The first request after the key changes builds and serializes the
+    response; every other request for the same key gets the cached bytes,
+    so polling cost no longer grows with the number of dashboards open.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._key: Optional[Hashable] = None
+        self._etag = ""
+        self._body = b""
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], BaseModel]) -> Tuple[str, bytes]:
+        """Return (etag, body) for the given state key, building it at most once"""
+        with self._lock:
+            if key != self._key:
+                self._body = build().model_dump_json().encode()
+                self._etag = f'"{self.name}-{_EPOCH}-{".".join(map(str, key))}"'
+                self._key = key
+            return self._etag, self._body
+
+
+def etag_response(request: Request, etag: str, body: bytes) -> Response:
+    """200 with the cached body, or 304 if the client already has this version"""
+    # no-cache: clients may store the body but must revalidate every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
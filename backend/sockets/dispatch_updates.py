@@ -0,0 +1,135 @@
+"""
+Map update hub: one full snapshot per subscriber, then per-tick deltas.
+Ambulances carry "eta", the seconds left on their current leg (null when
+idle), refreshed in every "moved" entry: [id, lat, lng, eta].
+"""
+import asyncio
+import json
+import math
+import threading
+from typing import Dict, Optional, Set
+
+from ..store import (
+    get_patient, get_ambulance, get_hospital, iter_active_patients,
+    get_all_ambulances, get_all_hospitals, change_listeners, fleet
+)
+
+TICK_INTERVAL = 1.0  # seconds between delta broadcasts
+CLIENT_QUEUE_SIZE = 16  # pending messages per client before it is resynced
+COORD_DECIMALS = 6  # ~0.1 m, keeps "moved" entries short
+
+
+class MapUpdateHub:
+    """
+    Collects store changes between ticks and fans the same serialized
+    delta out to every subscriber, so each tick costs one build plus one
+    queue put per client, independent of fleet size when little changes.
+    """
+
+    def __init__(self):
+        self.tick = 0
+        self.subscribers: Set[asyncio.Queue] = set()
+        self._dirty: Dict[str, Set[str]] = {"patient": set(), "ambulance": set(), "hospital": set()}
+        self._lock = threading.Lock()
+        self._last_tick_time = fleet.clock()
+
+    def on_change(self, kind: str, entity_id: str):
+        """store change listener (may run on request worker threads)"""
+        with self._lock:
+            self._dirty[kind].add(entity_id)
+
+    def _drain(self) -> Dict[str, Set[str]]:
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = {kind: set() for kind in dirty}
+        return dirty
+
+    # ===== MESSAGES =====
+
+    @staticmethod
+    def _eta(ambulance_id: str) -> Optional[int]:
+        remaining = fleet.remaining_seconds(ambulance_id)
+        return None if remaining is None else math.ceil(remaining)
+
+    def _ambulance(self, ambulance) -> dict:
+        return {**ambulance.model_dump(mode="json"), "eta": self._eta(ambulance.ambulanceId)}
+
+    def snapshot_message(self) -> str:
+        """Full state for a newly connected client"""
+        return json.dumps({
+            "type": "snapshot",
+            "tick": self.tick,
+            "ambulances": [self._ambulance(a) for a in get_all_ambulances()],
+            "hospitals": [h.model_dump(mode="json") for h in get_all_hospitals()],
+            "patients": [p.model_dump(mode="json") for p in iter_active_patients()],
+        })
+
+    def delta_message(self) -> Optional[str]:
+        """Changes since the previous tick, or None if nothing changed"""
+        dirty = self._drain()
+        since, self._last_tick_time = self._last_tick_time, fleet.clock()
+
+        ids, lat, lng = fleet.moved_since(since)
+        moved = [
+            [amb_id, round(la, COORD_DECIMALS), round(ln, COORD_DECIMALS), self._eta(amb_id)]
+            for amb_id, la, ln in zip(ids, lat.tolist(), lng.tolist())
+            if amb_id not in dirty["ambulance"]  # full record is sent below
+        ]
+        changed = {
+            "ambulances": [get_ambulance(i) for i in dirty["ambulance"]],
+            "patients": [get_patient(i) for i in dirty["patient"]],
+            "hospitals": [get_hospital(i) for i in dirty["hospital"]],
+        }
+        if not moved and not any(changed.values()):
+            return None
+
+        message = {"type": "delta", "tick": self.tick, "moved": moved}
+        for key, items in changed.items():
+            dump = self._ambulance if key == "ambulances" else lambda item: item.model_dump(mode="json")
+            message[key] = [dump(item) for item in items if item is not None]
+        return json.dumps(message)
+
+    # ===== SUBSCRIBERS =====
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        queue.put_nowait(self.snapshot_message())
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, message: str):
+        snapshot = None
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Client fell behind: drop its backlog and resync it
+                while not queue.empty():
+                    queue.get_nowait()
+                if snapshot is None:
+                    snapshot = self.snapshot_message()
+                queue.put_nowait(snapshot)
+
+    async def run(self):
+        """Background task: broadcast one delta per tick"""
+        change_listeners.append(self.on_change)
+        try:
+            while True:
+                await asyncio.sleep(TICK_INTERVAL)
+                self.tick += 1
+                if not self.subscribers:
+                    # Nobody listening: keep the change sets from growing
+                    self._drain()
+                    self._last_tick_time = fleet.clock()
+                    continue
+                message = self.delta_message()
+                if message is not None:
+                    self.publish(message)
+        finally:
+            change_listeners.remove(self.on_change)
+
+
+hub = MapUpdateHub()
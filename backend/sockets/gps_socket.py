@@ -0,0 +1,41 @@
+"""
+WebSocket channel for live map updates (replaces polling GET /map/state)
+"""
+import asyncio
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from .dispatch_updates import hub
+
+router = APIRouter()
+
+
+@router.websocket("/ws/map")
+async def map_updates(websocket: WebSocket):
+    """
+    Live map feed.
+
+    Sends one {"type": "snapshot", ...} message with every ambulance,
+    hospital and active patient, then one {"type": "delta", ...} message
+    per tick containing only:
+    - moved: [[ambulanceId, lat, lng], ...] for units in transit
+    - ambulances / patients / hospitals: full records that changed
+    A client that falls behind receives a fresh snapshot.
+    """
+    await websocket.accept()
+    queue = hub.subscribe()
+
+    async def forward():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        while True:
+            # Client messages are ignored; this only notices the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        hub.unsubscribe(queue)
@@ -0,0 +1,153 @@
+"""
+In-memory spatial index for nearest-neighbour lookups
+"""
+import heapq
+import math
+import threading
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from .routing.haversine import haversine, KM_PER_DEGREE
+
+# Grid cell size in degrees (~1.1 km of latitude)
+DEFAULT_CELL_SIZE = 0.01
+
+Cell = Tuple[int, int]
+
+
+class GridIndex:
+    """
+    Uniform lat/lng grid of buckets.
+
+    Inserts, moves and removals are O(1). Nearest queries scan rings of
+    cells outward from the query point and stop as soon as no unvisited
+    cell can hold anything closer than the k-th best match, so the cost
+    depends on local density rather than the total number of items.
+
+    Safe to share between threads: a short internal lock covers each
+    operation (dispatch queries while arrivals and claims update it).
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells: Dict[Cell, Set[Hashable]] = {}
+        self._points: Dict[Hashable, Tuple[float, float, Cell]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._points
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._points))
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def insert(self, key: Hashable, lat: float, lng: float):
+        """Add an item, or move it if it is already indexed"""
+        cell = self._cell(lat, lng)
+        with self._lock:
+            old = self._points.get(key)
+            if old is not None and old[2] != cell:
+                self._discard_from_cell(key, old[2])
+            self._points[key] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key: Hashable):
+        """Remove an item if present"""
+        with self._lock:
+            old = self._points.pop(key, None)
+            if old is not None:
+                self._discard_from_cell(key, old[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def _discard_from_cell(self, key: Hashable, cell: Cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, center: Cell, r: int):
+        """Yield the cells at Chebyshev distance r from center"""
+        ci, cj = center
+        if r == 0:
+            yield center
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+    def _ring_lower_bound_km(self, lat: float, r: int) -> float:
+        """
+        Lower bound on the distance from the query point to anything in
+        ring r + 1 or beyond (at least r whole cells away on one axis).
+        """
+        gap_deg = r * self.cell_size
+        worst_lat = min(89.9, abs(lat) + gap_deg + self.cell_size)
+        return gap_deg * KM_PER_DEGREE * math.cos(math.radians(worst_lat))
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[float, Hashable]]:
+        """
+        Return up to k (distance_km, key) pairs, closest first.
+        """
+        with self._lock:
+            return self._nearest(lat, lng, k)
+
+    def _nearest(self, lat: float, lng: float, k: int) -> List[Tuple[float, Hashable]]:
+        if k <= 0 or not self._points:
+            return []
+
+        center = self._cell(lat, lng)
+        best: List[Tuple[float, Hashable]] = []  # max-heap via negated distance
+        seen = 0
+
+        def visit(bucket):
+            nonlocal seen
+            for key in bucket:
+                seen += 1
+                p_lat, p_lng, _ = self._points[key]
+                d = haversine(lat, lng, p_lat, p_lng)
+                if len(best) < k:
+                    heapq.heappush(best, (-d, key))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, key))
+
+        r = 0
+        while True:
+            if 8 * r > len(self._cells):
+                # Far from everything: rings are mostly empty, so finish by
+                # visiting the remaining occupied cells directly.
+                ci, cj = center
+                for (i, j), bucket in self._cells.items():
+                    if max(abs(i - ci), abs(j - cj)) >= r:
+                        visit(bucket)
+                break
+
+            for cell in self._ring(center, r):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    visit(bucket)
+
+            if seen >= len(self._points):
+                break
+            if len(best) >= k and self._ring_lower_bound_km(lat, r) >= -best[0][0]:
+                break
+            r += 1
+
+        return sorted(((-nd, key) for nd, key in best), key=lambda item: item[0])
+
+    def nearest_one(self, lat: float, lng: float) -> Optional[Hashable]:
+        """Key of the closest item, or None if the index is empty"""
+        result = self.nearest(lat, lng, 1)
+        return result[0][1] if result else None
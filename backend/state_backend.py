@@ -0,0 +1,388 @@
+"""
+Shared state backends, so several API worker processes see one world.
+
+Each worker keeps serving reads from its in-memory store; every save is
+also published to the backend, and workers pull the changes made by the
+others (sync_from_backend() in store.py). A backend provides:
+- publish()/changes_since(): latest JSON of each entity plus a global
+  sequence number, so a worker fetches only what changed since its last sync
+- publish_if(): publish only if the entity's sequence number is still the
+  one the caller last saw (compare-and-set, for claiming ambulances)
+- append_log()/logs_since(): the shared system log
+- lease()/release(): expiring named leases, for cross-process locks and
+  for electing the single worker that runs the simulation
+
+STATE_BACKEND selects the backend:
+    memory                  single process (default, no sharing)
+    sqlite:///path/to.db    shared SQLite file (WAL), workers on one host
+    redis://host:6379/0     Redis (needs the `redis` package)
+    fakeredis://            in-process fake Redis for tests (needs `fakeredis[lua]`:
+                            every write is a Lua script)
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+LOCK_TTL = 10.0  # seconds a crashed lock holder can block others
+LOG_RETENTION = 1000
+
+Change = Tuple[str, str, str, int]  # (kind, entity_id, json, seq)
+
+# Identifies this process as a lease owner
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class StateBackend:
+    """In-process backend: nothing is shared, every lease is granted"""
+
+    shared = False
+
+    def publish(self, kind: str, entity_id: str, data: str) -> int:
+        return 0
+
+    def publish_if(self, kind: str, entity_id: str, data: str, expected_seq: int) -> Optional[int]:
+        """publish() if the entity's seq is still expected_seq (0 = never published), else None"""
+        return 0
+
+    def changes_since(self, seq: int) -> Tuple[int, List[Change]]:
+        return seq, []
+
+    def append_log(self, data: str) -> int:
+        return 0
+
+    def logs_since(self, seq: int) -> Tuple[int, List[Tuple[int, str]]]:
+        return seq, []
+
+    def lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the lease `name` for `ttl` seconds; False if someone else holds it"""
+        return True
+
+    def release(self, name: str, owner: str):
+        pass
+
+    def lock(self, name: str) -> "BackendLock":
+        return BackendLock(self, name)
+
+
+class BackendLock:
+    """
+    Reentrant lock held across threads of this process and, on a shared
+    backend, across processes (through a lease renewed on each acquire)
+    """
+
+    def __init__(self, backend: StateBackend, name: str, ttl: float = LOCK_TTL):
+        self.backend = backend
+        self.name = f"lock:{name}"
+        self.ttl = ttl
+        self._local = threading.RLock()
+        self._depth = 0
+
+    def acquire(self):
+        self._local.acquire()
+        if self._depth == 0 and self.backend.shared:
+            delay = 0.0005
+            while not self.backend.lease(self.name, PROCESS_ID, self.ttl):
+                time.sleep(delay)
+                delay = min(delay * 2, 0.02)
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self.backend.shared:
+            self.backend.release(self.name, PROCESS_ID)
+        self._local.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SQLiteBackend(StateBackend):
+    """Shared SQLite file in WAL mode; one connection per thread"""
+
+    shared = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entities (
+        kind TEXT NOT NULL,
+        entity_id TEXT NOT NULL,
+        data TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (kind, entity_id)
+    );
+    CREATE INDEX IF NOT EXISTS entities_seq ON entities (seq);
+    CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    INSERT OR IGNORE INTO counters VALUES ('seq', 0);
+    CREATE TABLE IF NOT EXISTS logs (seq INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(self.SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _write(self, fn):
+        """Run fn(db) in a write transaction (serialized across processes)"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _insert(db, kind: str, entity_id: str, data: str) -> int:
+        db.execute("UPDATE counters SET value = value + 1 WHERE name = 'seq'")
+        seq = db.execute("SELECT value FROM counters WHERE name = 'seq'").fetchone()[0]
+        db.execute("INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)", (kind, entity_id, data, seq))
+        return seq
+
+    def publish(self, kind: str, entity_id: str, data: str) -> int:
+        return self._write(lambda db: self._insert(db, kind, entity_id, data))
+
+    def publish_if(self, kind: str, entity_id: str, data: str, expected_seq: int) -> Optional[int]:
+        def write(db):
+            row = db.execute(
+                "SELECT seq FROM entities WHERE kind = ? AND entity_id = ?", (kind, entity_id)
+            ).fetchone()
+            if (row[0] if row else 0) != expected_seq:
+                return None
+            return self._insert(db, kind, entity_id, data)
+        return self._write(write)
+
+    def changes_since(self, seq: int) -> Tuple[int, List[Change]]:
+        rows = self._db().execute(
+            "SELECT kind, entity_id, data, seq FROM entities WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        return (rows[-1][3] if rows else seq), rows
+
+    def append_log(self, data: str) -> int:
+        def write(db):
+            seq = db.execute("INSERT INTO logs (data) VALUES (?)", (data,)).lastrowid
+            if seq % LOG_RETENTION == 0:
+                db.execute("DELETE FROM logs WHERE seq <= ?", (seq - LOG_RETENTION,))
+            return seq
+        return self._write(write)
+
+    def logs_since(self, seq: int) -> Tuple[int, List[Tuple[int, str]]]:
+        rows = self._db().execute(
+            "SELECT seq, data FROM logs WHERE seq > ? ORDER BY seq LIMIT ?", (seq, LOG_RETENTION)
+        ).fetchall()
+        return (rows[-1][0] if rows else seq), rows
+
+    def lease(self, name: str, owner: str, ttl: float) -> bool:
+        def write(db):
+            now = time.time()
+            row = db.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, owner, now + ttl))
+            return True
+        return self._write(write)
+
+    def release(self, name: str, owner: str):
+        self._write(lambda db: db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)))
+
+
+class RedisBackend(StateBackend):
+    """
+    Redis: one hash per entity kind, a sorted set of "kind|id" scored by
+    sequence number as the change feed, a capped stream for logs and
+    SET NX PX leases
+    """
+
+    shared = True
+
+    # Renew only our own lease, atomically
+    RENEW = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    # Allocate the seq and write the change in one step, so no reader can
+    # see seq N+1 in the change feed before N is written
+    # KEYS: entity hash, change zset, seq counter; ARGV: "kind|id", id, data
+    PUBLISH = """
+    local seq = redis.call('incr', KEYS[3])
+    redis.call('hset', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('zadd', KEYS[2], seq, ARGV[1])
+    return seq
+    """
+    # Same, only if the entity's seq is still ARGV[4]
+    PUBLISH_IF = """
+    local current = tonumber(redis.call('zscore', KEYS[2], ARGV[1]) or '0')
+    if current ~= tonumber(ARGV[4]) then
+        return false
+    end
+    local seq = redis.call('incr', KEYS[3])
+    redis.call('hset', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('zadd', KEYS[2], seq, ARGV[1])
+    return seq
+    """
+    # Stream entry id "<seq>-0" allocated with the append (ids stay increasing)
+    # KEYS: log stream, log seq counter; ARGV: data, max length
+    APPEND_LOG = """
+    local seq = redis.call('incr', KEYS[2])
+    redis.call('xadd', KEYS[1], 'MAXLEN', '~', ARGV[2], seq .. '-0', 'data', ARGV[1])
+    return seq
+    """
+    RELEASE = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client, prefix: str = "ambulance"):
+        self.r = client
+        self.prefix = prefix
+        self._renew = client.register_script(self.RENEW)
+        self._release = client.register_script(self.RELEASE)
+        self._publish = client.register_script(self.PUBLISH)
+        self._publish_if = client.register_script(self.PUBLISH_IF)
+        self._append_log = client.register_script(self.APPEND_LOG)
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def publish(self, kind: str, entity_id: str, data: str) -> int:
+        seq = self._publish(
+            keys=[self._key("entities", kind), self._key("changes"), self._key("seq")],
+            args=[f"{kind}|{entity_id}", entity_id, data],
+        )
+        return int(seq)
+
+    def publish_if(self, kind: str, entity_id: str, data: str, expected_seq: int) -> Optional[int]:
+        seq = self._publish_if(
+            keys=[self._key("entities", kind), self._key("changes"), self._key("seq")],
+            args=[f"{kind}|{entity_id}", entity_id, data, expected_seq],
+        )
+        return int(seq) if seq is not None else None
+
+    def changes_since(self, seq: int) -> Tuple[int, List[Change]]:
+        members = self.r.zrangebyscore(self._key("changes"), f"({seq}", "+inf", withscores=True)
+        if not members:
+            return seq, []
+        pipe = self.r.pipeline(transaction=False)
+        keys = []
+        for member, score in members:
+            kind, entity_id = member.decode().split("|", 1)
+            keys.append((kind, entity_id, int(score)))
+            pipe.hget(self._key("entities", kind), entity_id)
+        changes = [
+            (kind, entity_id, data.decode(), score)
+            for (kind, entity_id, score), data in zip(keys, pipe.execute())
+            if data is not None
+        ]
+        return keys[-1][2], changes
+
+    def append_log(self, data: str) -> int:
+        seq = self._append_log(keys=[self._key("logs"), self._key("log_seq")], args=[data, LOG_RETENTION])
+        return int(seq)
+
+    def logs_since(self, seq: int) -> Tuple[int, List[Tuple[int, str]]]:
+        entries = self.r.xrange(self._key("logs"), min=f"({seq}-0", max="+", count=LOG_RETENTION)
+        rows = [(int(entry_id.decode().split("-")[0]), fields[b"data"].decode()) for entry_id, fields in entries]
+        return (rows[-1][0] if rows else seq), rows
+
+    def lease(self, name: str, owner: str, ttl: float) -> bool:
+        key = self._key("lease", name)
+        ttl_ms = int(ttl * 1000)
+        if self.r.set(key, owner, nx=True, px=ttl_ms):
+            return True
+        return bool(self._renew(keys=[key], args=[owner, ttl_ms]))
+
+    def release(self, name: str, owner: str):
+        self._release(keys=[self._key("lease", name)], args=[owner])
+
+
+def create_backend(url: str = STATE_BACKEND) -> StateBackend:
+    """Backend for a STATE_BACKEND url (see the module docstring)"""
+    if url in ("", "memory"):
+        return StateBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("STATE_BACKEND=redis:// needs the 'redis' package (pip install redis)") from exc
+        return RedisBackend(redis.Redis.from_url(url))
+    if url.startswith("fakeredis://"):
+        try:
+            import fakeredis
+            import lupa  # noqa: F401  (fakeredis runs EVAL/EVALSHA through it)
+        except ImportError as exc:
+            raise RuntimeError(
+                "STATE_BACKEND=fakeredis:// needs the 'fakeredis[lua]' package (pip install 'fakeredis[lua]')"
+            ) from exc
+        return RedisBackend(fakeredis.FakeRedis())
+    raise ValueError(f"Unknown STATE_BACKEND: {url}")
+
+
+class LeaderElection:
+    """
+    Keeps (or tries to take) a lease so exactly one worker acts as leader,
+    e.g. runs the simulation. Renewed every ttl / 3 seconds by run().
+    `log(message, level)` (e.g. store.add_log) hears about failed checks.
+    """
+
+    def __init__(self, backend: StateBackend, name: str = "simulation", ttl: float = 5.0,
+                 log: Optional[Callable[[str, str], None]] = None):
+        self.backend = backend
+        self.name = f"leader:{name}"
+        self.ttl = ttl
+        self.log = log
+        self.is_leader = not backend.shared
+        self._failing = False
+
+    def check(self) -> bool:
+        try:
+            self.is_leader = self.backend.lease(self.name, PROCESS_ID, self.ttl)
+            self._failing = False
+        except Exception as exc:  # backend unreachable: step down rather than risk two leaders
+            if not self._failing and self.log is not None:  # once per outage, not every retry
+                self.log(f"Leader lease check for {self.name} failed: {exc}", "ERROR")
+            self._failing = True
+            self.is_leader = False
+        return self.is_leader
+
+    async def run(self):
+        import asyncio
+        if not self.backend.shared:
+            return
+        try:
+            while True:
+                await asyncio.to_thread(self.check)
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            if self.is_leader:
+                self.backend.release(self.name, PROCESS_ID)
+                self.is_leader = False
+
+
+# Backend of this process (memory unless STATE_BACKEND says otherwise)
+state_backend = create_backend()
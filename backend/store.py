@@ -1,28 +1,113 @@
 """
 In-memory data storage for Smart Ambulance System
 """
-from .models import Patient, Ambulance, Hospital, SystemLogEntry
+from .models import Patient, Ambulance, Hospital, SystemLogEntry, AmbulanceStatus, BedType, PatientStatus
+from .spatial_index import GridIndex
+from .fleet import FleetState
+from .state_backend import state_backend, PROCESS_ID, LOCK_TTL
+from .log_buffer import LogBuffer, LogSink
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from pydantic import BaseModel
+import atexit
+import json
+import threading
+import time
 
 # Global in-memory storage
 patients: Dict[str, Patient] = {}
 ambulances: Dict[str, Ambulance] = {}
 hospitals: Dict[str, Hospital] = {}
-system_logs: List[SystemLogEntry] = []
+system_logs = LogBuffer()  # last LOG_CAPACITY entries
+
+# Writes log lines to LOG_SINK (stdout by default) off the calling thread
+log_sink = LogSink()
+atexit.register(log_sink.close)
+
+# Array-backed positions/targets/status of every ambulance (source of truth
+# for position; models are refreshed from it on read)
+fleet = FleetState()
+
+# Spatial index over AVAILABLE ambulances only, kept in sync by save_ambulance
+available_ambulance_index = GridIndex()
+
+# Spatial indexes over hospitals with at least one free bed of each type,
+# kept in sync by save_hospital
+free_bed_indexes: Dict[BedType, GridIndex] = {
+    BedType.GENERAL: GridIndex(cell_size=0.05),
+    BedType.ICU: GridIndex(cell_size=0.05),
+}
+
+# Secondary indexes: ids per status (dicts as insertion-ordered sets), kept
+# in sync by save_patient/save_ambulance, plus the status each id is indexed
+# under (callers change .status in place before saving)
+patients_by_status: Dict[PatientStatus, Dict[str, None]] = {s: {} for s in PatientStatus}
+ambulances_by_status: Dict[AmbulanceStatus, Dict[str, None]] = {s: {} for s in AmbulanceStatus}
+_patient_status: Dict[str, PatientStatus] = {}
+_ambulance_status: Dict[str, AmbulanceStatus] = {}
+
+ACTIVE_PATIENT_STATUSES = (
+    PatientStatus.WAITING, PatientStatus.PICKUP, PatientStatus.TO_HOSPITAL, PatientStatus.ARRIVED
+)
+BUSY_AMBULANCE_STATUSES = (
+    AmbulanceStatus.ASSIGNED, AmbulanceStatus.PICKING_UP, AmbulanceStatus.TO_HOSPITAL, AmbulanceStatus.COMPLETED
+)
+
+# Per-ambulance version, bumped by every save; claim_ambulance() compares it
+ambulance_versions: Dict[str, int] = {}
+
+# Striped locks: save_ambulance and the claim_* functions of one entity are
+# atomic with respect to each other without a global lock
+_stripes = [threading.Lock() for _ in range(64)]
+
+# Called as listener(kind, entity_id) after every save_* ("patient",
+# "ambulance" or "hospital"), e.g. to push map deltas to WebSocket clients
+change_listeners: List[Callable[[str, str], None]] = []
+
+# Called as listener(entry) for every add_log, e.g. to persist the log
+log_listeners: List[Callable[[SystemLogEntry], None]] = []
+
+# Bumped on every save_* / add_log, used to version cached responses. Saves
+# come from several threads (dispatch, batch dispatcher, persistence, vitals):
+# an unlocked += can lose a bump and leave a stale snapshot behind its ETag
+state_version = 0
+log_version = 0
+_version_lock = threading.Lock()
+
+
+def _notify(kind: str, entity_id: str):
+    global state_version
+    with _version_lock:
+        state_version += 1
+    for listener in change_listeners:
+        listener(kind, entity_id)
 
 
 def add_log(message: str, level: str = "INFO"):
     """Add a system log entry"""
+    global log_version
+    with _version_lock:
+        log_version += 1
     log = SystemLogEntry(
         timestamp=datetime.now(),
         message=message,
         level=level
     )
     system_logs.append(log)
-    if len(system_logs) > 1000:  # Keep last 1000 logs
-        system_logs.pop(0)
-    print(f"[{level}] {message}")
+    for listener in log_listeners:
+        listener(log)
+    log_sink.write(log)
+
+
+def get_state_version() -> int:
+    """Counter bumped on every save_* call"""
+    return state_version
+
+
+def get_log_version() -> int:
+    """Counter bumped on every add_log call"""
+    return log_version
 
 
 def get_patient(patient_id: str) -> Optional[Patient]:
@@ -32,7 +117,10 @@ def get_patient(patient_id: str) -> Optional[Patient]:
 
 def get_ambulance(ambulance_id: str) -> Optional[Ambulance]:
     """Retrieve an ambulance"""
-    return ambulances.get(ambulance_id)
+    ambulance = ambulances.get(ambulance_id)
+    if ambulance is not None:
+        fleet.refresh(ambulance)
+    return ambulance
 
 
 def get_hospital(hospital_id: str) -> Optional[Hospital]:
@@ -40,14 +128,71 @@ def get_hospital(hospital_id: str) -> Optional[Hospital]:
     return hospitals.get(hospital_id)
 
 
+def _reindex(by_status: dict, indexed: dict, entity_id: str, status):
+    old = indexed.get(entity_id)
+    if old != status:
+        if old is not None:
+            by_status[old].pop(entity_id, None)
+        by_status[status][entity_id] = None
+        indexed[entity_id] = status
+
+
 def save_patient(patient: Patient):
     """Save a patient"""
-    patients[patient.patientId] = patient
+    with _stripe(patient.patientId):
+        patients[patient.patientId] = patient
+        _reindex(patients_by_status, _patient_status, patient.patientId, patient.status)
+    _notify("patient", patient.patientId)
+
+
+def _stripe(entity_id: str) -> threading.Lock:
+    return _stripes[hash(entity_id) % len(_stripes)]
 
 
 def save_ambulance(ambulance: Ambulance):
     """Save an ambulance"""
-    ambulances[ambulance.ambulanceId] = ambulance
+    ambulance_id = ambulance.ambulanceId
+    with _stripe(ambulance_id):
+        ambulances[ambulance_id] = ambulance
+        ambulance_versions[ambulance_id] = ambulance_versions.get(ambulance_id, 0) + 1
+        _reindex(ambulances_by_status, _ambulance_status, ambulance_id, ambulance.status)
+        fleet.upsert(ambulance)
+        if ambulance.status == AmbulanceStatus.AVAILABLE:
+            lat, lng = fleet.position(ambulance_id)
+            available_ambulance_index.insert(ambulance_id, lat, lng)
+        else:
+            available_ambulance_index.remove(ambulance_id)
+    _notify("ambulance", ambulance_id)
+
+
+def follow_route(ambulance_id: str, points: Sequence[Tuple[float, float]], seconds: Optional[float] = None) -> bool:
+    """
+    fleet.follow() a road route to the ambulance's current target. With a
+    shared backend the leg is published too, so every worker animates the
+    same route and counts down the same ETA (see _apply_leg).
+    """
+    if not fleet.follow(ambulance_id, points, seconds):
+        return False
+    _publish_leg(ambulance_id, points)
+    return True
+
+
+def free_beds(hospital: Hospital, bed_type: BedType = BedType.GENERAL) -> int:
+    """Number of free beds of the given type"""
+    if bed_type == BedType.ICU:
+        return hospital.icuBeds - hospital.occupiedIcuBeds
+    return hospital.generalBeds - hospital.occupiedBeds
+
+
+def save_hospital(hospital: Hospital):
+    """Save a hospital (call after changing occupiedBeds/occupiedIcuBeds)"""
+    hospitals[hospital.hospitalId] = hospital
+    for bed_type, index in free_bed_indexes.items():
+        if free_beds(hospital, bed_type) > 0:
+            index.insert(hospital.hospitalId, hospital.location.lat, hospital.location.lng)
+        else:
+            index.remove(hospital.hospitalId)
+    _notify("hospital", hospital.hospitalId)
 
 
 def get_all_patients() -> List[Patient]:
@@ -57,7 +202,7 @@ def get_all_patients() -> List[Patient]:
 
 def get_all_ambulances() -> List[Ambulance]:
     """Get all ambulances"""
-    return list(ambulances.values())
+    return fleet.refresh_many(ambulances.values())
 
 
 def get_all_hospitals() -> List[Hospital]:
@@ -65,22 +210,157 @@ def get_all_hospitals() -> List[Hospital]:
     return list(hospitals.values())
 
 
-def get_available_ambulance() -> Optional[Ambulance]:
-    """Get the first available ambulance"""
-    for amb in ambulances.values():
-        from .models import AmbulanceStatus
-        if amb.status == AmbulanceStatus.AVAILABLE:
-            return amb
-    return None
+def iter_patients(*statuses: PatientStatus) -> Iterator[Patient]:
+    """
+    Patients with any of the given statuses, from the status index: O(result),
+    no copy of the store (only a snapshot of the matching ids, so saving
+    while iterating is safe)
+    """
+    for status in statuses:
+        for patient_id in tuple(patients_by_status[status]):
+            patient = patients.get(patient_id)
+            if patient is not None:
+                yield patient
+
+
+def iter_active_patients() -> Iterator[Patient]:
+    """Patients that are not COMPLETED (waiting or in progress)"""
+    return iter_patients(*ACTIVE_PATIENT_STATUSES)
+
+
+def count_patients(status: PatientStatus) -> int:
+    """Number of patients with the given status"""
+    return len(patients_by_status[status])
+
+
+def iter_ambulances(*statuses: AmbulanceStatus) -> Iterator[Ambulance]:
+    """Ambulances with any of the given statuses, current position, like iter_patients()"""
+    for status in statuses:
+        for ambulance_id in tuple(ambulances_by_status[status]):
+            ambulance = ambulances.get(ambulance_id)
+            if ambulance is not None:
+                yield fleet.refresh(ambulance)
+
+
+def iter_busy_ambulances() -> Iterator[Ambulance]:
+    """Ambulances that are not AVAILABLE (on a call)"""
+    return iter_ambulances(*BUSY_AMBULANCE_STATUSES)
+
+
+def count_ambulances(status: AmbulanceStatus) -> int:
+    """Number of ambulances with the given status"""
+    return len(ambulances_by_status[status])
+
+
+def get_nearest_available_ambulances(lat: float, lng: float, k: int = 1) -> List[Ambulance]:
+    """Get up to k AVAILABLE ambulances, closest to (lat, lng) first"""
+    return [get_ambulance(amb_id) for _, amb_id in available_ambulance_index.nearest(lat, lng, k)]
+
+
+def get_ambulance_version(ambulance_id: str) -> int:
+    """Current version of an ambulance, to pass to claim_ambulance()"""
+    return ambulance_versions.get(ambulance_id, 0)
+
+
+# ===== ATOMIC CLAIMS =====
+# Dispatch takes ambulances and patients with compare-and-set claims instead
+# of one global lock: concurrent dispatches only contend when they want the
+# same unit or patient, and then exactly one of them wins.
 
+_dispatching: set = set()  # patients claimed by a dispatch of this process
 
-def get_nearest_hospital(lat: float, lng: float) -> Optional[Hospital]:
-    """Get the nearest hospital (simplified - just returns first with available beds)"""
-    for hosp in hospitals.values():
-        available = hosp.generalBeds - hosp.occupiedBeds
-        if available > 0:
-            return hosp
-    return None
+
+def claim_ambulance(ambulance_id: str, version: int, patient_id: str) -> bool:
+    """
+    Mark an ambulance ASSIGNED to patient_id if it is still AVAILABLE and
+    unchanged since `version` was read (get_ambulance_version), in all
+    worker processes when the state backend is shared. False if another
+    dispatch changed it first. Complete the assignment with save_ambulance().
+    """
+    with _stripe(ambulance_id):
+        ambulance = ambulances.get(ambulance_id)
+        if (ambulance is None or ambulance.status != AmbulanceStatus.AVAILABLE
+                or ambulance_versions.get(ambulance_id) != version):
+            return False
+        if state_backend.shared:
+            claimed = fleet.refresh(ambulance).model_copy(
+                update={"status": AmbulanceStatus.ASSIGNED, "currentPatientId": patient_id}
+            )
+            if not _publish_if("ambulance", ambulance_id, claimed.model_dump_json()):
+                return False
+        ambulance.status = AmbulanceStatus.ASSIGNED
+        ambulance.currentPatientId = patient_id
+        ambulance_versions[ambulance_id] = version + 1
+        _reindex(ambulances_by_status, _ambulance_status, ambulance_id, ambulance.status)
+        fleet.upsert(ambulance)
+        available_ambulance_index.remove(ambulance_id)
+        return True
+
+
+def claim_patient(patient_id: str) -> bool:
+    """
+    Reserve a WAITING patient for one dispatch attempt; False if it is not
+    WAITING (in any worker process with a shared backend) or another
+    dispatch holds it. Always pair with release_patient().
+    """
+    with _stripe(patient_id):
+        patient = patients.get(patient_id)
+        if patient is None or patient.status != PatientStatus.WAITING or patient_id in _dispatching:
+            return False
+        if state_backend.shared:
+            # The lease excludes dispatches in flight elsewhere, the
+            # compare-and-set ones that already finished
+            lease = f"dispatch:{patient_id}"
+            if not state_backend.lease(lease, PROCESS_ID, LOCK_TTL):
+                return False
+            if not _publish_if("patient", patient_id, patient.model_dump_json()):
+                state_backend.release(lease, PROCESS_ID)
+                return False
+        _dispatching.add(patient_id)
+        return True
+
+
+def release_patient(patient_id: str):
+    """End the dispatch attempt started by a successful claim_patient()"""
+    with _stripe(patient_id):
+        if patient_id in _dispatching:
+            _dispatching.discard(patient_id)
+            if state_backend.shared:
+                state_backend.release(f"dispatch:{patient_id}", PROCESS_ID)
+
+
+def count_available_ambulances() -> int:
+    """Number of AVAILABLE ambulances"""
+    return len(available_ambulance_index)
+
+
+def get_available_ambulances() -> List[Ambulance]:
+    """Get all AVAILABLE ambulances (O(available), via the spatial index)"""
+    return fleet.refresh_many(ambulances[amb_id] for amb_id in available_ambulance_index)
+
+
+def get_available_ambulance(lat: Optional[float] = None, lng: Optional[float] = None) -> Optional[Ambulance]:
+    """Get the nearest available ambulance (any available one if no location is given)"""
+    if lat is None or lng is None:
+        return next(iter_ambulances(AmbulanceStatus.AVAILABLE), None)
+    nearest = get_nearest_available_ambulances(lat, lng, 1)
+    return nearest[0] if nearest else None
+
+
+def get_nearest_hospitals(
+    lat: float, lng: float, k: int = 1, bed_type: BedType = BedType.GENERAL
+) -> List[Hospital]:
+    """Get up to k hospitals with a free bed of the given type, closest first"""
+    index = free_bed_indexes[bed_type]
+    return [hospitals[hosp_id] for _, hosp_id in index.nearest(lat, lng, k)]
+
+
+def get_nearest_hospital(
+    lat: float, lng: float, bed_type: BedType = BedType.GENERAL
+) -> Optional[Hospital]:
+    """Get the nearest hospital with a free bed of the given type"""
+    nearest = get_nearest_hospitals(lat, lng, 1, bed_type)
+    return nearest[0] if nearest else None
 
 
 def clear_all():
@@ -90,3 +370,162 @@ def clear_all():
     ambulances.clear()
     hospitals.clear()
     system_logs.clear()
+    fleet.clear()
+    for by_status in (patients_by_status, ambulances_by_status):
+        for ids in by_status.values():
+            ids.clear()
+    _patient_status.clear()
+    _ambulance_status.clear()
+    available_ambulance_index.clear()
+    for index in free_bed_indexes.values():
+        index.clear()
+
+
+# ===== SHARED STATE (several worker processes) =====
+# With a shared STATE_BACKEND every save_* / add_log is also published to
+# the backend, and sync_from_backend() applies what other processes
+# published through the same save_* functions (so indexes, the fleet and
+# listeners see remote changes like local ones). Road legs (follow_route)
+# are published as kind "leg" and only applied to the fleet.
+
+_MODELS = {"patient": Patient, "ambulance": Ambulance, "hospital": Hospital}
+_SAVERS = {"patient": save_patient, "ambulance": save_ambulance, "hospital": save_hospital}
+
+_remote = threading.local()  # .active while applying remote or persisted changes: not re-published
+
+
+@contextmanager
+def replaying():
+    """
+    Apply changes that already happened elsewhere (another worker, the
+    persisted journal): they are not re-published, and listeners can skip
+    side effects such as route fetches (see is_replaying()).
+    """
+    _remote.active = True
+    try:
+        yield
+    finally:
+        _remote.active = False
+
+
+def is_replaying() -> bool:
+    """True inside replaying() on this thread"""
+    return getattr(_remote, "active", False)
+
+
+_seq_lock = threading.Lock()  # publish + remember own seq vs. fetch changes
+_sync_lock = threading.Lock()  # one sync at a time
+_own_seqs: set = set()  # seqs published by this process and not yet synced past
+_own_log_seqs: set = set()
+_entity_seqs: Dict[Tuple[str, str], int] = {}  # latest seq seen per (kind, entity_id)
+_synced_seq = 0
+_synced_log_seq = 0
+
+
+def _publish(kind: str, entity_id: str):
+    if is_replaying():
+        return
+    if kind == "ambulance":
+        entity = get_ambulance(entity_id)  # refreshed from the fleet: current position
+    else:
+        entity = patients.get(entity_id) if kind == "patient" else hospitals.get(entity_id)
+    _publish_data(kind, entity_id, entity.model_dump_json())
+
+
+def _publish_data(kind: str, entity_id: str, data: str):
+    with _seq_lock:
+        seq = state_backend.publish(kind, entity_id, data)
+        _own_seqs.add(seq)
+        _entity_seqs[(kind, entity_id)] = seq
+
+
+def _publish_leg(ambulance_id: str, points: Sequence[Tuple[float, float]]):
+    """Publish a road leg: its target, polyline and wall-clock arrival time"""
+    if not state_backend.shared or is_replaying():
+        return
+    remaining = fleet.remaining_seconds(ambulance_id)
+    target = ambulances[ambulance_id].targetLocation
+    if remaining is None or target is None:  # the leg ended meanwhile
+        return
+    _publish_data("leg", ambulance_id, json.dumps({
+        "target": [target.lat, target.lng],
+        "points": [list(p) for p in points],
+        "arrives": time.time() + remaining,
+    }))
+
+
+def _apply_leg(ambulance_id: str, data: str):
+    """Follow a leg another worker published, if it still leads to the ambulance's target"""
+    leg = json.loads(data)
+    ambulance = ambulances.get(ambulance_id)
+    target = ambulance.targetLocation if ambulance is not None else None
+    if target is None or [target.lat, target.lng] != leg["target"]:
+        return  # stale: the ambulance has moved on to another leg
+    fleet.follow(ambulance_id, leg["points"], max(0.0, leg["arrives"] - time.time()))
+
+
+def _publish_if(kind: str, entity_id: str, data: str) -> bool:
+    """Publish only if nobody published the entity since this process last saw it"""
+    key = (kind, entity_id)
+    with _seq_lock:
+        seq = state_backend.publish_if(kind, entity_id, data, _entity_seqs.get(key, 0))
+        if seq is None:
+            return False
+        _own_seqs.add(seq)
+        _entity_seqs[key] = seq
+        return True
+
+
+def _publish_log(entry: SystemLogEntry):
+    if is_replaying():
+        return
+    try:
+        with _seq_lock:
+            _own_log_seqs.add(state_backend.append_log(entry.model_dump_json()))
+    except Exception as exc:  # logging must never fail the request that logged
+        log_sink.write(SystemLogEntry(
+            timestamp=datetime.now(), message=f"Shared log append failed: {exc}", level="ERROR"
+        ))
+
+
+def sync_from_backend() -> List[Tuple[str, BaseModel]]:
+    """
+    Apply the entity changes, road legs and logs other processes published
+    since the last sync. Returns the applied (kind, model) pairs (legs are
+    not models and are not returned).
+    """
+    global _synced_seq, _synced_log_seq, log_version
+    if not state_backend.shared:
+        return []
+    with _sync_lock:
+        with _seq_lock:
+            seq, changes = state_backend.changes_since(_synced_seq)
+            log_seq, logs = state_backend.logs_since(_synced_log_seq)
+            # Skip our own changes and versions older than one we already have
+            changes = [c for c in changes if c[3] not in _own_seqs and c[3] > _entity_seqs.get(c[:2], 0)]
+            for kind, entity_id, _, change_seq in changes:
+                _entity_seqs[(kind, entity_id)] = change_seq
+            logs = [row for row in logs if row[0] not in _own_log_seqs]
+            _own_seqs.difference_update([s for s in _own_seqs if s <= seq])
+            _own_log_seqs.difference_update([s for s in _own_log_seqs if s <= log_seq])
+            _synced_seq, _synced_log_seq = seq, log_seq
+
+        applied = []
+        with replaying():
+            for kind, entity_id, data, _ in changes:
+                if kind == "leg":
+                    _apply_leg(entity_id, data)
+                    continue
+                model = _MODELS[kind].model_validate_json(data)
+                _SAVERS[kind](model)
+                applied.append((kind, model))
+            for _, data in logs:
+                system_logs.append(SystemLogEntry.model_validate_json(data))
+                with _version_lock:
+                    log_version += 1
+        return applied
+
+
+if state_backend.shared:
+    change_listeners.append(_publish)
+    log_listeners.append(_publish_log)
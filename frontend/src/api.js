@@ -51,7 +51,8 @@ async function apiCall(endpoint, options = {}) {
       throw new Error(errorData.detail || `HTTP ${response.status}`);
     }
 
-    return await response.json();
+    const data = await response.json();
+    return options.withStatus ? { status: response.status, data } : data;
   } catch (error) {
     console.error(`API Error [${endpoint}]:`, error);
     throw error;
@@ -74,8 +75,12 @@ export async function adminLogin(username, password) {
 /**
  * EMERGENCY ENDPOINTS
  */
+/**
+ * `queued` is true on a 202: no ambulance was free, so the patient waits in
+ * the dispatch queue (poll getEmergencyStatus until one is assigned).
+ */
 export async function requestAmbulance(name, age, condition, latitude, longitude) {
-  return apiCall("/emergency/request", {
+  const { status, data } = await apiCall("/emergency/request", {
     method: "POST",
     body: JSON.stringify({
       name,
@@ -85,7 +90,9 @@ export async function requestAmbulance(name, age, condition, latitude, longitude
       longitude: parseFloat(longitude),
     }),
     noAuth: true,
+    withStatus: true,
   });
+  return { ...data, queued: status === 202 };
 }
 
 export async function getEmergencyStatus(patientId) {
@@ -99,6 +106,114 @@ export async function getMapState() {
   return apiCall("/map/state", { noAuth: true });
 }
 
+/**
+ * Live map feed over WebSocket (instead of polling /map/state).
+ * Applies the server's snapshot + per-tick deltas and calls
+ * onState({ ambulances, hospitals, patients }) after each message.
+ * Each ambulance's `eta` is the live time left on its leg (seconds).
+ * onClose() is called if the connection fails or drops.
+ * Returns a function that closes the connection.
+ */
+export function subscribeMapUpdates(onState, onClose) {
+  const ws = new WebSocket(`${API_BASE_URL.replace(/^http/, "ws")}/ws/map`);
+  let closedByClient = false;
+  const state = { ambulances: {}, hospitals: {}, patients: {} };
+  const keys = { ambulances: "ambulanceId", hospitals: "hospitalId", patients: "patientId" };
+
+  ws.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === "snapshot") {
+      for (const kind of Object.keys(keys)) state[kind] = {};
+    }
+    for (const kind of Object.keys(keys)) {
+      for (const item of msg[kind] || []) {
+        if (kind === "patients" && item.status === "COMPLETED") {
+          delete state.patients[item.patientId];
+        } else {
+          state[kind][item[keys[kind]]] = item;
+        }
+      }
+    }
+    for (const [id, lat, lng, eta] of msg.moved || []) {
+      if (state.ambulances[id]) {
+        state.ambulances[id].location = { lat, lng };
+        state.ambulances[id].eta = eta;
+      }
+    }
+    onState({
+      ambulances: Object.values(state.ambulances),
+      hospitals: Object.values(state.hospitals),
+      patients: Object.values(state.patients),
+    });
+  };
+
+  ws.onclose = () => {
+    if (!closedByClient && onClose) onClose();
+  };
+
+  return () => {
+    closedByClient = true;
+    ws.close();
+  };
+}
+
+// Same shape as GET /map/state ({ patient, ambulances, hospitals }) from the feed
+function toMapState({ ambulances, hospitals, patients }, patientId) {
+  const active = patients
+    .filter((p) => (patientId ? p.patientId === patientId : p.status !== "COMPLETED"))
+    .sort((a, b) => (a.createdAt < b.createdAt ? -1 : 1));
+  const p = active[0];
+  let patient = null;
+  if (p) {
+    const amb = ambulances.find((a) => a.ambulanceId === p.ambulanceId);
+    const hosp = hospitals.find((h) => h.hospitalId === p.hospitalId);
+    // Live time left on the leg to the patient or hospital; the dispatch
+    // estimate only until the unit's record reaches us
+    const onLeg = amb && amb.currentPatientId === p.patientId && amb.eta != null;
+    patient = {
+      ...p,
+      ambulanceLocation: amb ? amb.location : null,
+      ambulanceETA: onLeg ? amb.eta : p.status === "PICKUP" ? p.eta : null,
+      hospitalLocation: hosp ? hosp.location : null,
+      hospitalName: hosp ? hosp.name : null,
+    };
+  }
+  return { patient, ambulances, hospitals };
+}
+
+/**
+ * Map state for a page: pushed over the /ws/map feed, falling back to
+ * polling getMapState() every pollMs if the WebSocket fails or drops.
+ * onState receives the /map/state shape; `patientId` picks the patient
+ * (default: the oldest active one, like the server).
+ * Returns a function that stops the updates.
+ */
+export function watchMapState(onState, { patientId = null, pollMs = 1000 } = {}) {
+  let timer = null;
+  const poll = () => {
+    if (timer) return;
+    timer = setInterval(async () => {
+      try {
+        onState(await getMapState());
+      } catch (err) {
+        console.error("Map update failed:", err);
+      }
+    }, pollMs);
+  };
+
+  let unsubscribe = () => {};
+  try {
+    unsubscribe = subscribeMapUpdates((feed) => onState(toMapState(feed, patientId)), poll);
+  } catch (err) {
+    poll();
+  }
+
+  return () => {
+    unsubscribe();
+    if (timer) clearInterval(timer);
+  };
+}
+
 /**
  * ADMIN ENDPOINTS
  */
@@ -1,6 +1,6 @@
 import { useEffect, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
-import { requestAmbulance, getEmergencyStatus, getMapState } from "../../api";
+import { requestAmbulance, getEmergencyStatus, watchMapState } from "../../api";
 
 export default function EmergencyPage() {
   const navigate = useNavigate();
@@ -39,31 +39,45 @@ export default function EmergencyPage() {
     }
   }, []);
 
+  const active = status === "DISPATCHED" || status === "QUEUED";
+
   // Timer
   useEffect(() => {
-    if (status === "DISPATCHED") {
+    if (active) {
       const t = setInterval(() => setTimer((s) => s + 1), 1000);
       return () => clearInterval(t);
     }
-  }, [status]);
+  }, [active]);
 
-  // Poll map state
+  // Queued (202): poll until the dispatch queue assigns an ambulance
   useEffect(() => {
-    if (status !== "DISPATCHED" || !patientId) return;
+    if (status !== "QUEUED" || !patientId) return;
 
-    const interval = setInterval(async () => {
+    const t = setInterval(async () => {
       try {
-        const mapState = await getMapState();
-        if (mapState.patient && mapState.ambulances && mapState.hospitals) {
-          updateMapMarkers(mapState);
-          setEta(mapState.patient.ambulanceETA || eta);
+        const current = await getEmergencyStatus(patientId);
+        if (current.ambulanceId) {
+          setAmbulanceId(current.ambulanceId);
+          setEta(current.ambulanceETA);
+          setStatus("DISPATCHED");
         }
       } catch (err) {
-        console.error("Map update failed:", err);
+        console.error("Status update failed:", err);
       }
-    }, 1000);
+    }, 2000);
+    return () => clearInterval(t);
+  }, [status, patientId]);
 
-    return () => clearInterval(interval);
+  // Live map state (WebSocket feed, polling /map/state as fallback)
+  useEffect(() => {
+    if (status !== "DISPATCHED" || !patientId) return;
+
+    return watchMapState((mapState) => {
+      if (mapState.patient && mapState.ambulances && mapState.hospitals) {
+        updateMapMarkers(mapState);
+        setEta((current) => mapState.patient.ambulanceETA || current);
+      }
+    }, { patientId });
   }, [status, patientId]);
 
   // Initialize map
@@ -165,7 +179,7 @@ export default function EmergencyPage() {
       setPatientId(response.patientId);
       setAmbulanceId(response.assignedAmbulanceId);
       setEta(response.eta);
-      setStatus("DISPATCHED");
+      setStatus(response.queued ? "QUEUED" : "DISPATCHED");
       setTimer(0);
     } catch (err) {
       setError(err.message || "Failed to request ambulance");
@@ -335,9 +349,9 @@ margin-bottom:12px;
 
           <div className="section">
             <h3>Patient Info</h3>
-            <input value={patientName} onChange={e=>setPatientName(e.target.value)} placeholder="Full Name" disabled={status === "DISPATCHED"}/>
-            <input value={patientAge} onChange={e=>setPatientAge(e.target.value)} placeholder="Age" type="number" disabled={status === "DISPATCHED"}/>
-            <select value={condition} onChange={e=>setCondition(e.target.value)} disabled={status === "DISPATCHED"}>
+            <input value={patientName} onChange={e=>setPatientName(e.target.value)} placeholder="Full Name" disabled={active}/>
+            <input value={patientAge} onChange={e=>setPatientAge(e.target.value)} placeholder="Age" type="number" disabled={active}/>
+            <select value={condition} onChange={e=>setCondition(e.target.value)} disabled={active}>
               <option value="cardiac">Cardiac</option>
               <option value="trauma">Trauma</option>
               <option value="stroke">Stroke</option>
@@ -346,19 +360,28 @@ margin-bottom:12px;
           </div>
 
           <div className="section">
-            <button className="btn" onClick={getLocation} disabled={status === "DISPATCHED"}>📍 Get My Location</button>
+            <button className="btn" onClick={getLocation} disabled={active}>📍 Get My Location</button>
             {location && <p>✓ Lat {location.lat.toFixed(4)} | Lng {location.lng.toFixed(4)}</p>}
           </div>
 
           <div className="section">
-            <button className="btn" onClick={dispatch} disabled={status === "DISPATCHED" || loading}>
+            <button className="btn" onClick={dispatch} disabled={active || loading}>
               {loading ? "Requesting..." : "Request Ambulance"}
             </button>
-            <button className="sos" onClick={dispatch} disabled={status === "DISPATCHED" || loading}>
+            <button className="sos" onClick={dispatch} disabled={active || loading}>
               🆘 SOS
             </button>
           </div>
 
+          {status === "QUEUED" && (
+            <div className="section">
+              <h3>⏳ Queued for Dispatch</h3>
+              <p><b>Patient ID:</b> {patientId}</p>
+              <p>No ambulance is free right now. You are in the queue and the next free unit will be assigned automatically.</p>
+              <p><b>Time Elapsed:</b> {timer}s</p>
+            </div>
+          )}
+
           {status === "DISPATCHED" && (
             <div className="section">
               <h3>✓ Dispatch Confirmed</h3>
@@ -376,7 +399,7 @@ margin-bottom:12px;
             <div className="card"><h4>📍 Status</h4><p>{status === "IDLE" ? "Ready" : "In Progress"}</p></div>
             <div className="card"><h4>🚑 Ambulance</h4><p>{ambulanceId || "Assigning..."}</p></div>
             <div className="card"><h4>⏱️ ETA</h4><p>{eta ? `${eta}s` : "---"}</p></div>
-            <div className="card"><h4>📡 Signal</h4><p>{status === "DISPATCHED" ? "Connected" : "Ready"}</p></div>
+            <div className="card"><h4>📡 Signal</h4><p>{active ? "Connected" : "Ready"}</p></div>
           </div>
         </div>
       </div>
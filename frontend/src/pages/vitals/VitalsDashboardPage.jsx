@@ -1,6 +1,6 @@
 import { useEffect, useState, useRef } from "react";
 import { useNavigate } from "react-router-dom";
-import { getMapState } from "../../api";
+import { watchMapState } from "../../api";
 import { VitalsMonitor, recommendHospital } from "../../vitals";
 
 export default function VitalsDashboardPage() {
@@ -49,31 +49,17 @@ export default function VitalsDashboardPage() {
     return () => clearInterval(vitalsInterval);
   }, [patientId, isMonitoring]);
 
-  // Get map data and recommendations
+  // Live map data (WebSocket feed, polling /map/state as fallback)
   useEffect(() => {
     if (!isMonitoring) return;
+    return watchMapState(setMapData, { pollMs: 2000 });
+  }, [isMonitoring]);
 
-    const mapInterval = setInterval(async () => {
-      try {
-        const data = await getMapState();
-        setMapData(data);
-
-        if (condition && data.hospitals) {
-          const recs = recommendHospital(
-            data.hospitals,
-            condition,
-            35,
-            vitals
-          );
-          setRecommendations(recs);
-        }
-      } catch (err) {
-        console.error("Map update failed:", err);
-      }
-    }, 2000);
-
-    return () => clearInterval(mapInterval);
-  }, [isMonitoring, condition, vitals]);
+  // Hospital recommendations from the latest map data and vitals
+  useEffect(() => {
+    if (!condition || !mapData || !mapData.hospitals) return;
+    setRecommendations(recommendHospital(mapData.hospitals, condition, 35, vitals));
+  }, [mapData, condition, vitals]);
 
   const updateCharts = (newVitals) => {
     // Simple chart update (in production, use Chart.js or Recharts)
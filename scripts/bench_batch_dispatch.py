@@ -0,0 +1,71 @@
+"""
+Benchmark: greedy one-at-a-time dispatch vs batch min-total-ETA dispatch
+for a surge of simultaneous emergencies.
+
+Run from the repository root:
+    python scripts/bench_batch_dispatch.py
+"""
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.models import (  # noqa: E402
+    Ambulance, AmbulanceStatus, Hospital, Location, Patient, PatientStatus
+)
+from backend import store, services  # noqa: E402
+
+
+def populate(n_ambulances, n_patients, seed):
+    store.clear_all()
+    rng = random.Random(seed)
+    for i in range(n_ambulances):
+        store.save_ambulance(Ambulance(
+            ambulanceId=f"AMB-{i:05d}", driverId=f"DRV-{i:05d}", driverName=f"Driver {i}",
+            status=AmbulanceStatus.AVAILABLE,
+            location=Location(lat=12.0 + rng.random() * 0.5, lng=74.0 + rng.random() * 0.5),
+        ))
+    for i in range(20):
+        store.save_hospital(Hospital(
+            hospitalId=f"HOSP-{i:03d}", name=f"Hospital {i}",
+            location=Location(lat=12.0 + rng.random() * 0.5, lng=74.0 + rng.random() * 0.5),
+            icuBeds=20, generalBeds=200,
+        ))
+    patients = []
+    for i in range(n_patients):
+        patient = Patient(
+            patientId=f"PAT-{i:05d}", name=f"Patient {i}", age=40, condition="trauma",
+            status=PatientStatus.WAITING, createdAt=datetime.now(),
+            location=Location(lat=12.0 + rng.random() * 0.5, lng=74.0 + rng.random() * 0.5),
+        )
+        store.save_patient(patient)
+        patients.append(patient)
+    return patients
+
+
+def total_eta(patients):
+    return sum(store.get_patient(p.patientId).eta or 0 for p in patients)
+
+
+def main():
+    print(f"{'patients':>9} {'ambulances':>11} {'greedy avg ETA':>15} {'batch avg ETA':>14} {'batch ms':>9}")
+    for n_patients, n_ambulances in ((50, 60), (200, 250), (300, 3000)):
+        patients = populate(n_ambulances, n_patients, seed=n_patients)
+        for patient in patients:
+            services.dispatch_ambulance(patient)
+        greedy = total_eta(patients) / n_patients
+
+        patients = populate(n_ambulances, n_patients, seed=n_patients)
+        start = time.perf_counter()
+        services.dispatch_batch(patients)
+        elapsed = (time.perf_counter() - start) * 1000
+        batch = total_eta(patients) / n_patients
+
+        print(f"{n_patients:>9} {n_ambulances:>11} {greedy:>14.0f}s {batch:>13.0f}s {elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Concurrency stress test for dispatch: many threads dispatching at once
+(like the sync /emergency/request handlers in FastAPI's thread pool).
+
+Checks that no ambulance is ever assigned to two patients and no patient
+gets two ambulances, and compares throughput of the compare-and-set
+claims in store.py against serializing every dispatch on one global lock.
+Travel times come from scripts/osrm_stub.py with network-like latency.
+
+Run from the repository root:
+    python scripts/bench_dispatch_concurrency.py [--threads 16] [--latency 0.005]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+STUB_PORT = 5058
+os.environ["OSRM_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+os.environ["LOG_SINK"] = ""  # no log output per dispatch
+
+from backend.models import (  # noqa: E402
+    Ambulance, AmbulanceStatus, Hospital, Location, Patient, PatientStatus
+)
+from backend import store, services  # noqa: E402
+
+
+def populate(n_ambulances, n_patients, spread, seed):
+    store.clear_all()
+    store.ambulance_versions.clear()
+    services.waiting_queue.clear()
+    rng = random.Random(seed)
+    for i in range(n_ambulances):
+        store.save_ambulance(Ambulance(
+            ambulanceId=f"AMB-{i:05d}", driverId=f"DRV-{i:05d}", driverName=f"Driver {i}",
+            status=AmbulanceStatus.AVAILABLE,
+            location=Location(lat=12.0 + rng.random() * 0.5, lng=74.0 + rng.random() * 0.5),
+        ))
+    for i in range(20):
+        store.save_hospital(Hospital(
+            hospitalId=f"HOSP-{i:03d}", name=f"Hospital {i}",
+            location=Location(lat=12.0 + rng.random() * 0.5, lng=74.0 + rng.random() * 0.5),
+            icuBeds=50, generalBeds=500, occupiedBeds=0,
+        ))
+    patients = []
+    for i in range(n_patients):
+        patient = Patient(
+            patientId=f"PAT-{i:05d}", name=f"Patient {i}", age=40, condition="fever",
+            status=PatientStatus.WAITING,
+            location=Location(lat=12.25 + (rng.random() - 0.5) * spread,
+                              lng=74.25 + (rng.random() - 0.5) * spread),
+            createdAt=datetime.now(),
+        )
+        store.save_patient(patient)
+        patients.append(patient)
+    return patients
+
+
+def check(patients, n_ambulances):
+    """Raise if any unit or patient was double-assigned; return #dispatched"""
+    dispatched = [store.get_patient(p.patientId) for p in patients]
+    dispatched = [p for p in dispatched if p.status != PatientStatus.WAITING]
+    per_unit = Counter(p.ambulanceId for p in dispatched)
+    doubled = [amb for amb, n in per_unit.items() if n > 1]
+    assert not doubled, f"ambulances assigned twice: {doubled[:5]}"
+    for p in dispatched:
+        amb = store.get_ambulance(p.ambulanceId)
+        assert amb.currentPatientId == p.patientId, f"{amb.ambulanceId} lost patient {p.patientId}"
+    log_lines = Counter(
+        log.message.split()[-1] for log in store.system_logs if " dispatched to patient " in log.message
+    )
+    assert all(n == 1 for n in log_lines.values()), "a patient was dispatched twice"
+    assert len(dispatched) == min(len(patients), n_ambulances), (len(dispatched), n_ambulances)
+    return len(dispatched)
+
+
+def run(dispatch, patients, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(dispatch, patients))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated OSRM round trip (s)")
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, str(ROOT / "scripts" / "osrm_stub.py"), "--port", str(STUB_PORT),
+         "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    time.sleep(2.0)
+    global_lock = threading.Lock()
+
+    def locked_dispatch(patient):
+        with global_lock:
+            return services.dispatch_ambulance(patient)
+
+    scenarios = [
+        # (name, ambulances, patients, spread in degrees)
+        ("spread out, enough units", 400, 300, 0.5),
+        ("hotspot, scarce units", 40, 300, 0.01),
+    ]
+    print(f"{args.threads} threads, OSRM latency {args.latency * 1000:.0f} ms")
+    try:
+        for name, n_amb, n_pat, spread in scenarios:
+            for label, dispatch in (("global lock", locked_dispatch), ("CAS claims", services.dispatch_ambulance)):
+                patients = populate(n_amb, n_pat, spread, seed=7)
+                seconds = run(dispatch, patients, args.threads)
+                served = check(patients, n_amb)
+                print(f"{name:>26} | {label:>11}: {n_pat / seconds:7.0f} dispatches/s, "
+                      f"{served} served, no double assignment")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
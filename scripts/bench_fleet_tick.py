@@ -0,0 +1,86 @@
+"""
+Benchmark: simulation cost for large fleets.
+
+Measures the cost of handling due arrival events and of materializing
+every ambulance position for an API response, for straight-line legs and
+for legs that follow a route polyline.
+
+Run from the repository root:
+    python scripts/bench_fleet_tick.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.models import Ambulance, AmbulanceStatus, Location  # noqa: E402
+from backend import store, services  # noqa: E402
+
+ROUNDS = 50
+ROUTE_POINTS = 200  # vertices per routed leg
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def zigzag(start, end, points):
+    """Polyline from start to end with `points` vertices, wiggling sideways"""
+    return [
+        (start[0] + (end[0] - start[0]) * t + 0.002 * (i % 2),
+         start[1] + (end[1] - start[1]) * t)
+        for i, t in enumerate(j / (points - 1) for j in range(points))
+    ]
+
+
+def populate(n, routed, busy_fraction=0.8):
+    store.clear_all()
+    rng = random.Random(1)
+    for i in range(n):
+        busy = rng.random() < busy_fraction
+        start = (12.0 + rng.random(), 74.0 + rng.random())
+        end = (12.0 + rng.random(), 74.0 + rng.random())
+        store.save_ambulance(Ambulance(
+            ambulanceId=f"AMB-{i:06d}",
+            driverId=f"DRV-{i:06d}",
+            driverName=f"Driver {i}",
+            status=AmbulanceStatus.ASSIGNED if busy else AmbulanceStatus.AVAILABLE,
+            location=Location(lat=start[0], lng=start[1]),
+            targetLocation=Location(lat=end[0], lng=end[1]) if busy else None,
+        ))
+        if busy and routed:
+            store.fleet.follow(f"AMB-{i:06d}", zigzag(start, end, ROUTE_POINTS))
+
+
+def main():
+    clock = FakeClock()
+    store.fleet.clock = clock
+    print(f"{'units':>8} {'legs':>9} {'arrivals ms/s':>14} {'positions ms':>13}")
+    for n, routed in ((1_000, False), (10_000, False), (50_000, False), (1_000, True), (10_000, True)):
+        clock.now = 0.0
+        populate(n, routed)
+
+        # One simulated second of arrival processing per round
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            clock.now += 1.0
+            services.process_arrivals()
+        t_events = (time.perf_counter() - start) / ROUNDS * 1000
+
+        # Full-fleet position read (what /map/state needs)
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            clock.now += 1.0
+            store.get_all_ambulances()
+        t_read = (time.perf_counter() - start) / ROUNDS * 1000
+        print(f"{n:>8} {'routed' if routed else 'straight':>9} {t_events:>14.3f} {t_read:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
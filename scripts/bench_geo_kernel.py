@@ -0,0 +1,99 @@
+"""
+Accuracy and speed of the shared geo kernel (backend/routing/haversine.py)
+against the haversine implementations it replaced.
+
+Run from the repository root:
+    python scripts/bench_geo_kernel.py
+"""
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.routing.haversine import (  # noqa: E402
+    EARTH_RADIUS_KM, EQUIRECTANGULAR_MAX_KM, EQUIRECTANGULAR_MAX_REL_ERROR,
+    haversine, haversine_np, equirectangular, equirectangular_np
+)
+
+
+# Previous implementations, kept here as references
+def legacy_services_haversine(lat1, lng1, lat2, lng2):
+    R = 6371
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def legacy_priority_engine_haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return R * c
+
+
+def random_pairs(n, max_km, max_lat, seed=0):
+    """Random start points plus destinations at a known great-circle distance"""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-max_lat, max_lat, n)
+    lng = rng.uniform(-179, 179, n)
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    dist = rng.uniform(0.01, max_km, n)
+    p1, l1, dr = np.radians(lat), np.radians(lng), dist / EARTH_RADIUS_KM
+    p2 = np.arcsin(np.sin(p1) * np.cos(dr) + np.cos(p1) * np.sin(dr) * np.cos(bearing))
+    l2 = l1 + np.arctan2(np.sin(bearing) * np.sin(dr) * np.cos(p1), np.cos(dr) - np.sin(p1) * np.sin(p2))
+    return lat, lng, np.degrees(p2), np.degrees(l2), dist
+
+
+def timed(fn, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    n = 200_000
+    lat1, lng1, lat2, lng2, dist = random_pairs(n, 2000, 80)
+    pairs = list(zip(lat1.tolist(), lng1.tolist(), lat2.tolist(), lng2.tolist()))[:20_000]
+
+    print("Accuracy (max relative error)")
+    scalar = np.array([haversine(*p) for p in pairs])
+    for name, fn in (("services.haversine_distance", legacy_services_haversine),
+                     ("priority_engine.haversine", legacy_priority_engine_haversine)):
+        legacy = np.array([fn(*p) for p in pairs])
+        print(f"  kernel haversine vs {name:28s} {np.max(np.abs(scalar - legacy) / legacy):.1e}")
+    batch = haversine_np(lat1, lng1, lat2, lng2)
+    print(f"  haversine_np vs haversine (scalar){'':15s} {np.max(np.abs(batch[:len(scalar)] - scalar) / scalar):.1e}")
+    print(f"  haversine_np vs true distance{'':20s} {np.max(np.abs(batch - dist) / dist):.1e}")
+
+    s_lat1, s_lng1, s_lat2, s_lng2, _ = random_pairs(n, EQUIRECTANGULAR_MAX_KM, 70, seed=1)
+    approx = equirectangular_np(s_lat1, s_lng1, s_lat2, s_lng2)
+    exact = haversine_np(s_lat1, s_lng1, s_lat2, s_lng2)
+    err = float(np.max(np.abs(approx - exact) / exact))
+    print(f"  equirectangular vs haversine (<= {EQUIRECTANGULAR_MAX_KM:.0f} km, |lat| <= 70)   {err:.1e}"
+          f"  (bound {EQUIRECTANGULAR_MAX_REL_ERROR:.0e})")
+    assert err <= EQUIRECTANGULAR_MAX_REL_ERROR
+
+    print(f"\nSpeed ({len(pairs)} scalar calls / {n} array elements)")
+    for name, fn in (("legacy services.haversine_distance", legacy_services_haversine),
+                     ("kernel haversine", haversine),
+                     ("kernel equirectangular", equirectangular)):
+        t = timed(lambda: [fn(*p) for p in pairs])
+        print(f"  {name:36s} {t / len(pairs) * 1e9:8.0f} ns/call")
+    for name, fn in (("haversine_np", haversine_np), ("equirectangular_np", equirectangular_np)):
+        t = timed(fn, lat1, lng1, lat2, lng2, repeat=5)
+        print(f"  {name:36s} {t / n * 1e9:8.1f} ns/element")
+
+
+if __name__ == "__main__":
+    main()
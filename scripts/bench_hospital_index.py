@@ -0,0 +1,99 @@
+"""
+Benchmark: nearest hospital with free capacity, grid index vs linear scan.
+
+Run from the repository root:
+    python scripts/bench_hospital_index.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.models import Hospital, Location, BedType  # noqa: E402
+from backend import store  # noqa: E402
+from backend.routing.haversine import haversine  # noqa: E402
+
+QUERIES = 2000
+
+
+def linear_nearest(lat, lng, bed_type):
+    """Reference: full scan over every hospital"""
+    best, best_d = None, float("inf")
+    for hosp in store.hospitals.values():
+        if store.free_beds(hosp, bed_type) <= 0:
+            continue
+        d = haversine(lat, lng, hosp.location.lat, hosp.location.lng)
+        if d < best_d:
+            best, best_d = hosp, d
+    return best
+
+
+def first_match(lat, lng):
+    """Baseline: the old first-hospital-with-free-general-beds behaviour"""
+    for hosp in store.hospitals.values():
+        if hosp.generalBeds - hosp.occupiedBeds > 0:
+            return hosp
+    return None
+
+
+def populate(n):
+    store.clear_all()
+    rng = random.Random(42)
+    for i in range(n):
+        icu = rng.randint(0, 20)
+        general = rng.randint(10, 200)
+        store.save_hospital(Hospital(
+            hospitalId=f"HOSP-{i:05d}",
+            name=f"Hospital {i}",
+            location=Location(lat=12.0 + rng.random() * 1.5, lng=74.0 + rng.random() * 1.5),
+            icuBeds=icu,
+            generalBeds=general,
+            occupiedBeds=general if rng.random() < 0.3 else 0,
+            occupiedIcuBeds=icu if rng.random() < 0.5 else 0,
+        ))
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for args in queries:
+        fn(*args)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'hospitals':>10} {'bed':>8} {'first-match':>12} {'linear':>10} {'index':>10}  (us/query)")
+    for n in (50, 200, 1000, 5000):
+        populate(n)
+        for bed_type in (BedType.GENERAL, BedType.ICU):
+            queries = [
+                (12.0 + rng.random() * 1.5, 74.0 + rng.random() * 1.5, bed_type)
+                for _ in range(QUERIES)
+            ]
+            # Sanity check: the index agrees with the full scan
+            for lat, lng, bt in queries[:100]:
+                expected = linear_nearest(lat, lng, bt)
+                got = store.get_nearest_hospital(lat, lng, bt)
+                assert got.hospitalId == expected.hospitalId
+
+            t_first = timed(first_match, [(lat, lng) for lat, lng, _ in queries])
+            t_linear = timed(linear_nearest, queries)
+            t_index = timed(store.get_nearest_hospital, queries)
+            print(f"{n:>10} {bed_type.value:>8} {t_first:>12.1f} {t_linear:>10.1f} {t_index:>10.1f}")
+
+    # Incremental updates: fill and free beds while querying
+    populate(1000)
+    hosp_ids = list(store.hospitals)
+    start = time.perf_counter()
+    for i in range(QUERIES):
+        hosp = store.get_hospital(hosp_ids[i % len(hosp_ids)])
+        hosp.occupiedBeds = hosp.generalBeds if hosp.occupiedBeds == 0 else 0
+        store.save_hospital(hosp)
+    t_update = (time.perf_counter() - start) / QUERIES * 1e6
+    print(f"\nsave_hospital with occupancy change: {t_update:.1f} us/update")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: batched hospital scoring vs one select_best_hospital call per
+emergency, checking that both pick the same hospital with the same score.
+
+Run from the repository root:
+    python scripts/bench_hospital_scoring.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.ai.priority_engine import (  # noqa: E402
+    SYMPTOM_SEVERITY, haversine, hospital_arrays, score_matrix, select_best_hospital,
+    select_best_hospitals, symptom_severity
+)
+
+
+def make_data(n_emergencies, n_hospitals, seed=0):
+    rng = random.Random(seed)
+    hospitals = [
+        SimpleNamespace(
+            id=i, lat=40.6 + rng.random() * 0.3, lon=-74.1 + rng.random() * 0.3,
+            beds_available=rng.choice([0, 2, 10, 40]), icu_available=rng.choice([0, 0, 1, 3]),
+        )
+        for i in range(n_hospitals)
+    ]
+    emergencies = [
+        SimpleNamespace(
+            lat=40.6 + rng.random() * 0.3, lon=-74.1 + rng.random() * 0.3,
+            symptoms=rng.choice(list(SYMPTOM_SEVERITY) + ["headache"]),
+        )
+        for _ in range(n_emergencies)
+    ]
+    return emergencies, hospitals
+
+
+def scalar_score(e, h):
+    sev = symptom_severity(e.symptoms)
+    score = haversine(e.lat, e.lon, h.lat, h.lon) * (1 + (10 - sev)/10)
+    score *= (0.5 if h.icu_available > 0 else 1.0) * (0.7 if h.beds_available > 0 else 1.2)
+    if sev >= 8 and h.icu_available == 0:
+        score *= 2.0
+    return score
+
+
+def main():
+    emergencies, hospitals = make_data(1000, 500)
+
+    start = time.perf_counter()
+    expected = [select_best_hospital(e, hospitals) for e in emergencies]
+    t_loop = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    snapshot = hospital_arrays(hospitals)
+    t_snapshot = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    got = select_best_hospitals(emergencies, hospitals, snapshot)
+    t_batch = (time.perf_counter() - start) * 1000
+
+    same = sum(a is b for a, b in zip(expected, got))
+    scores = score_matrix(
+        [e.lat for e in emergencies[:50]], [e.lon for e in emergencies[:50]],
+        [symptom_severity(e.symptoms) for e in emergencies[:50]], snapshot,
+    )
+    reference = np.array([[scalar_score(e, h) for h in hospitals] for e in emergencies[:50]])
+    max_rel = float(np.max(np.abs(scores - reference) / reference))
+
+    print("1000 emergencies x 500 hospitals")
+    print(f"  per-emergency loop: {t_loop:8.1f} ms")
+    print(f"  snapshot build:     {t_snapshot:8.1f} ms")
+    print(f"  batched scoring:    {t_batch:8.1f} ms")
+    print(f"  same choice: {same}/{len(emergencies)}, max relative score difference: {max_rel:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cost of store.add_log() and /logs-style queries with the ring buffer and
+background sink (backend/log_buffer.py), against the previous list with
+pop(0) and a synchronous print per entry. Both write their lines to a
+temporary file.
+
+Run from the repository root:
+    python scripts/bench_logs.py [--entries 200000] [--capacity 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+LOG_FILE = Path(tempfile.mkdtemp()) / "system.log"
+os.environ["LOG_SINK"] = str(LOG_FILE)
+
+from backend import store  # noqa: E402
+from backend.log_buffer import LogBuffer  # noqa: E402
+from backend.models import SystemLogEntry  # noqa: E402
+
+LEVELS = ["INFO"] * 8 + ["WARNING", "ERROR"]
+
+
+def old_add_log(logs, out, capacity, message, level):
+    log = SystemLogEntry(timestamp=datetime.now(), message=message, level=level)
+    logs.append(log)
+    if len(logs) > capacity:
+        logs.pop(0)
+    print(f"[{level}] {message}", file=out, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200000)
+    parser.add_argument("--capacity", type=int, default=1000)
+    args = parser.parse_args()
+    n = args.entries
+
+    with open(LOG_FILE.with_suffix(".old"), "w") as out:
+        logs = []
+        start = time.perf_counter()
+        for i in range(n):
+            old_add_log(logs, out, args.capacity, f"Ambulance AMB-{i % 50:03d} moved", LEVELS[i % 10])
+        old = (time.perf_counter() - start) / n * 1e6
+
+    store.system_logs = LogBuffer(args.capacity)
+    start = time.perf_counter()
+    for i in range(n):
+        store.add_log(f"Ambulance AMB-{i % 50:03d} moved", LEVELS[i % 10])
+    new = (time.perf_counter() - start) / n * 1e6
+    store.log_sink.close()
+    print(f"add_log, {n} entries, capacity {args.capacity}:")
+    print(f"  list + pop(0) + print: {old:6.2f} us/call")
+    print(f"  ring buffer + sink:    {new:6.2f} us/call")
+
+    buffer = store.system_logs
+    since = datetime.now() - timedelta(seconds=1)
+    queries = [
+        ("last 100", dict(limit=100)),
+        ("ERROR only, last 50", dict(levels=["ERROR"], limit=50)),
+        ("last second, WARNING+ERROR", dict(levels=["WARNING", "ERROR"], since=since, limit=100)),
+    ]
+    for label, kwargs in queries:
+        reps = 2000
+        start = time.perf_counter()
+        for _ in range(reps):
+            result = buffer.query(**kwargs)
+        print(f"  query {label:>28}: {(time.perf_counter() - start) / reps * 1e6:6.1f} us ({len(result)} entries)")
+
+
+if __name__ == "__main__":
+    main()
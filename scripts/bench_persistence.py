@@ -0,0 +1,75 @@
+"""
+Request-path cost of write-behind persistence (backend/persistence.py):
+store.save_patient() latency without persistence, with the write-behind
+journal, and with a synchronous SQLite write per save for comparison.
+
+Run from the repository root:
+    python scripts/bench_persistence.py [--saves 20000]
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend import store  # noqa: E402
+from backend.models import Location, Patient, PatientStatus  # noqa: E402
+from backend.persistence import StatePersistence  # noqa: E402
+
+
+def make_patients(n):
+    return [
+        Patient(patientId=f"PAT-{i:06d}", name=f"Patient {i}", age=40, condition="fever",
+                status=PatientStatus.WAITING, location=Location(lat=12.3, lng=74.5),
+                createdAt=datetime.now())
+        for i in range(n)
+    ]
+
+
+def timed_saves(patients):
+    start = time.perf_counter()
+    for patient in patients:
+        store.save_patient(patient)
+    return (time.perf_counter() - start) / len(patients) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistence overhead benchmark")
+    parser.add_argument("--saves", type=int, default=20000)
+    args = parser.parse_args()
+    patients = make_patients(args.saves)
+
+    store.clear_all()
+    print(f"in-memory only:        {timed_saves(patients):7.2f} us/save")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.clear_all()
+        persistence = StatePersistence(str(Path(tmp) / "state.db"))
+        persistence.start()
+        print(f"write-behind journal:  {timed_saves(patients):7.2f} us/save")
+        start = time.perf_counter()
+        persistence.stop()
+        print(f"  final flush of pending rows: {(time.perf_counter() - start) * 1000:.0f} ms, {persistence.stats}")
+
+        store.clear_all()
+        db = sqlite3.connect(str(Path(tmp) / "sync.db"), check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE journal (kind TEXT, entity_id TEXT, data TEXT)")
+
+        def write_through(kind, entity_id):
+            with db:
+                db.execute("INSERT INTO journal VALUES (?, ?, ?)",
+                           (kind, entity_id, store.get_patient(entity_id).model_dump_json()))
+
+        store.change_listeners.append(write_through)
+        print(f"synchronous write:     {timed_saves(patients):7.2f} us/save")
+        store.change_listeners.remove(write_through)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Incremental rerouting (backend/routing/dynamic_reroute.py) versus
+recomputing every active route after a traffic update, on a synthetic
+grid city.
+
+Run from the repository root:
+    python scripts/bench_reroute.py [--size 120] [--routes 300] [--updates 5]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.routing.dynamic_reroute import RerouteEngine  # noqa: E402
+from backend.routing.road_graph import RoadGraph, save_graph  # noqa: E402
+from build_road_graph import synthetic_city  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dynamic rerouting benchmark")
+    parser.add_argument("--size", type=int, default=120)
+    parser.add_argument("--routes", type=int, default=300)
+    parser.add_argument("--updates", type=int, default=5, help="slowed edges per traffic update")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lat, lng, *edges = synthetic_city(args.size)
+        save_graph(tmp, lat, lng, *edges)
+        graph = RoadGraph(tmp)
+        rng = np.random.default_rng(5)
+        lo = (float(np.min(graph.lat)), float(np.min(graph.lng)))
+        hi = (float(np.max(graph.lat)), float(np.max(graph.lng)))
+        trips = rng.uniform(lo + lo, hi + hi, size=(args.routes, 4))
+        starts = {f"AMB-{i:04d}": (t[0], t[1]) for i, t in enumerate(trips)}
+
+        engine = RerouteEngine(graph, starts.get)
+        start = time.perf_counter()
+        for (amb_id, (a, b)), t in zip(starts.items(), trips):
+            engine.plan(amb_id, a, b, t[2], t[3])
+        full_s = time.perf_counter() - start
+        print(f"{len(engine)} active routes; full recompute {full_s * 1000:.0f} ms")
+
+        # slow down edges on a few random active routes, like a local incident
+        used = sorted({e for route in engine.routes.values() for e in route.edges})
+        slowed = rng.choice(used, size=args.updates, replace=False)
+        start = time.perf_counter()
+        rerouted = engine.apply_traffic({int(e): 3.0 for e in slowed})
+        incr_s = time.perf_counter() - start
+        print(f"traffic update on {args.updates} edges: {len(rerouted)} routes recomputed "
+              f"in {incr_s * 1000:.0f} ms ({full_s / max(incr_s, 1e-9):.1f}x faster than full)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Load time and query latency of the offline road-graph router
+(backend/routing/road_graph.py) on a synthetic grid city.
+
+Run from the repository root:
+    python scripts/bench_road_graph.py [--size 200] [--queries 200]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.routing.road_graph import RoadGraph, save_graph  # noqa: E402
+from build_road_graph import synthetic_city  # noqa: E402
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline router benchmark")
+    parser.add_argument("--size", type=int, default=200, help="grid city is size x size intersections")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lat, lng, *edges = synthetic_city(args.size)
+        save_graph(tmp, lat, lng, *edges)
+
+        start = time.perf_counter()
+        graph = RoadGraph(tmp)
+        load_ms = (time.perf_counter() - start) * 1000
+        print(f"graph: {len(graph)} nodes, {graph.edge_count} edges")
+        print(f"load (memory map):        {load_ms:8.2f} ms")
+
+        rng = np.random.default_rng(1)
+        lo = (float(np.min(graph.lat)), float(np.min(graph.lng)))
+        hi = (float(np.max(graph.lat)), float(np.max(graph.lng)))
+        points = rng.uniform(lo + lo, hi + hi, size=(args.queries, 4))
+
+        start = time.perf_counter()
+        graph.route(*points[0])
+        print(f"first query (cold rows):  {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+        snap, route, hops = [], [], []
+        for src_lat, src_lng, dst_lat, dst_lng in points:
+            start = time.perf_counter()
+            graph.nearest_node(src_lat, src_lng)
+            snap.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            result = graph.route(src_lat, src_lng, dst_lat, dst_lng)
+            route.append(time.perf_counter() - start)
+            if result:
+                hops.append(result["distance"] / 1000)
+
+        print(f"snap to node:   p50 {percentile(snap, 50):7.3f} ms   p95 {percentile(snap, 95):7.3f} ms")
+        print(f"route (A*):     p50 {percentile(route, 50):7.3f} ms   p95 {percentile(route, 95):7.3f} ms"
+              f"   (mean route {statistics.mean(hops):.1f} km)")
+        print(f"node rows read: {len(graph._rows)} of {len(graph)}")
+
+
+if __name__ == "__main__":
+    main()
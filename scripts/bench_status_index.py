@@ -0,0 +1,79 @@
+"""
+Finding active patients / busy ambulances with a long history of
+COMPLETED patients: full scan of get_all_patients()/get_all_ambulances()
+vs the status indexes in store.py.
+
+Run from the repository root:
+    python scripts/bench_status_index.py [--history 100000] [--active 20]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ["LOG_SINK"] = ""
+
+from backend import store  # noqa: E402
+from backend.models import (  # noqa: E402
+    Ambulance, AmbulanceStatus, Location, Patient, PatientStatus
+)
+
+
+def populate(history, active, fleet_size):
+    store.clear_all()
+    start = datetime.now() - timedelta(days=30)
+    for i in range(history + active):
+        store.save_patient(Patient(
+            patientId=f"PAT-{i:07d}", name=f"Patient {i}", age=40, condition="fever",
+            status=PatientStatus.COMPLETED if i < history else PatientStatus.PICKUP,
+            location=Location(lat=12.3, lng=74.5), createdAt=start + timedelta(seconds=i),
+        ))
+    for i in range(fleet_size):
+        store.save_ambulance(Ambulance(
+            ambulanceId=f"AMB-{i:05d}", driverId=f"DRV-{i:05d}", driverName=f"Driver {i}",
+            status=AmbulanceStatus.ASSIGNED if i < active else AmbulanceStatus.AVAILABLE,
+            location=Location(lat=12.3 + i * 1e-4, lng=74.5),
+        ))
+
+
+def timed(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        result = fn()
+    return (time.perf_counter() - start) / reps * 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history", type=int, default=100000, help="COMPLETED patients")
+    parser.add_argument("--active", type=int, default=20, help="active patients / busy ambulances")
+    parser.add_argument("--fleet", type=int, default=2000)
+    args = parser.parse_args()
+    populate(args.history, args.active, args.fleet)
+    reps = 50
+
+    cases = [
+        ("active patients", lambda: [p for p in store.get_all_patients() if p.status != PatientStatus.COMPLETED],
+         lambda: list(store.iter_active_patients())),
+        ("earliest active patient",
+         lambda: next((p for p in store.get_all_patients() if p.status != PatientStatus.COMPLETED), None),
+         lambda: min(store.iter_active_patients(), key=lambda p: p.createdAt, default=None)),
+        ("busy ambulances",
+         lambda: [a for a in store.get_all_ambulances() if a.status != AmbulanceStatus.AVAILABLE],
+         lambda: list(store.iter_busy_ambulances())),
+    ]
+    print(f"{args.history} completed + {args.active} active patients, {args.fleet} ambulances")
+    for label, scan, indexed in cases:
+        scan_us, expected = timed(scan, reps)
+        index_us, got = timed(indexed, reps)
+        same = (sorted(x.model_dump_json() for x in expected) == sorted(x.model_dump_json() for x in got)
+                if isinstance(expected, list) else expected is got)
+        assert same, label
+        print(f"  {label:>24}: scan {scan_us:9.1f} us, index {index_us:7.1f} us ({scan_us / index_us:5.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
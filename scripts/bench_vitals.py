@@ -0,0 +1,136 @@
+"""
+Vitals ingestion load test: simulated ESP32 monitors post binary frames
+to POST /iot/vitals while a probe measures dispatch API latency
+(/ambulances/list), against the same probe on an idle server.
+
+Each device sends one frame per second holding --rate samples (a 250 Hz
+monitor by default), so 200 devices are 50k samples/s. The server only
+takes vitals of open emergencies, so one patient per device is created
+first through POST /emergency/bulk. Reports samples/s
+stored by the server (/iot/stats) and probe latency percentiles with and
+without the ingest load. Load generator and server share the machine.
+
+Run from the repository root:
+    python scripts/bench_vitals.py [--devices 200] [--rate 250] [--seconds 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from backend.iot.vitals_receiver import encode_frame  # noqa: E402
+
+
+def start_server(port):
+    env = dict(os.environ, STATE_DB_PATH="", LOG_SINK="", OSRM_URL="http://127.0.0.1:1")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(url + "/", timeout=0.5)
+            return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def create_patients(url, count):
+    """Ids of `count` new emergencies (one bulk call; most stay WAITING)"""
+    items = [{"name": f"Device {i}", "age": 40, "condition": "cardiac",
+              "latitude": 12.9 + i * 1e-4, "longitude": 77.6} for i in range(count)]
+    res = httpx.post(url + "/emergency/bulk", json=items, timeout=60)
+    res.raise_for_status()
+    return [r["patientId"] for r in res.json()["results"]]
+
+
+def devices(url, patient_ids, rate, stop):
+    """A group of monitors, each sending last second's `rate` samples once a second"""
+    rng = np.random.default_rng(len(patient_ids))
+    base = np.array([80, 120, 80, 97, 37, 16], dtype=np.float64)
+    t = time.time()
+    with httpx.Client(base_url=url, timeout=10) as c:
+        while not stop.is_set():
+            times = t + np.arange(rate) / rate
+            for patient_id in patient_ids:
+                values = base + rng.normal(0, 1, (rate, len(base)))
+                c.post("/iot/vitals", content=encode_frame(patient_id, times, values),
+                       headers={"content-type": "application/octet-stream"})
+            t += 1.0
+            stop.wait(max(0.0, t + 1.0 - time.time()))
+
+
+def probe(url, seconds):
+    """Latencies (ms) of back-to-back dispatch API reads"""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    with httpx.Client(base_url=url, timeout=10) as c:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            c.get("/ambulances/list")
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+    return latencies
+
+
+def summary(latencies):
+    q = statistics.quantiles(latencies, n=100)
+    return f"p50 {q[49]:6.1f} ms, p99 {q[98]:6.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--rate", type=int, default=250, help="samples per second per device (one frame a second)")
+    parser.add_argument("--senders", type=int, default=8, help="client threads the devices are spread over")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    proc, url = start_server(args.port)
+    try:
+        patient_ids = create_patients(url, args.devices)
+        idle = probe(url, min(args.seconds, 3.0))
+        stop = threading.Event()
+        groups = [patient_ids[i::args.senders] for i in range(args.senders)]
+        senders = [threading.Thread(target=devices, args=(url, g, args.rate, stop)) for g in groups if g]
+        before = httpx.get(url + "/iot/stats").json()
+        start = time.perf_counter()
+        for s in senders:
+            s.start()
+        loaded = probe(url, args.seconds)
+        stop.set()
+        for s in senders:
+            s.join()
+        elapsed = time.perf_counter() - start
+        time.sleep(0.2)  # last coalesced flush
+        after = httpx.get(url + "/iot/stats").json()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    stored = after["stored"] - before["stored"]
+    frames = after["frames"] - before["frames"]
+    print(f"{os.cpu_count()} cores, {args.devices} devices x {args.rate} samples/s")
+    print(f"ingest: {stored / elapsed:9.0f} samples/s stored ({frames / elapsed:.0f} frames/s, "
+          f"{after['flushes'] - before['flushes']} flushes, {after['dropped_late']} late, "
+          f"{after['refused'] - before['refused']} refused)")
+    print(f"/ambulances/list idle:      {summary(idle)}")
+    print(f"/ambulances/list + ingest:  {summary(loaded)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Vitals history over a long transport: feeds one patient's monitor into
+backend/iot/vitals_store.py hour by hour (one batch per second, as the
+receiver flushes) and reports memory and query latency as history grows,
+next to keeping every raw sample and downsampling on each query.
+
+Run from the repository root:
+    python scripts/bench_vitals_history.py [--hours 6] [--rate 25] [--points 500]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from backend.iot.vitals_store import VitalsStore  # noqa: E402
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=int, default=6)
+    parser.add_argument("--rate", type=int, default=25, help="samples per second")
+    parser.add_argument("--points", type=int, default=500, help="points per query")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = np.array([80, 120, 80, 97, 37, 16], dtype=np.float32)
+    store = VitalsStore()
+    raw_times, raw_values = [], []  # the naive alternative: every sample, downsampled per query
+    t0 = time.time()
+    ingest_seconds = 0.0
+    print(f"{args.rate} Hz, queries for {args.points} points")
+    print(" hours |  store MB | raw MB | last 5 min | last hour | whole  | all raw, whole")
+    for hour in range(1, args.hours + 1):
+        for second in range((hour - 1) * 3600, hour * 3600):
+            times = t0 + second + np.arange(args.rate) / args.rate
+            values = base + rng.normal(0, 2, (args.rate, len(base))).astype(np.float32)
+            start = time.perf_counter()
+            store.ingest("PAT-1", times, values)
+            ingest_seconds += time.perf_counter() - start
+            raw_times.append(times)
+            raw_values.append(values)
+        now = t0 + hour * 3600
+
+        def naive():
+            times = np.concatenate(raw_times)
+            values = np.concatenate(raw_values)
+            edges = np.linspace(times[0], times[-1], args.points + 1)
+            idx = np.searchsorted(times, edges[:-1])
+            return np.add.reduceat(values, idx, axis=0)
+
+        recent = timed(lambda: store.query("PAT-1", now - 300, None, args.points))
+        last_hour = timed(lambda: store.query("PAT-1", now - 3600, None, args.points))
+        whole = timed(lambda: store.query("PAT-1", None, None, args.points))
+        full = timed(naive, repeat=3)
+        raw_mb = sum(t.nbytes + v.nbytes for t, v in zip(raw_times, raw_values)) / 1e6
+        print(f"{hour:6d} | {store.memory_bytes() / 1e6:9.2f} | {raw_mb:6.1f} | {recent:7.2f} ms | "
+              f"{last_hour:6.2f} ms | {whole:3.2f} ms | {full:8.1f} ms")
+    samples = args.hours * 3600 * args.rate
+    print(f"ingest: {samples / ingest_seconds:.0f} samples/s (rollups included)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+API throughput with several uvicorn workers sharing state through
+STATE_BACKEND (backend/state_backend.py), against one in-memory worker.
+
+Starts the app once per configuration, drives it with concurrent clients
+(reads of /ambulances/list and /map/state, plus emergency requests) and
+reports requests per second. Scaling needs free cores: on an N-core box
+try --workers 1 2 4 up to N.
+
+Run from the repository root:
+    python scripts/bench_workers.py [--workers 1 2 4] [--seconds 5] [--clients 32]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def start_server(port, workers, backend):
+    env = dict(os.environ, STATE_BACKEND=backend, STATE_DB_PATH="", OSRM_URL="http://127.0.0.1:1")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(url + "/", timeout=0.5)
+            time.sleep(1.0)  # let the other workers finish starting
+            return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def load(url, seconds, clients):
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(i):
+        with httpx.Client(base_url=url, timeout=10) as c:
+            n = 0
+            while time.perf_counter() < deadline:
+                if n % 20 == 0:
+                    c.post("/emergency/request", json={
+                        "name": f"bench {i}-{n}", "condition": "fever",
+                        "latitude": 12.34, "longitude": 74.56,
+                    })
+                elif n % 2:
+                    c.get("/ambulances/list")
+                else:
+                    c.get("/map/state")
+                n += 1
+            counts[i] = n
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.clients} clients, {args.seconds:.0f}s per run")
+    configs = [(1, "memory")]
+    with tempfile.TemporaryDirectory() as tmp:
+        configs += [(w, f"sqlite:///{tmp}/state-{w}.db") for w in args.workers]
+        for workers, backend in configs:
+            proc, url = start_server(args.port, workers, backend)
+            try:
+                rate = load(url, args.seconds, args.clients)
+            finally:
+                proc.terminate()
+                proc.wait()
+            label = "memory" if backend == "memory" else "sqlite"
+            print(f"{workers} worker(s), {label:>6} backend: {rate:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
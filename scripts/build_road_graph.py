@@ -0,0 +1,120 @@
+"""
+Build an offline road graph for backend/routing/road_graph.py.
+
+From CSV files:
+    nodes.csv  id,lat,lng
+    edges.csv  from,to,speed_kmh[,oneway][,length_m]
+(edges are two-way unless oneway is 1; length defaults to the straight
+line between the end nodes)
+
+    python scripts/build_road_graph.py --nodes nodes.csv --edges edges.csv --out data/road_graph
+
+Or a synthetic grid city around the demo coordinates, for local testing:
+
+    python scripts/build_road_graph.py --synthetic 200 --out data/road_graph
+
+Then start the backend with ROAD_GRAPH_PATH=data/road_graph.
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.routing.haversine import haversine_np  # noqa: E402
+from backend.routing.road_graph import save_graph  # noqa: E402
+
+DEMO_CENTER = (12.35, 74.56)
+
+
+def edges_from_lists(lat, lng, a, b, speed_kmh, oneway, length_m=None):
+    """Directed edge arrays (tail, head, seconds, meters) from road segments"""
+    a, b = np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+    speed_kmh = np.asarray(speed_kmh, dtype=np.float64)
+    oneway = np.asarray(oneway, dtype=bool)
+    if length_m is None:
+        length_m = haversine_np(lat[a], lng[a], lat[b], lng[b]) * 1000
+    seconds = length_m / 1000 / speed_kmh * 3600
+    back = ~oneway
+    return (
+        np.concatenate([a, b[back]]),
+        np.concatenate([b, a[back]]),
+        np.concatenate([seconds, seconds[back]]),
+        np.concatenate([length_m, length_m[back]]),
+    )
+
+
+def synthetic_city(n: int, spacing: float = 0.002, seed: int = 7):
+    """
+    n x n street grid (~220 m blocks) with jittered intersections: every
+    10th street is a 60 km/h arterial, the rest 30 km/h, 5% of the blocks
+    are missing and 10% of the side streets are one-way.
+    Returns (lat, lng, tail, head, seconds, meters).
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(n * n), n)
+    lat = DEMO_CENTER[0] + (rows - n / 2) * spacing + rng.normal(0, spacing / 10, n * n)
+    lng = DEMO_CENTER[1] + (cols - n / 2) * spacing + rng.normal(0, spacing / 10, n * n)
+
+    node = np.arange(n * n).reshape(n, n)
+    a = np.concatenate([node[:, :-1].ravel(), node[:-1, :].ravel()])
+    b = np.concatenate([node[:, 1:].ravel(), node[1:, :].ravel()])
+    arterial = np.concatenate([
+        np.repeat(np.arange(n) % 10 == 0, n - 1),              # along rows
+        np.tile(np.arange(n) % 10 == 0, n - 1),                # along columns
+    ])
+    keep = rng.random(len(a)) >= 0.05
+    speed = np.where(arterial, 60.0, 30.0)
+    oneway = ~arterial & (rng.random(len(a)) < 0.10)
+    return (lat, lng) + edges_from_lists(lat, lng, a[keep], b[keep], speed[keep], oneway[keep])
+
+
+def read_csv_graph(nodes_path: str, edges_path: str):
+    with open(nodes_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    ids = {row["id"]: i for i, row in enumerate(rows)}
+    lat = np.array([float(row["lat"]) for row in rows])
+    lng = np.array([float(row["lng"]) for row in rows])
+
+    a, b, speed, oneway, length = [], [], [], [], []
+    with open(edges_path, newline="") as f:
+        for row in csv.DictReader(f):
+            a.append(ids[row["from"]])
+            b.append(ids[row["to"]])
+            speed.append(float(row["speed_kmh"]))
+            oneway.append(row.get("oneway", "0") in ("1", "true", "yes"))
+            length.append(float(row["length_m"]) if row.get("length_m") else np.nan)
+    a, b, length = np.array(a), np.array(b), np.array(length)
+    straight = haversine_np(lat[a], lng[a], lat[b], lng[b]) * 1000
+    length = np.where(np.isnan(length), straight, length)
+    return (lat, lng) + edges_from_lists(lat, lng, a, b, speed, oneway, length)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an offline road graph")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--nodes")
+    parser.add_argument("--edges")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="N x N grid city instead of CSV input")
+    parser.add_argument("--cell-size", type=float, default=0.01)
+    parser.add_argument("--landmarks", type=int, default=8, help="ALT landmarks (0 for plain A*)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.synthetic:
+        graph = synthetic_city(args.synthetic)
+    elif args.nodes and args.edges:
+        graph = read_csv_graph(args.nodes, args.edges)
+    else:
+        parser.error("give --nodes and --edges, or --synthetic N")
+    save_graph(args.out, *graph, cell_size=args.cell_size, landmarks=args.landmarks)
+    print(f"{len(graph[0])} nodes, {len(graph[2])} edges -> {args.out} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
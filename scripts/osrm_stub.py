@@ -0,0 +1,114 @@
+"""
+Minimal local stand-in for an OSRM server, for exercising the OSRM client
+without a real routing backend.
+
+Answers /route/v1/driving/{lng},{lat};{lng},{lat} with a straight-line
+route (haversine distance at a constant speed, two-point polyline) and
+/table/v1/driving/... with the matching duration matrix, and counts the
+requests it served on /stats. In-process users (tests/test_osrm_client.py)
+can change app.state.latency, or set app.state.fail_status to make every
+OSRM call answer with that HTTP error.
+
+Run from the repository root:
+    python scripts/osrm_stub.py [--port 5000] [--latency 0.05] [--speed 50]
+then point the backend at it with OSRM_URL=http://localhost:5000
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.routing.haversine import haversine, haversine_matrix  # noqa: E402
+from backend.routing.polyline import encode  # noqa: E402
+
+SPEED_KMH = 50
+MAX_TABLE_SIZE = 100  # osrm-routed --max-table-size default
+
+
+def parse_coordinates(coordinates: str):
+    """'lng,lat;lng,lat;...' -> [(lat, lng), ...]"""
+    points = []
+    for pair in coordinates.split(";"):
+        lng, lat = pair.split(",")
+        points.append((float(lat), float(lng)))
+    return points
+
+
+def create_app(latency: float = 0.0, speed_kmh: float = SPEED_KMH) -> FastAPI:
+    app = FastAPI(title="OSRM stub")
+    app.state.stats = {"route": 0, "table": 0}
+    app.state.latency = latency
+    app.state.fail_status = 0  # answer every OSRM call with this HTTP status if set
+
+    async def serve(kind: str):
+        """Count and delay a call; an error response if failures are switched on"""
+        app.state.stats[kind] += 1
+        if app.state.latency:
+            await asyncio.sleep(app.state.latency)
+        if app.state.fail_status:
+            return JSONResponse({"code": "Error", "message": "stub failure"}, status_code=app.state.fail_status)
+        return None
+
+    @app.get("/route/v1/driving/{coordinates}")
+    async def route(coordinates: str):
+        error = await serve("route")
+        if error is not None:
+            return error
+        try:
+            points = parse_coordinates(coordinates)
+        except ValueError:
+            return {"code": "InvalidQuery", "routes": []}
+        distance_km = sum(haversine(*a, *b) for a, b in zip(points, points[1:]))
+        return {
+            "code": "Ok",
+            "routes": [{
+                "distance": distance_km * 1000,
+                "duration": distance_km / speed_kmh * 3600,
+                "geometry": encode(points),
+            }],
+        }
+
+    @app.get("/table/v1/driving/{coordinates}")
+    async def table(coordinates: str, sources: str = "all", destinations: str = "all"):
+        error = await serve("table")
+        if error is not None:
+            return error
+        try:
+            points = parse_coordinates(coordinates)
+            src = range(len(points)) if sources == "all" else [int(i) for i in sources.split(";")]
+            dst = range(len(points)) if destinations == "all" else [int(i) for i in destinations.split(";")]
+            src_pts = [points[i] for i in src]
+            dst_pts = [points[i] for i in dst]
+        except (ValueError, IndexError):
+            return {"code": "InvalidQuery"}
+        if len(points) > MAX_TABLE_SIZE:
+            return {"code": "TooBig"}
+        km = haversine_matrix([p[0] for p in src_pts], [p[1] for p in src_pts],
+                              [p[0] for p in dst_pts], [p[1] for p in dst_pts])
+        return {"code": "Ok", "durations": (km / speed_kmh * 3600).tolist()}
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--speed", type=float, default=SPEED_KMH, help="km/h used for durations")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.speed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""
+Shared pytest setup: run from the repository root (python -m pytest) so
+the backend package imports the same way uvicorn loads it. Backend modules
+read their settings at import, so tests get no OSRM server, no state file
+and no log output unless they set them first.
+"""
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("OSRM_URL", "http://127.0.0.1:1")
+os.environ.setdefault("STATE_DB_PATH", "")
+os.environ.setdefault("LOG_SINK", "")
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
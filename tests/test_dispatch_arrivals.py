@@ -0,0 +1,97 @@
+"""
+Dispatch and arrival handling of the in-memory simulation (backend/services.py):
+the state transitions process_arrivals() applies when a leg ends, including
+legs that end before the patient's state has caught up.
+"""
+from datetime import datetime
+
+import pytest
+
+from backend import services, store
+from backend.models import Ambulance, AmbulanceStatus, Hospital, Location, Patient, PatientStatus
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    store.clear_all()
+    services.waiting_queue.clear()
+    clock = FakeClock()
+    monkeypatch.setattr(store.fleet, "clock", clock)
+    for ambulance in services.create_demo_ambulances().values():
+        store.save_ambulance(ambulance)
+    for hospital in services.create_demo_hospitals().values():
+        store.save_hospital(hospital)
+    yield clock
+    store.clear_all()
+
+
+def new_patient(patient_id, lat, lng):
+    patient = Patient(
+        patientId=patient_id, name="Test", age=40, condition="fracture", status=PatientStatus.WAITING,
+        location=Location(lat=lat, lng=lng), createdAt=datetime.now(),
+    )
+    store.save_patient(patient)
+    return patient
+
+
+def test_trip_reaches_hospital(clock):
+    patient = new_patient("PAT-1", 12.36, 74.58)
+    ambulance_id, hospital_id = services.dispatch_ambulance(patient)
+    assert ambulance_id and hospital_id
+    assert store.get_patient("PAT-1").status == PatientStatus.PICKUP
+
+    clock.now += store.fleet.remaining_seconds(ambulance_id)
+    services.process_arrivals()
+    assert store.get_patient("PAT-1").status == PatientStatus.TO_HOSPITAL
+    assert store.get_ambulance(ambulance_id).status == AmbulanceStatus.TO_HOSPITAL
+
+    clock.now += store.fleet.remaining_seconds(ambulance_id)
+    services.process_arrivals()
+    assert store.get_patient("PAT-1").status == PatientStatus.COMPLETED
+    assert store.get_ambulance(ambulance_id).status == AmbulanceStatus.AVAILABLE
+
+
+def test_unit_already_at_patient_is_picked_up(clock):
+    # The leg to the patient has zero length, so it is due as soon as the
+    # ambulance is saved; the movement task may handle it right then.
+    def arrivals_on_save(kind, entity_id):
+        if kind == "ambulance":
+            services.process_arrivals()
+
+    store.change_listeners.append(arrivals_on_save)
+    try:
+        patient = new_patient("PAT-2", 12.34, 74.56)  # where AMB-003 stands
+        ambulance_id, _ = services.dispatch_ambulance(patient)
+    finally:
+        store.change_listeners.remove(arrivals_on_save)
+
+    assert ambulance_id == "AMB-003"
+    assert store.get_patient("PAT-2").status == PatientStatus.TO_HOSPITAL
+    assert store.get_ambulance("AMB-003").status == AmbulanceStatus.TO_HOSPITAL
+
+
+def test_arrival_before_patient_update_is_retried(clock):
+    # e.g. the ambulance synced from the dispatching worker before its patient
+    patient = new_patient("PAT-3", 12.34, 74.56)
+    store.save_ambulance(Ambulance(
+        ambulanceId="AMB-003", driverId="DRV-003", driverName="Ahmed Hassan",
+        status=AmbulanceStatus.ASSIGNED, location=Location(lat=12.34, lng=74.56),
+        currentPatientId="PAT-3", targetLocation=patient.location,
+    ))
+    services.process_arrivals()
+    assert store.get_patient("PAT-3").status == PatientStatus.WAITING
+    assert store.fleet.time_until_next_arrival() == pytest.approx(services.ARRIVAL_RETRY_DELAY)
+
+    patient.status, patient.ambulanceId, patient.hospitalId = PatientStatus.PICKUP, "AMB-003", "HOSP-001"
+    store.save_patient(patient)
+    clock.now += services.ARRIVAL_RETRY_DELAY
+    services.process_arrivals()
+    assert store.get_patient("PAT-3").status == PatientStatus.TO_HOSPITAL
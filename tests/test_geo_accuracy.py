@@ -0,0 +1,170 @@
+"""
+Accuracy of the geo kernel, the spatial index and the batch assignment
+solver against straightforward reference implementations.
+"""
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from backend.ai.dispatch_engine import assign_ambulances, min_cost_assignment
+from backend.routing.haversine import (
+    EARTH_RADIUS_KM,
+    EQUIRECTANGULAR_MAX_KM,
+    EQUIRECTANGULAR_MAX_REL_ERROR,
+    KM_PER_DEGREE,
+    equirectangular,
+    equirectangular_np,
+    haversine,
+    haversine_matrix,
+    haversine_np,
+)
+from backend.spatial_index import GridIndex
+
+
+def reference_distance(lat1, lng1, lat2, lng2):
+    """Textbook haversine (atan2 form) in km"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def random_points(rng, n, lat_range=(-80, 80), lng_range=(-180, 180)):
+    return rng.uniform(*lat_range, n), rng.uniform(*lng_range, n)
+
+
+# ===== HAVERSINE KERNEL =====
+
+def test_haversine_matches_reference():
+    rng = np.random.default_rng(1)
+    lat1, lng1 = random_points(rng, 2000)
+    lat2, lng2 = random_points(rng, 2000)
+    expected = np.array([reference_distance(*p) for p in zip(lat1, lng1, lat2, lng2)])
+
+    scalar = np.array([haversine(*p) for p in zip(lat1, lng1, lat2, lng2)])
+    vector = haversine_np(lat1, lng1, lat2, lng2)
+    # float64 round-off only: well under a millimetre over any distance
+    assert np.max(np.abs(scalar - expected)) < 1e-6
+    assert np.max(np.abs(vector - expected)) < 1e-6
+
+
+def test_haversine_known_distances():
+    assert haversine(0, 0, 1, 0) == pytest.approx(KM_PER_DEGREE, rel=1e-12)
+    assert haversine(12.97, 77.59, 12.97, 77.59) == 0.0
+    # antipodes: half the circumference (asin is ill-conditioned there, so
+    # only ~1e-8 relative), and no NaN from rounding past 1
+    assert haversine(10, 20, -10, -160) == pytest.approx(math.pi * EARTH_RADIUS_KM, rel=1e-7)
+
+
+def test_haversine_matrix_matches_pairwise():
+    rng = np.random.default_rng(2)
+    lat1, lng1 = random_points(rng, 30)
+    lat2, lng2 = random_points(rng, 45)
+    matrix = haversine_matrix(lat1, lng1, lat2, lng2)
+    assert matrix.shape == (30, 45)
+    expected = np.array([[reference_distance(a, b, c, d) for c, d in zip(lat2, lng2)] for a, b in zip(lat1, lng1)])
+    assert np.max(np.abs(matrix - expected)) < 1e-6
+
+
+def test_equirectangular_within_documented_bound():
+    rng = np.random.default_rng(3)
+    n = 20000
+    lat1 = rng.uniform(-70, 70, n)
+    lng1 = rng.uniform(-179, 179, n)
+    # destinations up to EQUIRECTANGULAR_MAX_KM away in a random direction
+    dist = rng.uniform(0.05, EQUIRECTANGULAR_MAX_KM, n)
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    lat2 = np.clip(lat1 + dist * np.cos(bearing) / KM_PER_DEGREE, -70, 70)
+    lng2 = lng1 + dist * np.sin(bearing) / (KM_PER_DEGREE * np.cos(np.radians(lat1)))
+
+    expected = haversine_np(lat1, lng1, lat2, lng2)
+    approx = equirectangular_np(lat1, lng1, lat2, lng2)
+    assert np.max(np.abs(approx - expected) / expected) < EQUIRECTANGULAR_MAX_REL_ERROR
+    assert equirectangular(lat1[0], lng1[0], lat2[0], lng2[0]) == pytest.approx(approx[0], rel=1e-12)
+
+
+# ===== SPATIAL INDEX =====
+
+def brute_force_nearest(points, lat, lng, k):
+    distances = sorted((haversine(lat, lng, p_lat, p_lng), key) for key, (p_lat, p_lng) in points.items())
+    return distances[:k]
+
+
+@pytest.mark.parametrize("cell_size", [0.005, 0.01, 0.1])
+def test_grid_knn_matches_brute_force(cell_size):
+    rng = np.random.default_rng(4)
+    index = GridIndex(cell_size)
+    points = {}
+    # a dense city cluster plus a few far-away outliers
+    for i, (lat, lng) in enumerate(zip(rng.normal(12.97, 0.05, 400), rng.normal(77.59, 0.05, 400))):
+        points[f"A{i}"] = (float(lat), float(lng))
+    for i, (lat, lng) in enumerate(zip(rng.uniform(-60, 60, 20), rng.uniform(-170, 170, 20))):
+        points[f"F{i}"] = (float(lat), float(lng))
+    for key, (lat, lng) in points.items():
+        index.insert(key, lat, lng)
+
+    queries = list(zip(rng.normal(12.97, 0.1, 50), rng.normal(77.59, 0.1, 50)))
+    queries += [(0.0, 0.0), (60.0, -120.0), (-45.0, 170.0)]  # far from the cluster
+    for lat, lng in queries:
+        for k in (1, 5, 25):
+            got = index.nearest(lat, lng, k)
+            expected = brute_force_nearest(points, lat, lng, k)
+            assert [d for d, _ in got] == pytest.approx([d for d, _ in expected], abs=1e-9)
+            assert len(got) == k
+
+
+def test_grid_knn_after_moves_and_removals():
+    rng = np.random.default_rng(5)
+    index = GridIndex()
+    points = {}
+    for i in range(300):
+        points[i] = (float(rng.normal(28.6, 0.05)), float(rng.normal(77.2, 0.05)))
+        index.insert(i, *points[i])
+    for i in range(0, 300, 3):  # move a third, drop a sixth
+        points[i] = (float(rng.normal(28.6, 0.05)), float(rng.normal(77.2, 0.05)))
+        index.insert(i, *points[i])
+    for i in range(1, 300, 6):
+        del points[i]
+        index.remove(i)
+
+    assert len(index) == len(points)
+    for lat, lng in zip(rng.normal(28.6, 0.05, 40), rng.normal(77.2, 0.05, 40)):
+        got = index.nearest(lat, lng, 10)
+        expected = brute_force_nearest(points, lat, lng, 10)
+        assert [d for d, _ in got] == pytest.approx([d for d, _ in expected], abs=1e-9)
+    assert index.nearest(0, 0, 0) == []
+    assert GridIndex().nearest_one(0, 0) is None
+
+
+# ===== ASSIGNMENT SOLVER =====
+
+def brute_force_cost(cost):
+    """Optimal one-to-one assignment cost over every permutation"""
+    n, m = cost.shape
+    if n > m:
+        return brute_force_cost(cost.T)
+    return min(cost[np.arange(n), list(cols)].sum() for cols in itertools.permutations(range(m), n))
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 6), (3, 6), (6, 3), (2, 7), (7, 2)])
+def test_min_cost_assignment_is_optimal(shape):
+    rng = np.random.default_rng(sum(shape))
+    for _ in range(20):
+        # integer costs produce ties, which exercise the degenerate paths
+        cost = rng.integers(0, 20, shape).astype(np.float64)
+        rows, cols = min_cost_assignment(cost)
+        assert len(rows) == min(shape)
+        assert len(set(rows.tolist())) == len(rows) and len(set(cols.tolist())) == len(cols)
+        assert cost[rows, cols].sum() == pytest.approx(brute_force_cost(cost))
+
+
+def test_min_cost_assignment_empty():
+    rows, cols = min_cost_assignment(np.zeros((0, 4)))
+    assert len(rows) == 0 and len(cols) == 0
+
+
+def test_assign_ambulances_leaves_unreachable_pairs_unmatched():
+    costs = np.array([[5.0, np.inf], [np.inf, np.inf]])
+    assert assign_ambulances(None, None, costs) == [(0, 0, 5.0)]
@@ -0,0 +1,271 @@
+"""
+OSRM client against the local stub server (scripts/osrm_stub.py), run
+in-process on a free port: route cache, in-flight de-duplication, table
+chunking and the straight-line fallback when OSRM fails or is too slow.
+"""
+import asyncio
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+import uvicorn
+
+from backend.routing.osrm import FALLBACK_SPEED_KMH, OSRMClient, TTLCache, fallback_durations, table_chunks
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+import osrm_stub  # noqa: E402
+
+# The stub drives slower than the fallback estimate, so OSRM answers and
+# fallback values can be told apart
+STUB_SPEED_KMH = FALLBACK_SPEED_KMH / 2
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def stub_server():
+    app = osrm_stub.create_app(speed_kmh=STUB_SPEED_KMH)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "OSRM stub did not start"
+        time.sleep(0.02)
+    yield app, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def stub(stub_server):
+    """The stub app, reset to healthy and zero counters for each test"""
+    app, url = stub_server
+    app.state.stats = {"route": 0, "table": 0}
+    app.state.latency = 0.0
+    app.state.fail_status = 0
+    return app, url
+
+
+def run(client, coro):
+    """Run a client coroutine on a fresh loop and close the pooled client after"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def points(rng, n):
+    return list(zip(rng.uniform(12.8, 13.1, n), rng.uniform(77.4, 77.8, n)))
+
+
+# ===== ROUTE CACHE =====
+
+def test_ttl_cache_lru_and_expiry():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is now most recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    clock.now += 10
+    assert cache.get("a") is None and len(cache) == 1
+
+
+def test_route_cache_hit_and_expiry(stub):
+    app, url = stub
+    client = OSRMClient(url)
+    clock = FakeClock()
+    client.route_cache = TTLCache(16, ttl=60, clock=clock)
+
+    async def scenario():
+        first = await client.route(12.9716, 77.5946, 12.9352, 77.6245)
+        # within the snapping precision: same cache entry, no request
+        again = await client.route(12.97162, 77.59458, 12.93518, 77.62452)
+        clock.now += 61
+        expired = await client.route(12.9716, 77.5946, 12.9352, 77.6245)
+        return first, again, expired
+
+    first, again, expired = run(client, scenario())
+    assert first is not None and first["geometry"]
+    assert again == first
+    assert expired == first
+    assert app.state.stats["route"] == 2
+    assert client.stats["cache_hits"] == 1 and client.stats["requests"] == 2
+
+
+def test_route_sync_shares_the_cache(stub):
+    app, url = stub
+    client = OSRMClient(url)
+    first = client.route_sync(12.9716, 77.5946, 12.9352, 77.6245)
+    assert client.route_sync(12.9716, 77.5946, 12.9352, 77.6245) == first
+    assert app.state.stats["route"] == 1
+    run(client, asyncio.sleep(0))
+
+
+# ===== IN-FLIGHT DE-DUPLICATION =====
+
+def test_identical_inflight_routes_share_one_request(stub):
+    app, url = stub
+    app.state.latency = 0.2
+    client = OSRMClient(url)
+
+    async def scenario():
+        same = [client.route(12.9716, 77.5946, 12.9352, 77.6245) for _ in range(10)]
+        other = client.route(12.9716, 77.5946, 13.0358, 77.5970)
+        return await asyncio.gather(*same, other)
+
+    results = run(client, scenario())
+    assert all(r == results[0] for r in results[:10]) and results[0] is not None
+    assert results[10] != results[0]
+    assert app.state.stats["route"] == 2
+    assert client.stats["deduplicated"] == 9
+
+
+def test_inflight_failure_reaches_every_waiter(stub):
+    app, url = stub
+    app.state.latency = 0.1
+    app.state.fail_status = 500
+    client = OSRMClient(url)
+
+    async def scenario():
+        return await asyncio.gather(*(client.route(12.97, 77.59, 12.93, 77.62) for _ in range(5)))
+
+    assert run(client, scenario()) == [None] * 5
+    assert app.state.stats["route"] == 1
+    assert len(client.route_cache) == 0  # failures are not cached
+
+
+# ===== TABLE CHUNKING =====
+
+@pytest.mark.parametrize("n_src,n_dst,max_coords", [
+    (1, 1, 100), (3, 500, 100), (500, 3, 100), (150, 120, 100), (50, 50, 100), (7, 9, 4),
+])
+def test_table_chunks_cover_matrix_within_limit(n_src, n_dst, max_coords):
+    covered = np.zeros((n_src, n_dst), dtype=np.int64)
+    for s, d in table_chunks(n_src, n_dst, max_coords):
+        assert (s.stop - s.start) + (d.stop - d.start) <= max_coords
+        covered[s, d] += 1
+    assert np.all(covered == 1)
+
+
+@pytest.mark.parametrize("n_src,n_dst", [(150, 120), (3, 400), (40, 40)])
+def test_table_is_chunked_to_server_limit(stub, n_src, n_dst):
+    app, url = stub
+    rng = np.random.default_rng(n_src + n_dst)
+    sources, destinations = points(rng, n_src), points(rng, n_dst)
+    expected = fallback_durations(sources, destinations, STUB_SPEED_KMH)
+    chunks = len(list(table_chunks(n_src, n_dst, osrm_stub.MAX_TABLE_SIZE)))
+
+    client = OSRMClient(url)
+    durations = run(client, client.table(sources, destinations))
+    assert durations.shape == (n_src, n_dst)
+    np.testing.assert_allclose(durations, expected, rtol=1e-9)
+    assert app.state.stats["table"] == chunks
+    assert client.stats["table_fallbacks"] == 0
+
+    sync_client = OSRMClient(url)
+    np.testing.assert_allclose(sync_client.table_sync(sources, destinations), expected, rtol=1e-9)
+    assert app.state.stats["table"] == 2 * chunks
+    run(sync_client, asyncio.sleep(0))
+
+
+def test_table_sync_sends_chunks_concurrently(stub):
+    app, url = stub
+    app.state.latency = 0.3
+    rng = np.random.default_rng(3)
+    sources, destinations = points(rng, 3), points(rng, 400)
+    chunks = len(list(table_chunks(3, 400, osrm_stub.MAX_TABLE_SIZE)))
+    assert chunks >= 4
+
+    client = OSRMClient(url)
+    started = time.monotonic()
+    durations = client.table_sync(sources, destinations)
+    elapsed = time.monotonic() - started
+    np.testing.assert_allclose(durations, fallback_durations(sources, destinations, STUB_SPEED_KMH), rtol=1e-9)
+    assert app.state.stats["table"] == chunks
+    assert elapsed < 2 * app.state.latency  # sequential would take chunks * latency
+    run(client, asyncio.sleep(0))
+
+
+# ===== FALLBACK =====
+
+@pytest.mark.parametrize("failure", ["error", "timeout"])
+def test_table_falls_back_to_straight_line(stub, failure):
+    app, url = stub
+    if failure == "error":
+        app.state.fail_status = 503
+    else:
+        app.state.latency = 0.5
+    rng = np.random.default_rng(7)
+    sources, destinations = points(rng, 5), points(rng, 8)
+    client = OSRMClient(url, timeout=0.2)
+
+    durations = run(client, client.table(sources, destinations))
+    np.testing.assert_allclose(durations, fallback_durations(sources, destinations), rtol=1e-12)
+    assert client.stats["table_fallbacks"] >= 1 and client.stats["errors"] >= 1
+
+    # marked down: the next call answers from the fallback without a request
+    served = app.state.stats["table"]
+    np.testing.assert_allclose(client.table_sync(sources, destinations), durations)
+    assert app.state.stats["table"] == served
+
+
+@pytest.mark.parametrize("failure", ["error", "timeout"])
+def test_route_returns_none_when_osrm_fails(stub, failure):
+    app, url = stub
+    if failure == "error":
+        app.state.fail_status = 500
+    else:
+        app.state.latency = 0.5
+    client = OSRMClient(url, timeout=0.2)
+    assert run(client, client.route(12.97, 77.59, 12.93, 77.62)) is None
+    assert client.stats["errors"] == 1
+
+    # a transport failure (timeout) marks OSRM down for both paths: no
+    # further requests until the retry window ends; an error answer only
+    # fails that call
+    served = app.state.stats["route"]
+    app.state.fail_status, app.state.latency = 0, 0.0
+    recovered = [
+        run(client, client.route(12.98, 77.60, 13.03, 77.59)),
+        client.route_sync(12.99, 77.61, 13.03, 77.59),
+    ]
+    if failure == "timeout":
+        assert recovered == [None, None] and app.state.stats["route"] == served
+    else:
+        assert None not in recovered and app.state.stats["route"] == served + 2
+
+
+def test_route_sync_failure_marks_async_route_down(stub):
+    app, url = stub
+    app.state.latency = 0.5
+    client = OSRMClient(url, timeout=0.2)
+    assert client.route_sync(12.97, 77.59, 12.93, 77.62) is None
+    app.state.latency = 0.0
+    assert run(client, client.route(12.98, 77.60, 13.03, 77.59)) is None
+    assert app.state.stats["route"] == 1 and client.stats["requests"] == 1
+
+
+def test_unreachable_server_falls_back():
+    client = OSRMClient("http://127.0.0.1:1", timeout=0.5)
+    sources, destinations = [(12.97, 77.59)], [(12.93, 77.62), (13.03, 77.59)]
+    durations = run(client, client.table(sources, destinations))
+    np.testing.assert_allclose(durations, fallback_durations(sources, destinations))
+    assert client.route_sync(12.97, 77.59, 12.93, 77.62) is None
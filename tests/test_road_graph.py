@@ -0,0 +1,69 @@
+"""
+Offline router (backend/routing/road_graph.py) on a synthetic grid city:
+A* with ALT bounds against plain Dijkstra, with and without traffic
+factors, reading only the node rows a search touches.
+"""
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from backend.routing.road_graph import RoadGraph, dijkstra, save_graph
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from build_road_graph import synthetic_city  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def graph(tmp_path_factory):
+    path = tmp_path_factory.mktemp("road_graph")
+    lat, lng, *edges = synthetic_city(40)
+    save_graph(path, lat, lng, *edges)
+    return RoadGraph(path)
+
+
+def reference(graph, source, factors=None):
+    """Seconds from source to every node by Dijkstra over the whole graph"""
+    weights = np.asarray(graph.duration, dtype=np.float64)
+    for e, factor in (factors or {}).items():
+        weights[e] = math.inf if factor == math.inf else weights[e] * factor
+    return dijkstra(np.asarray(graph.indptr).tolist(), np.asarray(graph.head).tolist(), weights.tolist(), source)
+
+
+def path_seconds(graph, edges, factors=None):
+    factors = factors or {}
+    return sum(float(graph.duration[e]) * factors.get(e, 1.0) for e in edges)
+
+
+@pytest.mark.parametrize("traffic", [False, True])
+def test_shortest_path_matches_dijkstra(graph, traffic):
+    rng = np.random.default_rng(11)
+    factors = None
+    if traffic:
+        factors = {int(e): 4.0 for e in rng.integers(0, graph.edge_count, 300)}
+        factors.update({int(e): math.inf for e in rng.integers(0, graph.edge_count, 100)})
+    for source in rng.integers(0, len(graph), 5).tolist():
+        expected = reference(graph, source, factors)
+        for target in rng.integers(0, len(graph), 20).tolist():
+            found = graph.shortest_path(source, target, factors)
+            if math.isinf(expected[target]):
+                assert found is None
+                continue
+            seconds, edges = found
+            assert seconds == pytest.approx(expected[target], rel=1e-9)
+            assert path_seconds(graph, edges, factors) == pytest.approx(seconds, rel=1e-9)
+            nodes = graph.path_nodes(source, edges)
+            assert nodes[-1] == target
+            assert len(graph.edge_points(edges)) == len(nodes)
+
+
+def test_short_query_reads_only_nearby_rows(tmp_path):
+    lat, lng, *edges = synthetic_city(60)
+    save_graph(tmp_path, lat, lng, *edges)
+    graph = RoadGraph(tmp_path)
+    source = graph.nearest_node(float(np.median(graph.lat)), float(np.median(graph.lng)))
+    target = int(graph.head[int(graph.indptr[source])])  # a neighbour
+    assert graph.shortest_path(source, target) is not None
+    assert 0 < len(graph._rows) < len(graph) // 10
@@ -0,0 +1,188 @@
+"""
+Shared state backends (backend/state_backend.py) that let several workers
+serve one world, on a SQLite file and on fakeredis (Lua scripts need the
+fakeredis[lua] extra): the change feed, compare-and-set publishing, leases
+and the shared log, then store.sync_from_backend() applying another
+worker's changes and road legs.
+"""
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from backend import store
+from backend.models import Ambulance, AmbulanceStatus, Location, Patient, PatientStatus, SystemLogEntry
+from backend.state_backend import RedisBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["sqlite", "fakeredis"])
+def make_backend(request, tmp_path):
+    """Factory of backends on one shared store: each call is another worker's connection"""
+    if request.param == "sqlite":
+        path = str(tmp_path / "state.db")
+        return lambda: SQLiteBackend(path)
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    return lambda: RedisBackend(fakeredis.FakeRedis(server=server))
+
+
+# ===== BACKEND PRIMITIVES =====
+
+def test_change_feed_keeps_latest_version_in_seq_order(make_backend):
+    backend = make_backend()
+    first = backend.publish("patient", "P1", "v1")
+    backend.publish("ambulance", "A1", "a1")
+    last = backend.publish("patient", "P1", "v2")
+    seq, changes = backend.changes_since(0)
+    assert seq == last
+    assert [c[:3] for c in changes] == [("ambulance", "A1", "a1"), ("patient", "P1", "v2")]
+    assert [c[3] for c in changes] == sorted(c[3] for c in changes)
+    assert backend.changes_since(seq) == (seq, [])
+    assert make_backend().changes_since(first)[1] == changes  # another worker sees the same feed
+
+
+def test_publish_if_is_compare_and_set(make_backend):
+    mine, theirs = make_backend(), make_backend()
+    seq = mine.publish_if("ambulance", "A1", "claimed by me", 0)
+    assert seq is not None
+    assert theirs.publish_if("ambulance", "A1", "claimed by them", 0) is None  # stale view
+    newer = theirs.publish_if("ambulance", "A1", "released", seq)
+    assert newer is not None and newer > seq
+    assert mine.publish_if("ambulance", "A1", "again", seq) is None
+    assert mine.changes_since(0)[1] == [("ambulance", "A1", "released", newer)]
+
+
+def test_publish_if_has_one_winner_under_contention(make_backend):
+    results = []
+
+    def claim(i):
+        results.append(make_backend().publish_if("ambulance", "A1", f"worker {i}", 0))
+
+    threads = [threading.Thread(target=claim, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(seq is not None for seq in results) == 1
+
+
+def test_lease_renewal_and_expiry(make_backend):
+    mine, theirs = make_backend(), make_backend()
+    assert mine.lease("leader:simulation", "me", 0.4)
+    assert not theirs.lease("leader:simulation", "them", 0.4)
+    time.sleep(0.25)
+    assert mine.lease("leader:simulation", "me", 0.4)  # renewed: held 0.4 s from now
+    time.sleep(0.25)
+    assert not theirs.lease("leader:simulation", "them", 0.4)
+    time.sleep(0.3)
+    assert theirs.lease("leader:simulation", "them", 0.4)  # expired without renewal
+    assert not mine.lease("leader:simulation", "me", 0.4)
+
+    mine.release("leader:simulation", "me")  # not ours any more: no effect
+    assert not mine.lease("leader:simulation", "me", 0.4)
+    theirs.release("leader:simulation", "them")
+    assert mine.lease("leader:simulation", "me", 0.4)
+
+
+def test_shared_log(make_backend):
+    backend = make_backend()
+    seqs = [backend.append_log(f"entry {i}") for i in range(3)]
+    assert seqs == sorted(seqs) and len(set(seqs)) == 3
+    seq, rows = make_backend().logs_since(0)
+    assert seq == seqs[-1] and [data for _, data in rows] == ["entry 0", "entry 1", "entry 2"]
+    assert backend.logs_since(seqs[0])[1] == rows[1:]
+    assert backend.logs_since(seq) == (seq, [])
+
+
+# ===== STORE SYNC =====
+
+@pytest.fixture
+def worker(monkeypatch, make_backend):
+    """This process as one worker on a shared backend; returns another worker's connection"""
+    store.clear_all()
+    monkeypatch.setattr(store, "state_backend", make_backend())
+    monkeypatch.setattr(store, "change_listeners", [store._publish])
+    monkeypatch.setattr(store, "log_listeners", [store._publish_log])
+    monkeypatch.setattr(store, "_own_seqs", set())
+    monkeypatch.setattr(store, "_own_log_seqs", set())
+    monkeypatch.setattr(store, "_entity_seqs", {})
+    monkeypatch.setattr(store, "_synced_seq", 0)
+    monkeypatch.setattr(store, "_synced_log_seq", 0)
+    yield make_backend()
+    store.clear_all()
+
+
+def patient(patient_id, status=PatientStatus.WAITING):
+    return Patient(
+        patientId=patient_id, name="Test", age=40, condition="fracture", status=status,
+        location=Location(lat=12.36, lng=74.58), createdAt=datetime(2024, 1, 1),
+    )
+
+
+def ambulance(ambulance_id, status=AmbulanceStatus.AVAILABLE, target=None, patient_id=None):
+    return Ambulance(
+        ambulanceId=ambulance_id, driverId="DRV", driverName="Driver", status=status,
+        location=Location(lat=12.34, lng=74.56), targetLocation=target, currentPatientId=patient_id,
+    )
+
+
+def test_sync_applies_other_workers_changes(worker):
+    replayed = []
+    store.change_listeners.append(lambda kind, entity_id: replayed.append((kind, store.is_replaying())))
+    worker.publish("patient", "P1", patient("P1").model_dump_json())
+    worker.publish("ambulance", "A1", ambulance("A1").model_dump_json())
+    worker.append_log(SystemLogEntry(timestamp=datetime.now(), message="from worker 2", level="INFO").model_dump_json())
+
+    applied = store.sync_from_backend()
+    assert [kind for kind, _ in applied] == ["patient", "ambulance"]
+    assert store.get_patient("P1").status == PatientStatus.WAITING
+    assert store.count_available_ambulances() == 1
+    assert replayed == [("patient", True), ("ambulance", True)]
+    assert store.system_logs.tail(1)[0].message == "from worker 2"
+
+    # our own saves are published, and not applied back to us
+    store.save_patient(patient("P2"))
+    assert [c[1] for c in worker.changes_since(0)[1]] == ["P1", "A1", "P2"]
+    assert store.sync_from_backend() == []
+
+
+def test_claim_fails_on_a_stale_view(worker):
+    worker.publish("ambulance", "A1", ambulance("A1").model_dump_json())
+    store.sync_from_backend()
+    version = store.get_ambulance_version("A1")
+
+    # another worker claims it before we have synced that change
+    worker.publish("ambulance", "A1", ambulance("A1", AmbulanceStatus.ASSIGNED).model_dump_json())
+    assert not store.claim_ambulance("A1", version, "P1")
+
+    store.sync_from_backend()
+    assert store.get_ambulance("A1").status == AmbulanceStatus.ASSIGNED
+    worker.publish("ambulance", "A1", ambulance("A1").model_dump_json())  # released again
+    store.sync_from_backend()
+    assert store.claim_ambulance("A1", store.get_ambulance_version("A1"), "P1")
+
+
+def test_road_legs_are_replicated(worker):
+    target = Location(lat=12.36, lng=74.58)
+    path = [(12.34, 74.56), (12.35, 74.56), (12.36, 74.58)]
+
+    # a leg we route is published for the other workers
+    store.save_ambulance(ambulance("A1", AmbulanceStatus.ASSIGNED, target, "P1"))
+    assert store.follow_route("A1", path, 120)
+    legs = [json.loads(c[2]) for c in worker.changes_since(0)[1] if c[0] == "leg"]
+    assert legs[0]["target"] == [12.36, 74.58] and legs[0]["points"] == [list(p) for p in path]
+
+    # a leg another worker routed is followed here, with its arrival time
+    worker.publish("ambulance", "A2", ambulance("A2", AmbulanceStatus.ASSIGNED, target, "P2").model_dump_json())
+    worker.publish("leg", "A2", json.dumps({"target": [12.36, 74.58], "points": path, "arrives": time.time() + 60}))
+    # and a leg to a target the ambulance has left behind is not
+    worker.publish("ambulance", "A3", ambulance("A3", AmbulanceStatus.TO_HOSPITAL, target, "P3").model_dump_json())
+    worker.publish("leg", "A3", json.dumps({"target": [12.0, 74.0], "points": path, "arrives": time.time() + 60}))
+    store.sync_from_backend()
+
+    assert store.fleet.following_route("A2")
+    assert store.fleet.remaining_seconds("A2") == pytest.approx(60, abs=1)
+    assert not store.fleet.following_route("A3")